@@ -0,0 +1,273 @@
+import bisect
+import heapq
+import sys
+from typing import Dict, List, Optional, Tuple
+
+from library_manager import LibraryError, _clean_input, _clean_query
+from views import View
+
+DEFAULT_COMPLETIONS = 10
+MERGE_SIZE = 1024
+FIELDS = ("title", "author", "name")
+
+
+class PrefixIndex:
+    """
+    Weighted keys listed by prefix, heaviest first.
+
+    The keys are kept in a sorted array, so the keys starting with a prefix are the slice between two
+    bisections. A tournament tree over the array holds the best key below every node, encoded as one
+    integer ordering keys by weight and then alphabetically, so the best ``limit`` keys of a slice are
+    found by walking down from the nodes covering it, best first, however long the slice is, and a
+    weight changes in one walk up the tree. Keys added since the array was built wait aside, sorted
+    when a completion needs them, and are merged in by the first completion once ``merge_size`` wait,
+    so loading a catalog only sorts it once; removed keys keep their place in the array without a weight
+    until then.
+
+    :cvar merge_size: The number of keys added since the array was built that makes the next completion
+        rebuild it.
+    :cvar keys: The keys in the array, sorted.
+    :cvar positions: The position of every key in the array.
+    :cvar tree: The tournament tree, with the leaves of the array from ``size`` on; -1 for no key.
+    :cvar size: The number of leaves of the tree, a power of two.
+    :cvar pending: The keys added since the array was built.
+    :cvar pending_keys: The pending keys sorted, or None until a completion needs them.
+    :cvar weights: The weight of every key.
+    :cvar texts: The text shown for every key.
+    """
+
+    def __init__(self, merge_size: int = MERGE_SIZE) -> None:
+        self.merge_size = merge_size
+        self._keys: List[str] = []
+        self._positions: Dict[str, int] = {}
+        self._tree: List[int] = [-1, -1]
+        self._size = 1
+        self._pending: Dict[str, None] = {}
+        self._pending_keys: Optional[List[str]] = []
+        self._weights: Dict[str, int] = {}
+        self._texts: Dict[str, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._weights)
+
+    def weight(self, key: str) -> int:
+        return self._weights.get(key, 0)
+
+    def update(self, key: str, weight: int, text: str) -> None:
+        """
+        Set the weight of a key, adding it with the text to show for it if it is new.
+        """
+        if key not in self._weights:
+            self._texts[key] = text
+            if key not in self._positions:
+                self._pending[key] = None
+                if self._pending_keys is not None and len(self._pending) < self.merge_size:
+                    bisect.insort(self._pending_keys, key)
+                else:
+                    self._pending_keys = None
+        self._weights[key] = weight
+        position = self._positions.get(key)
+        if position is not None:
+            self._set_leaf(position, weight)
+
+    def remove(self, key: str) -> None:
+        """
+        Remove a key.
+        """
+        del self._weights[key], self._texts[key]
+        position = self._positions.get(key)
+        if position is not None:
+            self._set_leaf(position, -1)
+        else:
+            del self._pending[key]
+            if self._pending_keys is not None:
+                del self._pending_keys[bisect.bisect_left(self._pending_keys, key)]
+
+    def complete(self, prefix: str, limit: int = DEFAULT_COMPLETIONS) -> List[Tuple[str, int]]:
+        """
+        Get the texts of the heaviest keys starting with a prefix, with their weights, heaviest first and
+        then in order of key.
+        """
+        if len(self._pending) >= self.merge_size:
+            self._merge()
+        elif self._pending_keys is None:
+            self._pending_keys = sorted(self._pending)
+        pending = self._pending_keys
+        end = prefix + chr(sys.maxunicode)
+        keys = [self._keys[position] for position in self._best(
+            bisect.bisect_left(self._keys, prefix), bisect.bisect_left(self._keys, end), limit
+        )]
+        keys.extend(pending[bisect.bisect_left(pending, prefix):bisect.bisect_left(pending, end)])
+        keys = heapq.nsmallest(limit, keys, key=lambda key: (-self._weights[key], key))
+        return [(self._texts[key], self._weights[key]) for key in keys]
+
+    def _best(self, start: int, stop: int, limit: int) -> List[int]:
+        """
+        Get the positions of the heaviest keys of a slice of the array, heaviest first.
+
+        The best nodes are taken from a heap that starts with the nodes covering the slice; a node is
+        followed down to the best key below it, and the other child at every step joins the heap.
+        """
+        tree, size = self._tree, self._size
+        candidates: List[Tuple[int, int]] = []
+        left, right = start + size, stop + size
+        while left < right:
+            if left & 1:
+                candidates.append((-tree[left], left))
+                left += 1
+            if right & 1:
+                right -= 1
+                candidates.append((-tree[right], right))
+            left >>= 1
+            right >>= 1
+        heapq.heapify(candidates)
+        push, pop = heapq.heappush, heapq.heappop
+        positions: List[int] = []
+        while candidates and len(positions) < limit:
+            value, node = pop(candidates)
+            if value > 0:
+                break
+            while node < size:
+                node *= 2
+                if tree[node] != -value:
+                    node += 1
+                    push(candidates, (-tree[node - 1], node - 1))
+                elif tree[node + 1] >= 0:
+                    push(candidates, (-tree[node + 1], node + 1))
+            positions.append(node - size)
+        return positions
+
+    def _set_leaf(self, position: int, weight: int) -> None:
+        """
+        Set the weight of a key in the array, or -1 for a removed key, and update the nodes above it.
+        """
+        tree, size = self._tree, self._size
+        node = position + size
+        tree[node] = (weight + 1) * size - 1 - position if weight >= 0 else -1
+        node >>= 1
+        while node:
+            best = max(tree[2 * node], tree[2 * node + 1])
+            if tree[node] == best:
+                break
+            tree[node] = best
+            node >>= 1
+
+    def _merge(self) -> None:
+        """
+        Rebuild the array and its tree from the keys that have a weight.
+        """
+        self._keys = sorted([key for key in self._keys if key in self._weights] + list(self._pending))
+        self._positions = {key: position for position, key in enumerate(self._keys)}
+        self._pending, self._pending_keys = {}, []
+        size = 1
+        while size < len(self._keys):
+            size *= 2
+        tree = [-1] * (2 * size)
+        for position, key in enumerate(self._keys):
+            tree[size + position] = (self._weights[key] + 1) * size - 1 - position
+        for node in range(size - 1, 0, -1):
+            tree[node] = max(tree[2 * node], tree[2 * node + 1])
+        self._tree, self._size = tree, size
+
+
+class Completions(View):
+    """
+    Completions of the titles, authors and member names of a library, most popular first.
+
+    A title or an author is as popular as the books carrying it plus the times those books were lent
+    since the view started, and a member name as the members with it plus the books they borrowed.
+    Completions match the start of the normalized text, so ``"the gr"`` completes to "The Great Gatsby".
+
+    :cvar indexes: The completions of every field in ``FIELDS``.
+    :cvar records: The number of books or members carrying every key of every field.
+    :cvar books: The title and author key of every book.
+    :cvar names: The name key of every member.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._indexes: Dict[str, PrefixIndex] = {field: PrefixIndex() for field in FIELDS}
+        self._records: Dict[str, Dict[str, int]] = {field: {} for field in FIELDS}
+        self._books: Dict[int, Tuple[str, str]] = {}
+        self._names: Dict[int, str] = {}
+
+    def on_add_book(self, payload: dict) -> None:
+        title, author = payload["normalized_title"], payload["normalized_author"]
+        self._books[payload["id"]] = title, author
+        self._add("title", title, payload["title"])
+        self._add("author", author, payload["author"])
+
+    def on_remove_book(self, payload: dict) -> None:
+        title, author = self._books.pop(payload["id"])
+        self._remove("title", title)
+        self._remove("author", author)
+
+    def on_add_member(self, payload: dict) -> None:
+        name = _clean_input(payload["name"])
+        self._names[payload["id"]] = name
+        self._add("name", name, payload["name"])
+        for book_id in payload["books_borrowed"]:
+            self._lent(book_id, payload["id"])
+
+    def on_remove_member(self, payload: dict) -> None:
+        self._remove("name", self._names.pop(payload["id"]))
+
+    def on_lend_book(self, payload: dict) -> None:
+        self._lent(payload["book_id"], payload["member_id"])
+
+    def complete(self, field: str, prefix: str, limit: int = DEFAULT_COMPLETIONS) -> List[Tuple[str, int]]:
+        """
+        Get the most popular texts of a field starting with a prefix, with their popularity, most popular first.
+
+        :param field: ``"title"``, ``"author"`` or ``"name"``.
+        :param prefix: The start of the text, as typed.
+        """
+        if field not in self._indexes:
+            raise LibraryError(f"Cannot complete {field}.")
+        with self._lock:
+            return self._indexes[field].complete(_clean_prefix(prefix), limit)
+
+    def suggest(self, field: str, prefix: str) -> Optional[str]:
+        """
+        Get the most popular text of a field that starts with a prefix as typed, letter case aside.
+        """
+        for text, _ in self.complete(field, prefix):
+            if text[:len(prefix)].casefold() == prefix.casefold():
+                return text
+        return None
+
+    def _lent(self, book_id: int, member_id: int) -> None:
+        keys = self._books.get(book_id)
+        if keys is not None:
+            self._weigh("title", keys[0], 1)
+            self._weigh("author", keys[1], 1)
+        name = self._names.get(member_id)
+        if name is not None:
+            self._weigh("name", name, 1)
+
+    def _add(self, field: str, key: str, text: str) -> None:
+        records = self._records[field]
+        records[key] = records.get(key, 0) + 1
+        index = self._indexes[field]
+        index.update(key, index.weight(key) + 1, text)
+
+    def _remove(self, field: str, key: str) -> None:
+        records = self._records[field]
+        records[key] -= 1
+        if records[key]:
+            self._weigh(field, key, -1)
+        else:
+            del records[key]
+            self._indexes[field].remove(key)
+
+    def _weigh(self, field: str, key: str, change: int) -> None:
+        index = self._indexes[field]
+        index.update(key, index.weight(key) + change, "")
+
+
+def _clean_prefix(prefix: str) -> str:
+    """
+    Clean a prefix like a search query, keeping a trailing space so that it only completes whole words.
+    """
+    cleaned = _clean_query(prefix.lstrip())
+    return cleaned + " " if cleaned and prefix[-1:].isspace() else cleaned
@@ -0,0 +1,75 @@
+"""
+Time completions of titles, authors and member names, and what keeping them costs a loan.
+
+A library is filled with fake books and members and a tenth of the books are lent, then completions
+of the first one to six letters of random titles, authors and names are timed, along with the time it
+takes to build the completions and the time ``lend_book`` takes with and without them. Run from the
+repository root with ``python -m benchmarks.bench_autocomplete [books] [samples]``.
+"""
+import random
+import statistics
+import sys
+import time
+from typing import Callable, List
+
+from autocomplete import Completions
+from benchmarks.data import SEED, CatalogGenerator
+from library_manager import Book, Library, Members
+from views import ChangeFeed
+
+MEMBERS = 1000
+PREFIXES = range(1, 7)
+
+
+def percentiles_us(operation: Callable[[object], object], arguments: list) -> List[float]:
+    """
+    Call an operation on every argument and get its median and 99th percentile latency in microseconds.
+    """
+    timings = []
+    for argument in arguments:
+        start = time.perf_counter()
+        operation(argument)
+        timings.append((time.perf_counter() - start) * 1e6)
+    cuts = statistics.quantiles(timings, n=100)
+    return [cuts[49], cuts[98]]
+
+
+def main() -> None:
+    """
+    Print the latency of completions by field and prefix length, and of lending with and without them.
+    """
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    samples = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    rng = random.Random(SEED)
+    generator = CatalogGenerator()
+    library = Library()
+    library.add_books([Book(*row) for row in generator.books(count)])
+    for row in generator.members(MEMBERS):
+        library.add_member(Members(*row, []))
+    books, members = library.page_books(limit=count), library.page_members(limit=MEMBERS)
+    loans = [(rng.choice(members), book) for book in rng.sample(books, count // 5)]
+    before = percentiles_us(lambda loan: library.lend_book(*loan), loans[::2])
+
+    start = time.perf_counter()
+    completions, feed = Completions(), ChangeFeed()
+    feed.subscribe(completions)
+    feed.attach(library)
+    print(f"built in {time.perf_counter() - start:.2f} s ({count} books, {MEMBERS} members)")
+    after = percentiles_us(lambda loan: library.lend_book(*loan), loans[1::2])
+    print(f"{'lend_book':22}{before[0]:10.1f}{before[1]:10.1f}  without completions (p50, p99 us)")
+    print(f"{'lend_book':22}{after[0]:10.1f}{after[1]:10.1f}  with completions")
+
+    texts = {
+        "title": [book.title for book in books],
+        "author": [book.author for book in books],
+        "name": [member.name for member in members],
+    }
+    for field, values in texts.items():
+        for length in PREFIXES:
+            prefixes = [rng.choice(values)[:length] for _ in range(samples)]
+            p50, p99 = percentiles_us(lambda prefix: completions.complete(field, prefix), prefixes)
+            print(f"{'complete ' + field:16}{length:6}{p50:10.1f}{p99:10.1f}")
+
+
+if __name__ == "__main__":
+    main()
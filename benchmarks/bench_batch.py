@@ -0,0 +1,111 @@
+"""
+Compare the per-item cost of the batch mutations with one call per item.
+
+Adds a catalog, lends it in carts of ten books and returns it in shelf runs of 500, once with
+``add_book``, ``lend_book`` and ``return_book`` and once with ``add_books``, ``lend_many`` and
+``return_many``, in memory and on SQLite. Run from the repository root with
+``python -m benchmarks.bench_batch [count]``.
+"""
+import os
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+from faker import Faker
+
+from library_manager import Book, Library, Members
+from storage import SQLiteStorage
+
+SEED = 1234
+CART_SIZE = 10
+SHELF_SIZE = 500
+
+
+def make_books(count: int) -> List[tuple]:
+    """
+    Make the fields of fake books.
+    """
+    faker = Faker()
+    Faker.seed(SEED)
+    return [(i, faker.sentence(nb_words=4), faker.name(), faker.isbn13()) for i in range(count)]
+
+
+def chunks(items: list, size: int) -> List[list]:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def run(library: Library, rows: List[tuple], batched: bool) -> Dict[str, float]:
+    """
+    Add, lend and return every book and get the microseconds per book of each step.
+    """
+    books = [Book(*row) for row in rows]
+    members = [Members(i, f"Member {i}", "555-0100", []) for i in range(len(books) // CART_SIZE + 1)]
+    for member in members:
+        library.add_member(member)
+    timings = {}
+
+    start = time.perf_counter()
+    if batched:
+        library.add_books(books)
+    else:
+        for book in books:
+            library.add_book(book)
+    library.flush()
+    timings["add"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for member, cart in zip(members, chunks(books, CART_SIZE)):
+        if batched:
+            library.lend_many(member, cart)
+        else:
+            for book in cart:
+                library.lend_book(member, book)
+    library.flush()
+    timings["lend"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for shelf in chunks(books, SHELF_SIZE):
+        if batched:
+            library.return_many(shelf)
+        else:
+            for book in shelf:
+                library.return_book(library.get_borrower(book.id), book)
+    library.flush()
+    timings["return"] = time.perf_counter() - start
+
+    return {step: seconds / len(books) * 1e6 for step, seconds in timings.items()}
+
+
+def in_memory(directory: str) -> Library:
+    return Library()
+
+
+def on_sqlite(directory: str) -> Library:
+    path = os.path.join(directory, f"library-{time.monotonic_ns()}.db")
+    return Library(SQLiteStorage(path))
+
+
+def main() -> None:
+    """
+    Print the microseconds per book of every step, one call per book against batches.
+    """
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    rows = make_books(count)
+    backends: Dict[str, Callable[[str], Library]] = {"memory": in_memory, "sqlite": on_sqlite}
+
+    print(f"{'backend':8} {'step':7} {'per call':>10} {'batched':>10} {'speedup':>8}  (us per book, {count} books)")
+    with tempfile.TemporaryDirectory() as directory:
+        for name, make_library in backends.items():
+            results = []
+            for batched in (False, True):
+                library = make_library(directory)
+                results.append(run(library, rows, batched))
+                library.close()
+            for step in results[0]:
+                single, batch = results[0][step], results[1][step]
+                print(f"{name:8} {step:7} {single:10.1f} {batch:10.1f} {single / batch:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
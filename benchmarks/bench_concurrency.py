@@ -0,0 +1,94 @@
+"""
+Measure the throughput of a library shared by threads.
+
+Every worker lends and returns books to its own member, and in the mixed workload also runs a search
+for every checkout. Run from the repository root with
+``python -m benchmarks.bench_concurrency [books] [operations per worker]``.
+"""
+import random
+import sys
+import threading
+import time
+from typing import Callable, List
+
+from faker import Faker
+
+from library_manager import Book, Library, Members
+
+SEED = 1234
+WORKERS = (1, 4, 16)
+
+
+def make_library(count: int, workers: int) -> Library:
+    """
+    Make a library of fake books with one member per worker.
+    """
+    faker = Faker()
+    Faker.seed(SEED)
+    library = Library()
+    library.add_books([Book(i, faker.sentence(nb_words=4), faker.name(), faker.isbn13()) for i in range(count)])
+    for i in range(workers):
+        library.add_member(Members(i, faker.name(), faker.phone_number(), []))
+    return library
+
+
+def checkout(library: Library, member: Members, rng: random.Random, count: int) -> None:
+    """
+    Lend a random book to a member and return it.
+    """
+    book = library.get_book(rng.randrange(count))
+    try:
+        library.lend_book(member, book)
+    except Exception:
+        return
+    library.return_book(member, book)
+
+
+def mixed(library: Library, member: Members, rng: random.Random, count: int) -> None:
+    """
+    Search the catalog, then lend a random book to a member and return it.
+    """
+    title = library.get_book(rng.randrange(count)).title
+    list(library.query_books(title=title[:6], is_available=True, limit=10))
+    checkout(library, member, rng, count)
+
+
+def run(workload: Callable, count: int, workers: int, operations: int) -> float:
+    """
+    Run a workload in a number of threads and get the operations per second.
+    """
+    library = make_library(count, workers)
+    barrier = threading.Barrier(workers + 1)
+
+    def work(index: int) -> None:
+        rng = random.Random(SEED + index)
+        member = library.get_member(index)
+        barrier.wait()
+        for _ in range(operations):
+            workload(library, member, rng, count)
+
+    threads: List[threading.Thread] = [threading.Thread(target=work, args=(i,)) for i in range(workers)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return workers * operations / (time.perf_counter() - start)
+
+
+def main() -> None:
+    """
+    Print the throughput of every workload for 1, 4 and 16 workers.
+    """
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    operations = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+
+    print(f"{'workload':10} {'workers':>7} {'ops/s':>10} ({count} books)")
+    for name, workload in (("checkout", checkout), ("mixed", mixed)):
+        for workers in WORKERS:
+            print(f"{name:10} {workers:7} {run(workload, count, workers, operations):10.0f}")
+
+
+if __name__ == "__main__":
+    main()
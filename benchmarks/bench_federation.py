@@ -0,0 +1,95 @@
+"""
+Compare a single library with federations of several shards.
+
+Times a lookup by id, a title search scattered to every shard and a cross-shard checkout, with the
+median latency of each. Searches only get faster with shards when there are CPUs to run them on;
+lookups always pay for a round trip to a worker process. Run from the repository root with
+``python -m benchmarks.bench_federation [books] [operations]``.
+"""
+import random
+import statistics
+import sys
+import time
+from typing import Callable, Dict, Union
+
+from benchmarks.data import CatalogGenerator
+from federation import FederatedLibrary
+from library_manager import Book, Library, Members
+
+SEED = 1234
+SHARDS = (2, 4)
+BATCH = 10000
+
+
+def populate(library: Union[Library, FederatedLibrary], count: int) -> None:
+    """
+    Add fake books and one member to a library.
+    """
+    generator = CatalogGenerator()
+    books = generator.books(count)
+    while True:
+        batch = [Book(*row) for _, row in zip(range(BATCH), books)]
+        if not batch:
+            break
+        library.add_books(batch)
+    library.add_member(Members(0, "Bench Member", "555-0100", []))
+
+
+def median_us(operation: Callable[[int], None], operations: int) -> float:
+    """
+    Run an operation on random book ids and get its median latency in microseconds.
+    """
+    rng = random.Random(SEED)
+    timings = []
+    for _ in range(operations):
+        book_id = rng.randrange(operations)
+        start = time.perf_counter()
+        operation(book_id)
+        timings.append((time.perf_counter() - start) * 1e6)
+    return statistics.median(timings)
+
+
+def measure(library: Union[Library, FederatedLibrary], operations: int) -> Dict[str, float]:
+    """
+    Time the operations of the benchmark on a library.
+    """
+    member = library.get_member(0)
+    titles = [book.title.split()[0] for book in library.page_books(limit=100)]
+
+    def checkout(book_id: int) -> None:
+        book = library.get_book(book_id)
+        library.lend_book(member, book)
+        library.return_book(member, book)
+
+    return {
+        "get_book": median_us(library.get_book, operations),
+        "query_books title": median_us(
+            lambda book_id: list(library.query_books(title=titles[book_id % len(titles)], limit=10)), operations
+        ),
+        "checkout": median_us(checkout, operations),
+    }
+
+
+def main() -> None:
+    """
+    Print the median latencies of a single library and of every federation.
+    """
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    operations = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+
+    library = Library()
+    populate(library, count)
+    results = {"library": measure(library, operations)}
+    for shards in SHARDS:
+        federation = FederatedLibrary(shards=shards)
+        populate(federation, count)
+        results[f"{shards} shards"] = measure(federation, operations)
+        federation.close()
+
+    print(f"{'operation':18}" + "".join(f"{name:>14}" for name in results) + f"  ({count} books, median us)")
+    for operation in results["library"]:
+        print(f"{operation:18}" + "".join(f"{result[operation]:14.1f}" for result in results.values()))
+
+
+if __name__ == "__main__":
+    main()
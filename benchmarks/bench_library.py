@@ -0,0 +1,253 @@
+"""
+Benchmark the ``Library`` operations across catalog sizes.
+
+For every catalog size a library is filled with seeded fake books and members, then every operation is
+run on a sample of random arguments. Each operation reports its latency percentiles, its throughput
+and the peak memory it allocates above the catalog, measured with ``tracemalloc`` on a second sample
+so the tracing does not slow down the timed one. Results are printed and can be written as JSON, and
+two JSON files can be compared to spot regressions between commits.
+
+Run from the repository root::
+
+    python -m benchmarks.bench_library --sizes 1e3,1e4,1e5 --output results.json
+    python -m benchmarks.bench_library --compare before.json after.json
+
+Memory grows by about 3 KiB per book with the search indexes, so a catalog of 1e7 books needs
+around 30 GiB.
+"""
+import argparse
+import json
+import logging
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Tuple
+
+from benchmarks.data import SEED, CatalogGenerator
+from library_manager import Book, Library, Members, _clean_input
+
+DEFAULT_SIZES = "1e3,1e4,1e5"
+DEFAULT_SAMPLES = 1000
+PERCENTILES = (50, 90, 99)
+REGRESSION_THRESHOLD = 1.2
+
+# An operation prepares its arguments from the library, then is called once per argument.
+Operation = Tuple[Callable[[Library, random.Random, int], list], Callable[[Library, object], object]]
+
+
+def _sample_books(library: Library, rng: random.Random, count: int) -> List[Book]:
+    return rng.sample(list(library._books_by_id.values()), min(count, len(library._books_by_id)))
+
+
+def _title_words(library: Library, rng: random.Random, count: int) -> List[dict]:
+    return [{"title": rng.choice(book.title.split())} for book in _sample_books(library, rng, count)]
+
+
+def _authors(library: Library, rng: random.Random, count: int) -> List[dict]:
+    return [{"author": book.author.split()[-1]} for book in _sample_books(library, rng, count)]
+
+
+def _misspelled_authors(library: Library, rng: random.Random, count: int) -> List[dict]:
+    """
+    Get author surnames with one character dropped or replaced, after building the deletes once.
+    """
+    library._author_index.build_deletes()
+    queries = []
+    for book in _sample_books(library, rng, count):
+        name = book.author.split()[-1]
+        i = rng.randrange(len(name))
+        queries.append({"author": name[:i] + rng.choice(("", "x")) + name[i + 1:]})
+    return queries
+
+
+def _isbn_nos(library: Library, rng: random.Random, count: int) -> List[dict]:
+    return [{"isbn_no": book.isbn_no} for book in _sample_books(library, rng, count)]
+
+
+def _ids(library: Library, rng: random.Random, count: int) -> List[dict]:
+    return [{"id": book.id} for book in _sample_books(library, rng, count)]
+
+
+def _loans(library: Library, rng: random.Random, count: int) -> List[Tuple[Members, Book]]:
+    books = [book for book in _sample_books(library, rng, count * 2) if book.is_available][:count]
+    return [(rng.choice(list(library._members_by_id.values())), book) for book in books]
+
+
+def _lent(library: Library, rng: random.Random, count: int) -> List[Tuple[Members, Book]]:
+    loans = list(library._ledger)
+    return [(library.get_member(loan.member_id), loan.book) for loan in rng.sample(loans, min(count, len(loans)))]
+
+
+def _new_books(library: Library, rng: random.Random, count: int) -> List[Book]:
+    start = max(library._books_by_id) + 1
+    return [
+        Book(start + i, book.title, book.author, book.isbn_no)
+        for i, book in enumerate(_sample_books(library, rng, count))
+    ]
+
+
+def _raw_titles(library: Library, rng: random.Random, count: int) -> List[str]:
+    return [book.title for book in _sample_books(library, rng, count)]
+
+
+OPERATIONS: Dict[str, Operation] = {
+    "clean_input": (_raw_titles, lambda library, title: _clean_input(title)),
+    "search_book id": (_ids, Library.search_book),
+    "search_book isbn_no": (_isbn_nos, Library.search_book),
+    "search_book author": (_authors, Library.search_book),
+    "search_book title": (_title_words, Library.search_book),
+    "search_book fuzzy": (_misspelled_authors, lambda library, query: library.search_book(query, fuzzy=True)),
+    "query_books title": (_title_words, lambda library, query: list(library.query_books(**query))),
+    "add_book": (_new_books, Library.add_book),
+    "lend_book": (_loans, lambda library, loan: library.lend_book(*loan)),
+    "return_book": (_lent, lambda library, loan: library.return_book(*loan)),
+    "remove_book": (_sample_books, Library.remove_book),
+}
+
+
+def build_library(size: int, generator: CatalogGenerator) -> Library:
+    """
+    Make a library of ``size`` books and a member per 100 books.
+    """
+    library = Library()
+    rows = generator.books(size)
+    while True:
+        chunk = [Book(*row) for _, row in zip(range(10000), rows)]
+        if not chunk:
+            break
+        library.add_books(chunk)
+    for row in generator.members(max(1, size // 100)):
+        library.add_member(Members(*row, []))
+    return library
+
+
+def measure(library: Library, operation: Operation, rng: random.Random, samples: int) -> dict:
+    """
+    Time an operation on one sample of arguments and trace its memory on another.
+    """
+    prepare, call = operation
+    arguments = prepare(library, rng, samples)
+    latencies = []
+    start = time.perf_counter()
+    for argument in arguments:
+        before = time.perf_counter_ns()
+        call(library, argument)
+        latencies.append(time.perf_counter_ns() - before)
+    seconds = time.perf_counter() - start
+
+    arguments = prepare(library, rng, samples)
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    for argument in arguments:
+        call(library, argument)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies.sort()
+    result = {"samples": len(latencies), "ops_per_second": len(latencies) / seconds if seconds else 0.0}
+    for percentile in PERCENTILES:
+        index = min(len(latencies) - 1, len(latencies) * percentile // 100)
+        result[f"p{percentile}_us"] = latencies[index] / 1000 if latencies else 0.0
+    result["max_us"] = latencies[-1] / 1000 if latencies else 0.0
+    result["peak_memory_kib"] = (peak - baseline) / 1024
+    return result
+
+
+def run(sizes: List[int], samples: int, seed: int) -> dict:
+    """
+    Benchmark every operation at every catalog size.
+    """
+    generator = CatalogGenerator(seed)
+    results = []
+    for size in sizes:
+        start = time.perf_counter()
+        library = build_library(size, generator)
+        build_seconds = time.perf_counter() - start
+        print(f"{size} books built in {build_seconds:.1f}s, max RSS {_max_rss_mib():.0f} MiB", file=sys.stderr)
+        rng = random.Random(f"{seed}-{size}")
+        for name, operation in OPERATIONS.items():
+            result = dict(operation=name, size=size, **measure(library, operation, rng, samples))
+            results.append(result)
+            _print_result(result)
+        results.append({"operation": "build", "size": size, "seconds": build_seconds, "max_rss_mib": _max_rss_mib()})
+        del library
+    return {"meta": _metadata(sizes, samples, seed), "results": results}
+
+
+def compare(before_path: str, after_path: str) -> int:
+    """
+    Print the change in median latency of every operation between two result files.
+
+    :return: The number of operations at least ``REGRESSION_THRESHOLD`` times slower.
+    """
+    with open(before_path) as file:
+        before = {(r["operation"], r["size"]): r for r in json.load(file)["results"] if "p50_us" in r}
+    with open(after_path) as file:
+        after = {(r["operation"], r["size"]): r for r in json.load(file)["results"] if "p50_us" in r}
+
+    regressions = 0
+    print(f"{'operation':22} {'size':>9} {'before p50':>11} {'after p50':>11} {'ratio':>7}")
+    for key in sorted(before.keys() & after.keys(), key=lambda key: (key[1], key[0])):
+        old, new = before[key]["p50_us"], after[key]["p50_us"]
+        ratio = new / old if old else float("inf")
+        flag = "  REGRESSION" if ratio >= REGRESSION_THRESHOLD else ""
+        regressions += bool(flag)
+        print(f"{key[0]:22} {key[1]:9} {old:9.1f}us {new:9.1f}us {ratio:6.2f}x{flag}")
+    return regressions
+
+
+def _print_result(result: dict) -> None:
+    print(
+        f"{result['operation']:22} {result['size']:>9} "
+        + " ".join(f"p{p} {result[f'p{p}_us']:9.1f}us" for p in PERCENTILES)
+        + f" {result['ops_per_second']:10.0f} ops/s {result['peak_memory_kib']:9.1f} KiB"
+    )
+
+
+def _max_rss_mib() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _metadata(sizes: List[int], samples: int, seed: int) -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.time(),
+        "sizes": sizes,
+        "samples": samples,
+        "seed": seed,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="catalog sizes, e.g. 1e3,1e4,1e5")
+    parser.add_argument("--samples", type=int, default=DEFAULT_SAMPLES, help="calls per operation")
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="compare two result files")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare) else 0)
+
+    logging.getLogger("library_manager").setLevel(logging.CRITICAL)
+    report = run([int(float(size)) for size in args.sizes.split(",")], args.samples, args.seed)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
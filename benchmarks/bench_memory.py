@@ -0,0 +1,105 @@
+"""
+Measure the memory per book of the catalog representations.
+
+Run from the repository root with ``python -m benchmarks.bench_memory [count]``.
+"""
+import gc
+import random
+import sys
+import tracemalloc
+from dataclasses import dataclass
+from typing import Callable, Iterator, List
+
+from faker import Faker
+
+from compact_catalog import CompactCatalog
+from library_manager import Book
+
+SEED = 1234
+
+
+@dataclass
+class DictBook:
+    """
+    The ``Book`` dataclass as it was before it used slots, for comparison.
+    """
+
+    id: int
+    title: str
+    author: str
+    isbn_no: str
+    is_available: bool = True
+
+
+def make_rows(count: int) -> List[tuple]:
+    """
+    Make rows of fake books, with authors and ISBN numbers repeating like in a real catalog.
+    """
+    faker = Faker()
+    Faker.seed(SEED)
+    rng = random.Random(SEED)
+    authors = [faker.name() for _ in range(max(1, count // 20))]
+    isbn_nos = [faker.isbn13() for _ in range(max(1, count // 3))]
+    return [
+        (i, faker.sentence(nb_words=4), rng.choice(authors), rng.choice(isbn_nos), True)
+        for i in range(count)
+    ]
+
+
+def fresh(rows: List[tuple]) -> Iterator[tuple]:
+    """
+    Yield the rows with new string objects, the way a parser would produce them.
+    """
+    for book_id, title, author, isbn_no, is_available in rows:
+        yield book_id + 0, title.encode().decode(), author.encode().decode(), isbn_no.encode().decode(), is_available
+
+
+def build_dict_books(rows: Iterator[tuple]) -> object:
+    return [DictBook(*row) for row in rows]
+
+
+def build_books(rows: Iterator[tuple]) -> object:
+    return [Book(*row) for row in rows]
+
+
+def build_compact_catalog(rows: Iterator[tuple]) -> object:
+    catalog = CompactCatalog()
+    for row in rows:
+        catalog.add(*row)
+    return catalog
+
+
+REPRESENTATIONS = {
+    "list of dataclasses with __dict__": build_dict_books,
+    "list of slotted Book": build_books,
+    "CompactCatalog": build_compact_catalog,
+}
+
+
+def measure(build: Callable[[Iterator[tuple]], object], rows: List[tuple]) -> float:
+    """
+    Measure the bytes per book that a representation keeps after it is built.
+    """
+    gc.collect()
+    tracemalloc.start()
+    result = build(fresh(rows))
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return size / len(rows)
+
+
+def main() -> None:
+    """
+    Print the memory per book of every representation.
+    """
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    rows = make_rows(count)
+
+    print(f"{'representation':36} bytes per book ({count} books)")
+    for name, build in REPRESENTATIONS.items():
+        print(f"{name:36} {measure(build, rows):8.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Compare searches the indexes cannot narrow down, run in the library and with a parallel scanner.
+
+Every query below matches a large share of the catalog, so it checks nearly every book. The best of
+five runs is reported for the library on its own and for scanners with more and more workers, which
+only help with as many free CPUs. Run from the repository root with
+``python -m benchmarks.bench_parallel_scan [books] [workers,...]``.
+"""
+import os
+import sys
+import time
+from typing import Callable
+
+from benchmarks.data import CatalogGenerator
+from library_manager import Book, Library
+from parallel_scan import ParallelScanner
+
+RUNS = 5
+QUERIES = (
+    {"title": "e"},
+    {"title": "in", "is_available": True},
+    {"author": "a"},
+)
+
+
+def best_ms(search: Callable[[], None]) -> float:
+    """
+    Get the fastest of a few runs of a search in milliseconds.
+    """
+    timings = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        search()
+        timings.append((time.perf_counter() - start) * 1e3)
+    return min(timings)
+
+
+def main() -> None:
+    """
+    Print the time of every query without a scanner and with every number of workers.
+    """
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    cpus = os.cpu_count() or 1
+    workers = [int(n) for n in sys.argv[2].split(",")] if len(sys.argv) > 2 else sorted({1, 2, cpus})
+
+    library = Library()
+    library.add_books([Book(*row) for row in CatalogGenerator().books(count)])
+    columns = {"serial": [best_ms(lambda: list(library.query_books(**query))) for query in QUERIES]}
+    for n in workers:
+        scanner = ParallelScanner(workers=n, min_records=0)
+        scanner.attach(library)
+        columns[f"{n} workers"] = [best_ms(lambda: list(library.query_books(**query))) for query in QUERIES]
+        scanner.close()
+
+    print(f"{'query':40}" + "".join(f"{name:>12}" for name in columns) + f"  ({count} books, {cpus} CPUs, ms)")
+    for i, query in enumerate(QUERIES):
+        print(f"{str(query):40}" + "".join(f"{timings[i]:12.1f}" for timings in columns.values()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Load test the HTTP/JSON server with many keep-alive connections pipelining requests.
+
+Starts ``python -m server`` on a free port, fills it with fake books and members over HTTP, then runs
+a mix of searches, lookups, lends and returns. Run from the repository root with
+``python -m benchmarks.bench_server [connections] [requests per connection] [pipeline depth]``, or
+set ``LIBRARY_URL`` to ``host:port`` to load an already running server.
+"""
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from statistics import quantiles
+from typing import List, Tuple
+from urllib.parse import quote
+
+from faker import Faker
+
+SEED = 1234
+BOOKS = 10000
+MEMBERS = 100
+
+
+class Connection:
+    """
+    A keep-alive client connection that can pipeline requests.
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._reader = reader
+        self._writer = writer
+
+    @classmethod
+    async def open(cls, host: str, port: int) -> "Connection":
+        return cls(*await asyncio.open_connection(host, port))
+
+    def send(self, method: str, path: str, body=None) -> None:
+        """
+        Write a request without waiting for its response.
+        """
+        content = json.dumps(body).encode() if body is not None else b""
+        self._writer.write(f"{method} {path} HTTP/1.1\r\nContent-Length: {len(content)}\r\n\r\n".encode() + content)
+
+    async def receive(self) -> Tuple[int, object]:
+        """
+        Read the next response.
+        """
+        head = await self._reader.readuntil(b"\r\n\r\n")
+        length = 0
+        for line in head.split(b"\r\n"):
+            if line.lower().startswith(b"content-length:"):
+                length = int(line.split(b":")[1])
+        body = await self._reader.readexactly(length)
+        return int(head.split(b" ")[1]), json.loads(body)
+
+    def close(self) -> None:
+        self._writer.close()
+
+
+async def populate(host: str, port: int, depth: int) -> List[str]:
+    """
+    Add fake books and members through the API and get the book titles.
+    """
+    faker = Faker()
+    Faker.seed(SEED)
+    requests = [
+        ("POST", "/books", {"id": i, "title": faker.sentence(nb_words=4), "author": faker.name(), "isbn_no": faker.isbn13()})
+        for i in range(BOOKS)
+    ]
+    requests += [("POST", "/members", {"id": i, "name": faker.name(), "phone": faker.phone_number()}) for i in range(MEMBERS)]
+
+    connection = await Connection.open(host, port)
+    for start in range(0, len(requests), depth):
+        batch = requests[start:start + depth]
+        for request in batch:
+            connection.send(*request)
+        for _ in batch:
+            await connection.receive()
+    connection.close()
+    return [body["title"] for method, path, body in requests[:BOOKS]]
+
+
+async def client(host: str, port: int, index: int, count: int, depth: int, titles: List[str]) -> List[float]:
+    """
+    Send a mix of requests in pipelined batches and get the latency of every request.
+    """
+    rng = random.Random(SEED + index)
+    connection = await Connection.open(host, port)
+    latencies = []
+    for _ in range(count // depth):
+        start = time.perf_counter()
+        for _ in range(depth):
+            choice = rng.random()
+            if choice < 0.5:
+                connection.send("GET", f"/books?title={quote(rng.choice(titles)[:6])}&is_available=1&limit=10")
+            elif choice < 0.8:
+                connection.send("GET", f"/books/{rng.randrange(BOOKS)}")
+            elif choice < 0.9:
+                connection.send("POST", "/loans", {"member_id": rng.randrange(MEMBERS), "book_id": rng.randrange(BOOKS)})
+            else:
+                connection.send("DELETE", f"/loans/{rng.randrange(BOOKS)}")
+        for _ in range(depth):
+            await connection.receive()
+            latencies.append(time.perf_counter() - start)
+    connection.close()
+    return latencies
+
+
+async def run(host: str, port: int, connections: int, count: int, depth: int) -> None:
+    """
+    Fill the server and print the throughput and latency of the request mix.
+    """
+    titles = await populate(host, port, depth)
+    start = time.perf_counter()
+    results = await asyncio.gather(*(client(host, port, i, count, depth, titles) for i in range(connections)))
+    seconds = time.perf_counter() - start
+
+    latencies = sorted(latency for result in results for latency in result)
+    percentiles = quantiles(latencies, n=100)
+    print(f"{connections} connections, pipeline depth {depth}, {len(latencies)} requests in {seconds:.2f}s")
+    print(f"throughput {len(latencies) / seconds:10.0f} requests/s")
+    print(f"latency    p50 {percentiles[49] * 1000:.2f}ms  p99 {percentiles[98] * 1000:.2f}ms")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def main() -> None:
+    connections = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    depth = int(sys.argv[3]) if len(sys.argv) > 3 else 8
+
+    server = None
+    if "LIBRARY_URL" in os.environ:
+        host, port = os.environ["LIBRARY_URL"].rsplit(":", 1)
+    else:
+        host, port = "127.0.0.1", str(free_port())
+        environment = dict(os.environ, LIBRARY_PORT=port)
+        environment.pop("LIBRARY_DATABASE", None)
+        server = subprocess.Popen([sys.executable, "-m", "server"], env=environment, stderr=subprocess.DEVNULL)
+        for _ in range(100):
+            try:
+                socket.create_connection((host, int(port))).close()
+                break
+            except OSError:
+                time.sleep(0.05)
+    try:
+        asyncio.run(run(host, int(port), connections, count, depth))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Measure the cold start of the library: import time and the latency of the first query.
+
+Every sample runs in a fresh interpreter, so nothing is cached between samples except the bytecode.
+A sample imports a module, then builds a ``Library``, adds a few books and times the first search,
+which pays for everything imported or compiled on first use. The medians are checked against
+``BUDGETS`` and the command fails when one is exceeded, so the budget can be tracked in CI. Run from
+the repository root with ``python -m benchmarks.bench_startup [--samples N] [--top N] [--output FILE]``.
+"""
+import argparse
+import compileall
+import importlib.util
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List
+
+SAMPLES = 20
+
+# Median milliseconds allowed per module; the interpreter's own startup is not counted.
+BUDGETS: Dict[str, Dict[str, float]] = {
+    "library_manager": {"import_ms": 80.0, "first_query_ms": 10.0},
+    "server": {"import_ms": 150.0, "first_query_ms": 10.0},
+    "library_textual": {"import_ms": 400.0, "first_query_ms": 10.0},
+}
+
+SAMPLE = """
+import json, time
+start = time.perf_counter()
+import {module}
+imported = time.perf_counter()
+from library_manager import Book, Library
+library = Library()
+library.add_books([Book(i, f"Startup title {{i}}", f"Author {{i}}", str(i)) for i in range(100)])
+built = time.perf_counter()
+library.search_book({{"title": "title 42"}})
+list(library.query_books(author="author 7"))
+searched = time.perf_counter()
+print(json.dumps({{
+    "import_ms": (imported - start) * 1e3,
+    "build_ms": (built - imported) * 1e3,
+    "first_query_ms": (searched - built) * 1e3,
+}}))
+"""
+
+
+def sample(module: str, importtime: bool = False) -> subprocess.CompletedProcess:
+    """
+    Run one cold start of a module in a fresh interpreter.
+    """
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", SAMPLE.format(module=module)]
+    environment = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    return subprocess.run(command, capture_output=True, text=True, check=True, env=environment)
+
+
+def measure(module: str, samples: int) -> dict:
+    """
+    Get the median import, build and first query times of a module.
+    """
+    runs = [json.loads(sample(module).stdout) for _ in range(samples)]
+    return {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+
+
+def slowest_imports(module: str, count: int) -> List[tuple]:
+    """
+    Get the modules that took the most time to import, excluding what they import themselves.
+    """
+    timings = []
+    for line in sample(module, importtime=True).stderr.splitlines():
+        fields = line.split("|")
+        if len(fields) == 3 and fields[0].split(":")[-1].strip().isdigit():
+            timings.append((int(fields[0].split(":")[-1]) / 1000, fields[2].strip()))
+    return sorted(timings, reverse=True)[:count]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--samples", type=int, default=SAMPLES, help="fresh interpreters per module")
+    parser.add_argument("--top", type=int, default=0, help="show the slowest imports of every module")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    # Compile up front, since samples run without writing bytecode.
+    compileall.compile_dir(".", quiet=1, legacy=False)
+
+    results = {}
+    over_budget = 0
+    print(f"{'module':16} {'import':>10} {'build':>10} {'first query':>12}  (median of {args.samples})")
+    for module, budget in BUDGETS.items():
+        if importlib.util.find_spec(module.split(".")[0]) is None:
+            continue
+        try:
+            result = measure(module, args.samples)
+        except subprocess.CalledProcessError as error:
+            print(f"{module:16} cannot be imported: {error.stderr.strip().splitlines()[-1]}")
+            continue
+        results[module] = result
+        exceeded = [key for key, limit in budget.items() if result[key] > limit]
+        over_budget += len(exceeded)
+        print(
+            f"{module:16} {result['import_ms']:8.1f}ms {result['build_ms']:8.1f}ms {result['first_query_ms']:10.1f}ms"
+            + "".join(f"  OVER {key} budget of {budget[key]:.0f}ms" for key in exceeded)
+        )
+        for seconds, name in slowest_imports(module, args.top):
+            print(f"    {seconds:8.1f}ms  {name}")
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"budgets": BUDGETS, "results": results}, file, indent=2)
+    sys.exit(1 if over_budget else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Seeded generators of fake catalog data for the benchmarks.
+
+Faker is too slow to make millions of records one by one, so it only fills pools of words, names and
+phone numbers, which a seeded ``random.Random`` then combines. The same seed always gives the same
+records.
+"""
+import random
+from typing import Iterator, List, Tuple
+
+from faker import Faker
+
+SEED = 1234
+WORD_POOL = 5000
+NAME_POOL = 10000
+
+
+class CatalogGenerator:
+    """
+    A generator of fake books and members.
+
+    Authors repeat about once every 20 books and ISBN numbers once every 3 books, like copies in a
+    real catalog.
+
+    :cvar seed: The seed of the Faker pools and of the random choices.
+    """
+
+    def __init__(self, seed: int = SEED) -> None:
+        faker = Faker()
+        faker.seed_instance(seed)
+        self.seed = seed
+        self._words = sorted({faker.word() for _ in range(WORD_POOL)})
+        self._names = [faker.name() for _ in range(NAME_POOL)]
+        self._phones = [faker.phone_number() for _ in range(1000)]
+
+    def books(self, count: int, start: int = 0) -> Iterator[Tuple[int, str, str, str, bool]]:
+        """
+        Generate books as ``(id, title, author, isbn_no, is_available)`` tuples with consecutive ids.
+        """
+        rng = random.Random(f"{self.seed}-books-{start}")
+        authors = self._names[:max(1, min(len(self._names), count // 20))]
+        isbn_nos: List[str] = []
+        for book_id in range(start, start + count):
+            title = " ".join(rng.choices(self._words, k=rng.randint(2, 6))).capitalize()
+            if isbn_nos and rng.random() < 2 / 3:
+                isbn_no = rng.choice(isbn_nos[-1000:])
+            else:
+                isbn_no = make_isbn(rng)
+                isbn_nos.append(isbn_no)
+            yield book_id, title, rng.choice(authors), isbn_no, True
+
+    def members(self, count: int, start: int = 0) -> Iterator[Tuple[int, str, str]]:
+        """
+        Generate members as ``(id, name, phone)`` tuples with consecutive ids.
+        """
+        rng = random.Random(f"{self.seed}-members-{start}")
+        for member_id in range(start, start + count):
+            yield member_id, rng.choice(self._names), rng.choice(self._phones)
+
+
+def make_isbn(rng: random.Random) -> str:
+    """
+    Make a random ISBN-13 number with a valid check digit.
+    """
+    digits = [9, 7, 8] + [rng.randrange(10) for _ in range(9)]
+    check = (10 - sum(digit * (3 if i % 2 else 1) for i, digit in enumerate(digits)) % 10) % 10
+    return "".join(map(str, digits + [check]))
@@ -0,0 +1,247 @@
+import csv
+import json
+import logging
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Deque, Iterator, List, Optional, Tuple
+
+from library_manager import Book, Library, _clean_input
+from storage import SQLiteStorage
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 5000
+MAX_REJECTED = 1000
+TRUE_VALUES = {"1", "true", "yes", "y"}
+FALSE_VALUES = {"0", "false", "no", "n"}
+
+
+@dataclass
+class ImportReport:
+    """
+    The outcome of a bulk import.
+
+    :cvar rows: The number of rows read.
+    :cvar imported: The number of books added to the library.
+    :cvar rejected: The line numbers of the first ``max_rejected`` rejected rows with the reason they
+        were rejected.
+    :cvar rejected_count: The number of rejected rows, including those past ``max_rejected``.
+    :cvar max_rejected: The number of rejected rows kept in ``rejected``.
+    :cvar seconds: The time the import took.
+    """
+
+    rows: int = 0
+    imported: int = 0
+    rejected: List[Tuple[int, str]] = field(default_factory=list)
+    rejected_count: int = 0
+    max_rejected: int = MAX_REJECTED
+    seconds: float = 0.0
+
+    def reject(self, rejected: List[Tuple[int, str]]) -> None:
+        """
+        Count rejected rows, keeping them until ``max_rejected`` are kept.
+        """
+        self.rejected_count += len(rejected)
+        self.rejected.extend(rejected[:self.max_rejected - len(self.rejected)])
+
+    @property
+    def rows_per_second(self) -> float:
+        """
+        The number of rows read per second.
+        """
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+def read_rows(path: str) -> Iterator[Tuple[int, dict]]:
+    """
+    Stream the rows of a CSV or JSON Lines catalog with their line numbers.
+
+    Files ending in ``.jsonl`` or ``.ndjson`` are read as JSON Lines and anything else as CSV with a
+    header row. Unreadable JSON lines are passed on as ``None`` so they are reported as rejected.
+    """
+    with open(path, newline="", encoding="utf-8") as file:
+        if path.endswith((".jsonl", ".ndjson")):
+            for line_no, line in enumerate(file, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    yield line_no, json.loads(line)
+                except ValueError:
+                    yield line_no, None
+        else:
+            reader = csv.DictReader(file)
+            for row in reader:
+                yield reader.line_num, row
+
+
+def parse_chunk(chunk: List[Tuple[int, Optional[dict]]]) -> Tuple[List[tuple], List[Tuple[int, str]]]:
+    """
+    Validate and normalize a chunk of rows.
+
+    This runs in the worker processes, so it only returns plain tuples.
+
+    :return: The valid books as ``(line_no, id, title, author, isbn_no, is_available, normalized_title,
+        normalized_author)`` tuples, and the line numbers of the invalid rows with the reason.
+    """
+    books = []
+    rejected = []
+    for line_no, row in chunk:
+        try:
+            book = _parse_row(row)
+        except ValueError as e:
+            rejected.append((line_no, str(e)))
+            continue
+        books.append((line_no,) + book + (_clean_input(book[1]), _clean_input(book[2])))
+    return books, rejected
+
+
+def import_books(
+    library: Library,
+    path: str,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    workers: Optional[int] = None,
+    max_rejected: int = MAX_REJECTED,
+) -> ImportReport:
+    """
+    Import a catalog file into a library.
+
+    Rows are streamed in chunks that worker processes parse, validate and normalize, while the
+    chunks already parsed are added to the library one batch at a time. At most two chunks per
+    worker are in flight, so memory stays bounded however large the file is. Rows that fail
+    validation or whose id is already taken are rejected without stopping the import.
+
+    :param library: The library to add the books to.
+    :param path: A CSV or JSON Lines file with ``id``, ``title``, ``author``, ``isbn_no`` and
+        optionally ``is_available`` columns.
+    :param chunk_size: The number of rows per chunk.
+    :param workers: The number of worker processes; 0 parses in this process. Defaults to the
+        number of CPUs.
+    :param max_rejected: The number of rejected rows the report keeps; the others are only counted.
+    """
+    report = ImportReport(max_rejected=max_rejected)
+    start = time.perf_counter()
+    rows = read_rows(path)
+    chunks = iter(lambda: list(islice(rows, chunk_size)), [])
+
+    if workers == 0:
+        for chunk in chunks:
+            report.rows += len(chunk)
+            _apply_chunk(library, parse_chunk(chunk), report)
+    else:
+        workers = workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            in_flight: Deque[Future] = deque()
+            for chunk in chunks:
+                report.rows += len(chunk)
+                in_flight.append(executor.submit(parse_chunk, chunk))
+                if len(in_flight) >= 2 * workers:
+                    _apply_chunk(library, in_flight.popleft().result(), report)
+            while in_flight:
+                _apply_chunk(library, in_flight.popleft().result(), report)
+
+    library.flush()
+    report.seconds = time.perf_counter() - start
+    return report
+
+
+def _apply_chunk(library: Library, parsed: Tuple[List[tuple], List[Tuple[int, str]]], report: ImportReport) -> None:
+    """
+    Add the valid books of a parsed chunk to a library in one batch, checking which ids are taken
+    with one lookup for the whole chunk.
+    """
+    rows, rejected = parsed
+    report.reject(rejected)
+
+    books = []
+    ids = library.existing_book_ids(row[1] for row in rows)
+    duplicates = []
+    for line_no, *row in rows:
+        if row[0] in ids:
+            duplicates.append((line_no, f"Book id {row[0]} already exists."))
+            continue
+        ids.add(row[0])
+        book = Book(*row[:5])
+        book.normalized_title, book.normalized_author = row[5:]
+        books.append(book)
+
+    report.reject(duplicates)
+    library.add_books(books)
+    report.imported += len(books)
+
+
+def _parse_row(row: Optional[dict]) -> tuple:
+    """
+    Validate a row and convert it to a book tuple.
+    """
+    if not isinstance(row, dict):
+        raise ValueError("Row is not a record.")
+
+    try:
+        book_id = int(row["id"])
+        title = str(row["title"]).strip()
+        author = str(row["author"]).strip()
+        isbn_no = str(row["isbn_no"]).strip()
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"Invalid or missing field: {e}")
+
+    if not title or not author:
+        raise ValueError("Title and author are required.")
+    if not _is_isbn(isbn_no):
+        raise ValueError(f"Invalid ISBN number {isbn_no!r}.")
+
+    return book_id, title, author, isbn_no, _parse_bool(row.get("is_available"))
+
+
+def _is_isbn(isbn_no: str) -> bool:
+    """
+    Check that an ISBN number has 10 or 13 digits, ignoring hyphens and spaces.
+    """
+    digits = isbn_no.replace("-", "").replace(" ", "")
+    if len(digits) == 10:
+        return digits[:9].isdigit() and (digits[9].isdigit() or digits[9] in "xX")
+    return len(digits) == 13 and digits.isdigit()
+
+
+def _parse_bool(value) -> bool:
+    """
+    Parse an availability flag from JSON or CSV; a missing flag means the book is available.
+    """
+    if value is None or value == "":
+        return True
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    raise ValueError(f"Invalid availability {value!r}.")
+
+
+def main() -> None:
+    """
+    Import catalog files into the library database named by ``LIBRARY_DATABASE``.
+    """
+    logging.basicConfig(level=logging.INFO)
+    database = os.environ.get("LIBRARY_DATABASE")
+    library = Library(SQLiteStorage(database)) if database else Library()
+    try:
+        for path in sys.argv[1:]:
+            report = import_books(library, path)
+            logger.info(
+                "%s: %d rows, %d imported, %d rejected in %.2fs (%.0f rows/s)",
+                path, report.rows, report.imported, report.rejected_count, report.seconds, report.rows_per_second,
+            )
+            for line_no, reason in report.rejected[:20]:
+                logger.info("  line %d: %s", line_no, reason)
+    finally:
+        library.close()
+
+
+if __name__ == "__main__":
+    main()
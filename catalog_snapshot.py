@@ -0,0 +1,546 @@
+import heapq
+import logging
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from library_manager import (
+    DEFAULT_PAGE_SIZE,
+    Book,
+    Library,
+    LibraryError,
+    SearchResult,
+    _clean_input,
+    _clean_query,
+)
+from search_index import TOKEN_PATTERN, TRIGRAM_SIZE, text_score, tokenize, trigrams
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"LIBSNAP\0"
+VERSION = 1
+PAGE_ROWS = 10000
+
+# Every section of a snapshot with the array typecode of its items, in file order. Rows are the books
+# sorted by id; strings are referenced by an offset into the heap and a length in bytes.
+STRING_FIELDS = ("title", "author", "isbn_no", "normalized_title", "normalized_author")
+INDEXES = ("title", "author")
+SECTIONS: Tuple[Tuple[str, str], ...] = (
+    ("heap", "B"),
+    ("ids", "q"),
+    ("available", "B"),
+    *((f"{field}_offsets", "Q") for field in STRING_FIELDS),
+    *((f"{field}_lengths", "I") for field in STRING_FIELDS),
+    ("isbn_rows", "I"),
+    *(
+        (f"{index}_{kind}_{part}", typecode)
+        for index in INDEXES
+        for kind in ("tokens", "trigrams")
+        for part, typecode in (("offsets", "Q"), ("lengths", "I"), ("starts", "Q"), ("postings", "I"))
+    ),
+)
+HEADER = struct.Struct(f"<8sIIQQ{2 * len(SECTIONS)}Q")
+ALIGNMENT = 8
+GALLOP_RATIO = 64
+
+
+def write_snapshot(library: Library, path: str) -> int:
+    """
+    Write the catalog of a library to a binary snapshot that ``CatalogSnapshot`` maps read-only.
+
+    The snapshot holds fixed-width columns of the books sorted by id, a heap of their strings with
+    authors and ISBN numbers stored once, the books sorted by ISBN number, and the title and author
+    token indexes as sorted term dictionaries with posting lists of rows. Columns are written in the
+    native byte order, which the header records. The library's index lock is held while the books are
+    read, like ``Journal.snapshot`` does. The file is written next to ``path`` and moved into place, so
+    readers never see a partial snapshot.
+
+    :return: The number of books written.
+    """
+    heap = bytearray()
+    strings: Dict[str, Tuple[int, int]] = {}
+    columns = {name: array(typecode) for name, typecode in SECTIONS if name != "heap"}
+    terms: Dict[str, Dict[str, List[int]]] = {
+        f"{index}_{kind}": {} for index in INDEXES for kind in ("tokens", "trigrams")
+    }
+
+    def add_string(field: str, value: str) -> None:
+        reference = strings.get(value)
+        if reference is None:
+            encoded = value.encode()
+            reference = strings[value] = (len(heap), len(encoded))
+            heap.extend(encoded)
+        columns[f"{field}_offsets"].append(reference[0])
+        columns[f"{field}_lengths"].append(reference[1])
+
+    available = 0
+    with library._index_lock:
+        for row, book in enumerate(_catalog(library)):
+            columns["ids"].append(book["id"])
+            columns["available"].append(bool(book["is_available"]))
+            available += bool(book["is_available"])
+            for field in STRING_FIELDS:
+                add_string(field, book[field])
+            for index in INDEXES:
+                text = book["normalized_" + index]
+                for token in tokenize(text):
+                    terms[f"{index}_tokens"].setdefault(token, []).append(row)
+                for trigram in trigrams(text):
+                    terms[f"{index}_trigrams"].setdefault(trigram, []).append(row)
+
+    count = len(columns["ids"])
+    isbn_nos = [
+        bytes(heap[offset:offset + length])
+        for offset, length in zip(columns["isbn_no_offsets"], columns["isbn_no_lengths"])
+    ]
+    columns["isbn_rows"].extend(sorted(range(count), key=isbn_nos.__getitem__))
+    for name, postings in terms.items():
+        starts = columns[f"{name}_starts"]
+        starts.append(0)
+        for term in sorted(postings, key=str.encode):
+            encoded = term.encode()
+            columns[f"{name}_offsets"].append(len(heap))
+            columns[f"{name}_lengths"].append(len(encoded))
+            heap.extend(encoded)
+            columns[f"{name}_postings"].extend(postings[term])
+            starts.append(len(columns[f"{name}_postings"]))
+
+    sections = [heap] + [columns[name] for name, _ in SECTIONS[1:]]
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as file:
+        ranges = []
+        position = HEADER.size
+        for section in sections:
+            position = _aligned(position)
+            length = len(section) * (section.itemsize if isinstance(section, array) else 1)
+            ranges += [position, length]
+            position += length
+        flags = 1 if sys.byteorder == "little" else 0
+        file.write(HEADER.pack(MAGIC, VERSION, flags, count, available, *ranges))
+        for section, offset in zip(sections, ranges[::2]):
+            file.write(b"\0" * (offset - file.tell()))
+            file.write(section.tobytes() if isinstance(section, array) else section)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary, path)
+    return count
+
+
+class TermDictionary:
+    """
+    A sorted dictionary of terms and their posting lists of rows, read from a snapshot.
+
+    :cvar snapshot: The snapshot holding the terms in its heap.
+    :cvar offsets: The heap offset of every term.
+    :cvar lengths: The length in bytes of every term.
+    :cvar starts: Where the postings of every term start, plus the end of the last one.
+    :cvar postings: The rows of every term, each posting list in increasing order.
+    """
+
+    def __init__(self, snapshot: "CatalogSnapshot", name: str) -> None:
+        self._snapshot = snapshot
+        self._offsets = snapshot.section(f"{name}_offsets")
+        self._lengths = snapshot.section(f"{name}_lengths")
+        self._starts = snapshot.section(f"{name}_starts")
+        self._postings = snapshot.section(f"{name}_postings")
+
+    def postings(self, term: str) -> Sequence[int]:
+        """
+        Get the rows of a term, as a view of the snapshot.
+        """
+        encoded = term.encode()
+        i = bisect_left(range(len(self._offsets)), encoded, key=self._term)
+        if i < len(self._offsets) and self._term(i) == encoded:
+            return self._postings[self._starts[i]:self._starts[i + 1]]
+        return self._postings[0:0]
+
+    def containing(self, text: str) -> Iterator[Sequence[int]]:
+        """
+        Get the rows of every term containing a text.
+        """
+        encoded = text.encode()
+        for i in range(len(self._offsets)):
+            if encoded in self._term(i):
+                yield self._postings[self._starts[i]:self._starts[i + 1]]
+
+    def _term(self, i: int) -> bytes:
+        return self._snapshot.string(self._offsets[i], self._lengths[i])
+
+
+class CatalogSnapshot:
+    """
+    A catalog snapshot mapped read-only into memory.
+
+    Nothing is deserialized when a snapshot is opened: the sections are typed views of the mapping, and
+    the pages they touch are read on demand and shared through the page cache by every process that
+    maps the same file.
+
+    :cvar count: The number of books.
+    :cvar available_count: The number of available books.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Map a snapshot written by ``write_snapshot``.
+        """
+        with open(path, "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, flags, self.count, self.available_count, *ranges = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC or version != VERSION:
+            self._mmap.close()
+            raise LibraryError("Not a catalog snapshot.")
+        if flags != (1 if sys.byteorder == "little" else 0):
+            self._mmap.close()
+            raise LibraryError("The snapshot was written on a machine with a different byte order.")
+
+        view = memoryview(self._mmap)
+        self._heap_offset = ranges[0]
+        self._sections = {
+            name: view[offset:offset + length].cast(typecode)
+            for (name, typecode), offset, length in zip(SECTIONS, ranges[::2], ranges[1::2])
+        }
+        self._views = [view, *self._sections.values()]
+
+    def section(self, name: str) -> memoryview:
+        """
+        Get a section of the snapshot as a typed view.
+        """
+        return self._sections[name]
+
+    def string(self, offset: int, length: int) -> bytes:
+        """
+        Read bytes from the string heap.
+        """
+        start = self._heap_offset + offset
+        return self._mmap[start:start + length]
+
+    def close(self) -> None:
+        """
+        Release the views and unmap the snapshot.
+        """
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        self._sections = {}
+        self._mmap.close()
+
+
+class SnapshotLibrary:
+    """
+    A read-only library answering lookups and searches directly from a catalog snapshot.
+
+    It supports the read methods of ``Library`` for books, with the same results, and builds a ``Book``
+    only for the records it returns. Lookups by id and ISBN number are binary searches of the columns,
+    and text searches read the posting lists of the snapshot's token indexes. Mutations raise an
+    exception; write a new snapshot to change the catalog.
+
+    :cvar snapshot: The mapped snapshot.
+    :cvar ids: The book id of every row, in increasing order.
+    :cvar available: Whether the book of every row is available.
+    :cvar isbn_rows: The rows sorted by ISBN number, then by id.
+    :cvar indexes: The token and trigram dictionaries of the title and author indexes.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Open a snapshot written by ``write_snapshot``.
+        """
+        self._snapshot = CatalogSnapshot(path)
+        self._ids = self._snapshot.section("ids")
+        self._available = self._snapshot.section("available")
+        self._isbn_rows = self._snapshot.section("isbn_rows")
+        self._strings = {
+            field: (self._snapshot.section(f"{field}_offsets"), self._snapshot.section(f"{field}_lengths"))
+            for field in STRING_FIELDS
+        }
+        self._indexes = {
+            (index, kind): TermDictionary(self._snapshot, f"{index}_{kind}")
+            for index in INDEXES
+            for kind in ("tokens", "trigrams")
+        }
+
+    def _read_only(self, *args, **kwargs) -> None:
+        raise LibraryError("The library is a read-only snapshot.")
+
+    add_book = add_books = remove_book = lend_book = return_book = lend_many = return_many = _read_only
+
+    def close(self) -> None:
+        """
+        Unmap the snapshot.
+        """
+        self._snapshot.close()
+
+    def __len__(self) -> int:
+        return self._snapshot.count
+
+    def get_book(self, book_id: int) -> Optional[Book]:
+        """
+        Get a book by id.
+        """
+        row = self._row(book_id)
+        return self._book(row) if row is not None else None
+
+    def get_book_by_isbn(self, isbn_no: str) -> Optional[Book]:
+        """
+        Get a book by ISBN number, preferring a copy that is available.
+        """
+        rows = self._isbn_copies(isbn_no)
+        for row in rows:
+            if self._available[row]:
+                return self._book(row)
+        return self._book(rows[0]) if rows else None
+
+    def get_books_by_isbn(self, isbn_no: str) -> List[Book]:
+        """
+        Get every copy of a book by ISBN number.
+        """
+        return [self._book(row) for row in self._isbn_copies(isbn_no)]
+
+    def count_available(self, isbn_no: Optional[str] = None) -> int:
+        """
+        Count the available books, or the available copies of an ISBN number.
+        """
+        if isbn_no is None:
+            return self._snapshot.available_count
+        return sum(self._available[row] for row in self._isbn_copies(isbn_no))
+
+    def page_books(
+        self, after: Optional[int] = None, before: Optional[int] = None, limit: int = DEFAULT_PAGE_SIZE
+    ) -> List[Book]:
+        """
+        Get a page of the catalog ordered by id, see ``Library.page_books``.
+        """
+        if after is not None and before is not None:
+            raise LibraryError("Page either after or before an id, not both.")
+        if before is not None:
+            end = bisect_left(self._ids, before)
+            rows = range(max(0, end - limit), end)
+        else:
+            start = bisect_right(self._ids, after) if after is not None else 0
+            rows = range(start, min(start + limit, len(self._ids)))
+        return [self._book(row) for row in rows]
+
+    def search_book(self, book_info: dict) -> Optional[Book]:
+        """
+        Search a book by id, ISBN number, author or title, in that order, see ``Library.search_book``.
+        """
+        try:
+            book = self.get_book(book_info.get("id"))
+            if book is not None:
+                return book
+
+            book = self.get_book_by_isbn(book_info.get("isbn_no"))
+            if book is not None:
+                return book
+
+            for field in ("author", "title"):
+                if book_info.get(field):
+                    query = _clean_query(book_info[field])
+                    for row in self._candidates(field, query):
+                        if query.encode() in self._string(f"normalized_{field}", row):
+                            return self._book(row)
+
+        except Exception as e:
+            logger.error("%s Please try again with different input.", e)
+
+        logger.error("Book not found. Please try again with different input.")
+        return None
+
+    def query_books(
+        self,
+        id: Optional[int] = None,
+        isbn_no: Optional[str] = None,
+        title: Optional[str] = None,
+        author: Optional[str] = None,
+        is_available: Optional[bool] = None,
+        limit: int = DEFAULT_PAGE_SIZE,
+        offset: int = 0,
+        after: Optional[SearchResult] = None,
+    ) -> Iterator[SearchResult]:
+        """
+        Search books matching every given filter, best matches first, see ``Library.query_books``.
+
+        Candidates are scored from the snapshot, and books are only built for the page returned.
+        """
+        title = _clean_query(title) if title else None
+        author = _clean_query(author) if author else None
+
+        postings: List[set] = []
+        if id is not None:
+            row = self._row(id)
+            postings.append({row} if row is not None else set())
+        if isbn_no is not None:
+            postings.append(set(self._isbn_copies(isbn_no)))
+        for field, query in (("title", title), ("author", author)):
+            if query is not None:
+                rows = self._candidates(field, query, scan=False)
+                if rows is not None:
+                    postings.append(set(rows))
+        if postings:
+            rows = set.intersection(*postings)
+        else:
+            rows = range(len(self._ids))
+
+        ranked = []
+        for row in rows:
+            if is_available is not None and bool(self._available[row]) != is_available:
+                continue
+            score = 1.0
+            for field, query in (("title", title), ("author", author)):
+                if query is not None:
+                    text = self._string(f"normalized_{field}", row).decode()
+                    if query not in text:
+                        break
+                    score += text_score(text, query)
+            else:
+                rank = (-score, self._ids[row])
+                if after is None or rank > after.rank:
+                    ranked.append((rank, row))
+
+        page = heapq.nsmallest(offset + limit, ranked)
+        for ((negative_score, _), row) in page[offset:]:
+            yield SearchResult(self._book(row), -negative_score)
+
+    def _row(self, book_id: Optional[int]) -> Optional[int]:
+        """
+        Find the row of a book id.
+        """
+        if book_id is None:
+            return None
+        row = bisect_left(self._ids, book_id)
+        if row < len(self._ids) and self._ids[row] == book_id:
+            return row
+        return None
+
+    def _isbn_copies(self, isbn_no: Optional[str]) -> Sequence[int]:
+        """
+        Get the rows of every copy of an ISBN number, by id.
+        """
+        if isbn_no is None:
+            return ()
+        encoded = isbn_no.encode()
+        key = lambda row: self._string("isbn_no", row)  # noqa: E731
+        start = bisect_left(self._isbn_rows, encoded, key=key)
+        end = bisect_right(self._isbn_rows, encoded, lo=start, key=key)
+        return self._isbn_rows[start:end]
+
+    def _candidates(self, field: str, query: str, scan: bool = True) -> Optional[Sequence[int]]:
+        """
+        Get the rows, in increasing order, that may contain a cleaned query in a normalized field.
+
+        Like ``TokenIndex.candidates``, the trigrams of longer queries are intersected and shorter
+        queries gather the tokens containing them. When the index cannot narrow the query down, every
+        row is a candidate, or ``None`` is returned if ``scan`` is false.
+        """
+        if len(query) >= TRIGRAM_SIZE:
+            trigram_index = self._indexes[field, "trigrams"]
+            postings = sorted((trigram_index.postings(trigram) for trigram in trigrams(query)), key=len)
+            return _intersect(postings)
+
+        if query and TOKEN_PATTERN.fullmatch(query):
+            rows = set()
+            for postings in self._indexes[field, "tokens"].containing(query):
+                rows.update(postings)
+            return sorted(rows)
+
+        return range(len(self._ids)) if scan else None
+
+    def _string(self, field: str, row: int) -> bytes:
+        offsets, lengths = self._strings[field]
+        return self._snapshot.string(offsets[row], lengths[row])
+
+    def _book(self, row: int) -> Book:
+        """
+        Build the book of a row, with its normalized fields filled in.
+        """
+        book = Book(
+            self._ids[row],
+            self._string("title", row).decode(),
+            self._string("author", row).decode(),
+            self._string("isbn_no", row).decode(),
+            bool(self._available[row]),
+        )
+        book.normalized_title = self._string("normalized_title", row).decode()
+        book.normalized_author = self._string("normalized_author", row).decode()
+        return book
+
+
+def _intersect(postings: List[Sequence[int]]) -> List[int]:
+    """
+    Intersect sorted posting lists, shortest first, into a sorted list of rows.
+
+    Rows are looked up by binary search in posting lists much longer than the rows left, and otherwise
+    intersected as sets.
+    """
+    rows = set(postings[0])
+    for other in postings[1:]:
+        if not rows:
+            break
+        if len(other) > GALLOP_RATIO * len(rows):
+            rows = {row for row in rows if _contains(other, row)}
+        else:
+            rows.intersection_update(other)
+    return sorted(rows)
+
+
+def _contains(rows: Sequence[int], row: int) -> bool:
+    """
+    Check whether a sorted posting list contains a row.
+    """
+    i = bisect_left(rows, row)
+    return i < len(rows) and rows[i] == row
+
+
+def _catalog(library: Library) -> Iterator[dict]:
+    """
+    Get every book of a library as a row, by id, paging through the storage backend if there is one.
+    """
+    after = None
+    while True:
+        if library._storage is not None:
+            page = library._storage.page_books(after, None, PAGE_ROWS)
+        else:
+            page = [_book_row(book) for book in library.page_books(after=after, limit=PAGE_ROWS)]
+        if not page:
+            return
+        yield from page
+        after = page[-1]["id"]
+
+
+def _book_row(book: Book) -> dict:
+    return {
+        "id": book.id,
+        "title": book.title,
+        "author": book.author,
+        "isbn_no": book.isbn_no,
+        "is_available": book.is_available,
+        "normalized_title": book.normalized_title or _clean_input(book.title),
+        "normalized_author": book.normalized_author or _clean_input(book.author),
+    }
+
+
+def _aligned(position: int) -> int:
+    return -(-position // ALIGNMENT) * ALIGNMENT
+
+
+def main() -> None:
+    """
+    Write the library database named by ``LIBRARY_DATABASE`` to the snapshot file given as argument.
+    """
+    from storage import SQLiteStorage
+
+    logging.basicConfig(level=logging.INFO)
+    library = Library(SQLiteStorage(os.environ["LIBRARY_DATABASE"]))
+    try:
+        count = write_snapshot(library, sys.argv[1])
+        logger.info("%d books written to %s", count, sys.argv[1])
+    finally:
+        library.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+import sys
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from errors import LibraryError
+
+
+class StringTable:
+    """
+    A table of distinct strings, each stored once and referenced by an integer code.
+
+    :cvar strings: The strings, indexed by code.
+    :cvar codes: The code of every string.
+    """
+
+    def __init__(self) -> None:
+        self._strings: List[str] = []
+        self._codes: Dict[str, int] = {}
+
+    def code(self, string: str) -> int:
+        """
+        Get the code of a string, adding it to the table if needed.
+        """
+        code = self._codes.get(string)
+        if code is None:
+            code = len(self._strings)
+            self._strings.append(sys.intern(string))
+            self._codes[self._strings[code]] = code
+        return code
+
+    def __getitem__(self, code: int) -> str:
+        return self._strings[code]
+
+    def __len__(self) -> int:
+        return len(self._strings)
+
+
+class BookView:
+    """
+    A read-write view of one book of a ``CompactCatalog`` with the fields of a ``Book``.
+
+    Views hold no data of their own, only the catalog and the book id, so they can be created on demand
+    and thrown away. A view follows its book when other books are added or removed.
+
+    :cvar catalog: The catalog the book belongs to.
+    :cvar id: The id of the book.
+    """
+
+    __slots__ = ("_catalog", "_id")
+
+    def __init__(self, catalog: "CompactCatalog", book_id: int) -> None:
+        self._catalog = catalog
+        self._id = book_id
+
+    @property
+    def id(self) -> int:
+        return self._id
+
+    @property
+    def title(self) -> str:
+        return self._catalog._title(self._row)
+
+    @property
+    def author(self) -> str:
+        return self._catalog._authors[self._catalog._author_codes[self._row]]
+
+    @property
+    def isbn_no(self) -> str:
+        return self._catalog._isbn_nos[self._catalog._isbn_codes[self._row]]
+
+    @property
+    def is_available(self) -> bool:
+        return bool(self._catalog._available[self._row])
+
+    @is_available.setter
+    def is_available(self, value: bool) -> None:
+        self._catalog._available[self._row] = value
+
+    @property
+    def _row(self) -> int:
+        """
+        The current row of the book in the catalog columns.
+        """
+        row = self._catalog._row(self._id)
+        if row is None:
+            raise LibraryError("Book not found.")
+        return row
+
+    def __eq__(self, other) -> bool:
+        if not hasattr(other, "isbn_no"):
+            return NotImplemented
+        return (self.id, self.title, self.author, self.isbn_no, self.is_available) == (
+            other.id, other.title, other.author, other.isbn_no, other.is_available
+        )
+
+    def __repr__(self) -> str:
+        return (
+            f"BookView(id={self.id!r}, title={self.title!r}, author={self.author!r}, "
+            f"isbn_no={self.isbn_no!r}, is_available={self.is_available!r})"
+        )
+
+
+class CompactCatalog:
+    """
+    A catalog of books stored as columns instead of one object per book.
+
+    Rows are kept sorted by id, so ids live in a 64-bit integer array that doubles as the id index
+    through binary search, and availability lives in a byte array. Titles are UTF-8 encoded into a
+    single append-only heap and located by offset and length. Authors and ISBN numbers repeat across
+    copies and books, so each distinct one is stored once in a ``StringTable`` and rows hold its
+    32-bit code. ``get`` and iteration hand out ``BookView`` flyweights.
+
+    Adding books in increasing id order, as imports usually do, appends to the columns; other
+    insertions and removals shift the later rows. The title heap keeps the bytes of removed books
+    until ``compact`` is called.
+
+    :cvar ids: The book id of every row, in increasing order.
+    :cvar title_heap: The UTF-8 encoded titles.
+    :cvar title_offsets: The offset of the title of every row in the heap.
+    :cvar title_lengths: The length in bytes of the title of every row.
+    :cvar author_codes: The author code of every row.
+    :cvar isbn_codes: The ISBN number code of every row.
+    :cvar available: Whether the book of every row is available.
+    :cvar authors: The distinct authors.
+    :cvar isbn_nos: The distinct ISBN numbers.
+    """
+
+    def __init__(self, books: Iterable = ()) -> None:
+        """
+        Initialize a catalog, optionally with books or book views.
+        """
+        self._ids = array("q")
+        self._title_heap = bytearray()
+        self._title_offsets = array("Q")
+        self._title_lengths = array("L")
+        self._author_codes = array("L")
+        self._isbn_codes = array("L")
+        self._available = bytearray()
+        self._authors = StringTable()
+        self._isbn_nos = StringTable()
+        for book in books:
+            self.add(book.id, book.title, book.author, book.isbn_no, book.is_available)
+
+    def add(self, book_id: int, title: str, author: str, isbn_no: str, is_available: bool = True) -> BookView:
+        """
+        Add a book and get a view of it.
+        """
+        row = bisect_left(self._ids, book_id)
+        if row < len(self._ids) and self._ids[row] == book_id:
+            raise LibraryError("Book already exists.")
+
+        encoded = title.encode()
+        values = (
+            book_id,
+            len(self._title_heap),
+            len(encoded),
+            self._authors.code(author),
+            self._isbn_nos.code(isbn_no),
+            is_available,
+        )
+        self._title_heap += encoded
+        if row == len(self._ids):
+            for column, value in zip(self._columns(), values):
+                column.append(value)
+        else:
+            for column, value in zip(self._columns(), values):
+                column.insert(row, value)
+        return BookView(self, book_id)
+
+    def remove(self, book_id: int) -> None:
+        """
+        Remove a book by id.
+        """
+        row = self._row(book_id)
+        if row is None:
+            raise LibraryError("Book not found.")
+
+        for column in self._columns():
+            del column[row]
+
+    def compact(self) -> None:
+        """
+        Rewrite the title heap without the titles of removed books.
+        """
+        heap = bytearray()
+        for row, (offset, length) in enumerate(zip(self._title_offsets, self._title_lengths)):
+            self._title_offsets[row] = len(heap)
+            heap += self._title_heap[offset:offset + length]
+        self._title_heap = heap
+
+    def get(self, book_id: int) -> Optional[BookView]:
+        """
+        Get a view of a book by id.
+        """
+        return BookView(self, book_id) if self._row(book_id) is not None else None
+
+    def count_available(self) -> int:
+        """
+        Count the available books.
+        """
+        return self._available.count(1)
+
+    def _columns(self) -> tuple:
+        """
+        The per-row columns, in the order ``add`` fills them.
+        """
+        return (
+            self._ids, self._title_offsets, self._title_lengths, self._author_codes, self._isbn_codes, self._available
+        )
+
+    def _row(self, book_id: int) -> Optional[int]:
+        """
+        Find the row of a book id.
+        """
+        row = bisect_left(self._ids, book_id)
+        if row < len(self._ids) and self._ids[row] == book_id:
+            return row
+        return None
+
+    def _title(self, row: int) -> str:
+        """
+        Decode the title of a row.
+        """
+        offset = self._title_offsets[row]
+        return self._title_heap[offset:offset + self._title_lengths[row]].decode()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, book_id: int) -> bool:
+        return self._row(book_id) is not None
+
+    def __iter__(self) -> Iterator[BookView]:
+        for book_id in self._ids.tolist():
+            yield BookView(self, book_id)
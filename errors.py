@@ -0,0 +1,4 @@
+class LibraryError(ValueError):
+    """
+    An error raised by a ``Library`` for a request it cannot carry out, e.g. lending a book that is out.
+    """
@@ -0,0 +1,658 @@
+import bisect
+import hashlib
+import heapq
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import ExitStack
+from itertools import islice
+from types import GeneratorType
+from typing import Dict, Hashable, Iterable, Iterator, List, Optional, Set, Tuple
+
+from library_manager import (
+    DEFAULT_PAGE_SIZE,
+    LOCK_STRIPES,
+    Book,
+    Library,
+    LibraryError,
+    Members,
+    SearchResult,
+    _clean_query,
+)
+from loans import DEFAULT_LOAN_PERIOD, Loan
+from parallel_scan import default_start_method
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SHARDS = 4
+VIRTUAL_NODES = 64
+
+
+class HashRing:
+    """
+    A consistent hash ring that assigns keys to nodes.
+
+    Every node is placed on the ring at ``replicas`` points, and a key belongs to the node of the first
+    point at or after the hash of the key, wrapping around. Adding or removing a node only moves the
+    keys next to its points, about one in ``len(nodes)``, and the replicas even out the share of every
+    node. Keys are hashed with BLAKE2 rather than ``hash`` so that every process agrees on them.
+
+    :cvar replicas: The number of points of every node.
+    :cvar points: The points of the ring, sorted.
+    :cvar owners: The node of every point.
+    """
+
+    def __init__(self, nodes: Iterable[Hashable] = (), replicas: int = VIRTUAL_NODES) -> None:
+        self._replicas = replicas
+        self._points: List[int] = []
+        self._owners: List[Hashable] = []
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node: Hashable) -> None:
+        """
+        Place a node on the ring.
+        """
+        for replica in range(self._replicas):
+            point = _hash(f"{node}#{replica}")
+            i = bisect.bisect(self._points, point)
+            self._points.insert(i, point)
+            self._owners.insert(i, node)
+
+    def remove(self, node: Hashable) -> None:
+        """
+        Take a node off the ring, handing its keys to the nodes after its points.
+        """
+        kept = [(point, owner) for point, owner in zip(self._points, self._owners) if owner != node]
+        self._points = [point for point, _ in kept]
+        self._owners = [owner for _, owner in kept]
+
+    def node_of(self, key: Hashable) -> Hashable:
+        """
+        Get the node a key belongs to.
+        """
+        if not self._points:
+            raise LibraryError("The ring has no nodes.")
+        i = bisect.bisect_left(self._points, _hash(key))
+        return self._owners[i % len(self._points)]
+
+
+def _hash(key: Hashable) -> int:
+    return int.from_bytes(hashlib.blake2b(str(key).encode(), digest_size=8).digest(), "big")
+
+
+class FederatedLibrary:
+    """
+    A library partitioned into shards, each a ``Library`` in a worker process of its own.
+
+    Books and members are assigned to shards by consistent hashing of their ids, so lookups and
+    mutations of a record go straight to the shard that owns it, and every shard runs its operations one
+    at a time. Searches and pages are sent to every shard at once and the results merged in the order a
+    single library gives them. Records cross the process boundary as copies: mutating a book or member
+    returned by the federation does not change the library.
+
+    A loan is kept by the shard of the book. When a member borrows a book from another shard, they are
+    registered there as a guest for as long as they have books from it, since a library only lends to
+    its own members. Guests are copies of a member and never change the results of searches and pages,
+    and ``get_member`` gathers the books borrowed from every shard. Lending, returning and removing a
+    member hold a lock of the member here, so a member cannot be removed while a lend to them registers
+    a guest elsewhere. Batches spanning several shards are applied on every shard in parallel and undone
+    on the shards where they succeeded if one fails, so a failed batch can be seen for a moment.
+
+    :cvar ring: The consistent hash ring of the shard numbers.
+    :cvar shards: The executor of every shard, with a single worker process holding its library.
+    :cvar guests: The shards where a member is registered as a guest, by member id.
+    :cvar member_locks: The striped locks of the members.
+    """
+
+    def __init__(
+        self,
+        shards: int = DEFAULT_SHARDS,
+        loan_period: float = DEFAULT_LOAN_PERIOD,
+        replicas: int = VIRTUAL_NODES,
+        start_method: Optional[str] = None,
+    ) -> None:
+        """
+        Start the shards.
+
+        :param shards: The number of shards, and of worker processes.
+        :param loan_period: The time in seconds a book is lent for unless a due date is given.
+        :param replicas: The number of points of every shard on the hash ring.
+        :param start_method: How the worker processes are started, ``"fork"``, ``"spawn"`` or
+            ``"forkserver"``; fork where the platform has it, spawn otherwise. The shards start empty and
+            only receive pickled records, so every method works; spawn is slower to start but does not
+            copy the threads and locks of this process.
+        """
+        context = multiprocessing.get_context(start_method or default_start_method())
+        self._ring = HashRing(range(shards), replicas)
+        self._shards = [
+            ProcessPoolExecutor(
+                max_workers=1, mp_context=context, initializer=_start_shard, initargs=(index, self._ring, loan_period)
+            )
+            for index in range(shards)
+        ]
+        self._loan_period = loan_period
+        self._guests: Dict[int, Set[int]] = {}
+        self._member_locks = [threading.RLock() for _ in range(LOCK_STRIPES)]
+
+    def close(self) -> None:
+        """
+        Stop the worker processes; the shards are not persisted.
+        """
+        for shard in self._shards:
+            shard.shutdown()
+
+    def add_book(self, book: Book) -> None:
+        """
+        Add a book to its shard.
+        """
+        self._call(self._book_shard(book.id), "add_book", book)
+
+    def add_books(self, books: List[Book]) -> None:
+        """
+        Add several books at once, all or nothing like ``Library.add_books``.
+        """
+        groups = self._group(books)
+        self._apply(
+            {shard: ("add_books", group) for shard, group in groups.items()},
+            lambda shard: ("_remove_books", groups[shard]),
+        )
+
+    def remove_book(self, book: Book) -> None:
+        """
+        Remove a book from its shard.
+        """
+        self._call(self._book_shard(book.id), "remove_book", book)
+
+    def get_book(self, book_id: int) -> Optional[Book]:
+        """
+        Get a book by id from its shard.
+        """
+        return self._call(self._book_shard(book_id), "get_book", book_id)
+
+    def get_books_by_isbn(self, isbn_no: str) -> List[Book]:
+        """
+        Get every copy of a book by ISBN number, from every shard, ordered by id.
+        """
+        return sorted((book for books in self._scatter("get_books_by_isbn", isbn_no) for book in books), key=_id)
+
+    def get_book_by_isbn(self, isbn_no: str) -> Optional[Book]:
+        """
+        Get a book by ISBN number, preferring a copy that is available.
+        """
+        copies = self.get_books_by_isbn(isbn_no)
+        return next((book for book in copies if book.is_available), copies[0] if copies else None)
+
+    def count_available(self, isbn_no: Optional[str] = None) -> int:
+        """
+        Count the available books, or the available copies of an ISBN number, on every shard.
+        """
+        return sum(self._scatter("count_available", isbn_no))
+
+    def page_books(
+        self, after: Optional[int] = None, before: Optional[int] = None, limit: int = DEFAULT_PAGE_SIZE
+    ) -> List[Book]:
+        """
+        Get a page of the catalog ordered by id, see ``Library.page_books``.
+        """
+        if after is not None and before is not None:
+            raise LibraryError("Page either after or before an id, not both.")
+        return self._merge_page(self._scatter("page_books", after, before, limit), before, limit)
+
+    def query_books(
+        self,
+        id: Optional[int] = None,
+        isbn_no: Optional[str] = None,
+        title: Optional[str] = None,
+        author: Optional[str] = None,
+        is_available: Optional[bool] = None,
+        limit: int = DEFAULT_PAGE_SIZE,
+        offset: int = 0,
+        after: Optional[SearchResult] = None,
+    ) -> Iterator[SearchResult]:
+        """
+        Search books matching every given filter, best matches first, see ``Library.query_books``.
+
+        Every shard returns its best ``offset + limit`` results, ranked the same way, and the sorted
+        lists are merged, so the federation gives the results a single library would.
+        """
+        if id is not None:
+            shards = [self._book_shard(id)]
+        else:
+            shards = range(len(self._shards))
+        filters = dict(id=id, isbn_no=isbn_no, title=title, author=author, is_available=is_available)
+        pages = self._scatter("query_books", **filters, limit=offset + limit, after=after, shards=shards)
+        yield from islice(heapq.merge(*pages, key=lambda result: result.rank), offset, offset + limit)
+
+    def search_book(self, book_info: dict, fuzzy: bool = False) -> Optional[Book]:
+        """
+        Search a book by id, ISBN number, author or title, in that order, see ``Library.search_book``.
+        """
+        book = self.get_book(book_info.get("id")) if book_info.get("id") is not None else None
+        if book is None and book_info.get("isbn_no"):
+            book = self.get_book_by_isbn(book_info["isbn_no"])
+        for field in ("author", "title"):
+            if book is None and book_info.get(field):
+                book = _lowest(self._scatter("_match_book", field, _clean_query(book_info[field])))
+        for field in ("author", "title"):
+            if book is None and fuzzy and book_info.get(field):
+                closest = _closest(self._scatter("_fuzzy_rank", field, _clean_query(book_info[field])))
+                book = self.get_book(closest) if closest is not None else None
+        if book is None:
+            logger.error("Book not found. Please try again with different input.")
+        return book
+
+    def add_member(self, member: Members) -> None:
+        """
+        Add a member to their shard, then lend them the books they already have.
+        """
+        with self._locked(member.id):
+            books = list(member.books_borrowed)
+            self._call(self._member_shard(member.id), "add_member", Members(member.id, member.name, member.phone, []))
+            if books:
+                try:
+                    self.lend_many(member, books)
+                except Exception:
+                    self._call(self._member_shard(member.id), "remove_member", _plain(member))
+                    raise
+
+    def remove_member(self, member: Members) -> None:
+        """
+        Remove a member from their shard and every shard they are a guest of.
+
+        As in a single library, the books they still have stay lent.
+        """
+        with self._locked(member.id):
+            self._call(self._member_shard(member.id), "remove_member", _plain(member))
+            for shard in self._guests.pop(member.id, ()):
+                self._call(shard, "remove_member", _plain(member))
+
+    def get_member(self, member_id: int) -> Optional[Members]:
+        """
+        Get a member by id from their shard, with the books they borrowed from every shard.
+        """
+        member = self._call(self._member_shard(member_id), "get_member", member_id)
+        if member is not None and self._guests.get(member_id):
+            self._add_guest_loans([member])
+        return member
+
+    def page_members(
+        self, after: Optional[int] = None, before: Optional[int] = None, limit: int = DEFAULT_PAGE_SIZE
+    ) -> List[Members]:
+        """
+        Get a page of the members ordered by id, see ``Library.page_members``.
+
+        Shards also page through their guests, which only repeat members of the other shards, so the
+        union of the pages still holds the next members; each is taken from its own shard.
+        """
+        if after is not None and before is not None:
+            raise LibraryError("Page either after or before an id, not both.")
+        members = self._merge_page(self._scatter("page_members", after, before, limit), before, limit)
+        self._add_guest_loans([member for member in members if self._guests.get(member.id)])
+        return members
+
+    def search_member(self, member_info: dict, fuzzy: bool = False) -> Optional[Members]:
+        """
+        Search a member by id or name, see ``Library.search_member``.
+        """
+        member = self.get_member(member_info.get("id")) if member_info.get("id") is not None else None
+        if member is None and member_info.get("name"):
+            match = _lowest(self._scatter("_match_member", _clean_query(member_info["name"])))
+            member = self.get_member(match.id) if match is not None else None
+        if member is None and fuzzy and member_info.get("name"):
+            closest = _closest(self._scatter("_fuzzy_rank", "name", _clean_query(member_info["name"])))
+            member = self.get_member(closest) if closest is not None else None
+        if member is None:
+            logger.error("Member info is not found. Please try again with different input.")
+        return member
+
+    def lend_book(
+        self, member: Members, book: Book, due_at: Optional[float] = None, borrowed_at: Optional[float] = None
+    ) -> Loan:
+        """
+        Lend a book to a member, on the shard of the book.
+        """
+        return self._lend(member, [book], due_at, borrowed_at)[0]
+
+    def lend_many(self, member: Members, books: List[Book], due_at: Optional[float] = None) -> List[Loan]:
+        """
+        Lend several books to a member at once, all or nothing across the shards.
+
+        The books share the same due date; they are lent on their shards in parallel.
+        """
+        if due_at is None:
+            due_at = time.time() + self._loan_period
+        return self._lend(member, books, due_at)
+
+    def return_book(self, member: Members, book: Book) -> None:
+        """
+        Return a book to its shard.
+        """
+        shard = self._book_shard(book.id)
+        with self._locked(member.id):
+            self._forget_guests(shard, self._call(shard, "_return", [book], _plain(member)))
+
+    def return_many(self, books: List[Book], member: Optional[Members] = None) -> None:
+        """
+        Return several books at once, all or nothing across the shards, see ``Library.return_many``.
+        """
+        groups = self._group(books)
+        record = _plain(member) if member is not None else None
+        found = self._gather({shard: ("_loans_of", group) for shard, group in groups.items()})
+        loans = {shard: [loan for loan in shard_loans if loan is not None] for shard, shard_loans in zip(groups, found)}
+        borrowers = {loan.member_id for shard_loans in loans.values() for loan in shard_loans}
+        if member is not None:
+            borrowers.add(member.id)
+        with self._locked(*borrowers):
+            self._apply(
+                {shard: ("_return", group, record, False) for shard, group in groups.items()},
+                lambda shard: ("_restore", loans[shard]),
+            )
+            for shard, dropped in zip(groups, self._gather({shard: ("_drop_guests", borrowers) for shard in groups})):
+                self._forget_guests(shard, dropped)
+
+    def get_loan(self, book_id: int) -> Optional[Loan]:
+        """
+        Get the loan of a book from its shard, if it is lent.
+        """
+        return self._call(self._book_shard(book_id), "get_loan", book_id)
+
+    def get_loans(self, member_id: int) -> List[Loan]:
+        """
+        Get the loans of a member on every shard they borrowed from, oldest first.
+        """
+        shards = {self._member_shard(member_id)} | self._guests.get(member_id, set())
+        loans = self._scatter("get_loans", member_id, shards=sorted(shards))
+        return sorted((loan for shard_loans in loans for loan in shard_loans), key=lambda loan: loan.borrowed_at)
+
+    def due_soon(self, count: int) -> List[Loan]:
+        """
+        Get the ``count`` loans that come due first on any shard, earliest first.
+        """
+        return list(islice(heapq.merge(*self._scatter("due_soon", count), key=_due), count))
+
+    def overdue(self, now: Optional[float] = None) -> List[Loan]:
+        """
+        Get every loan past its due date on any shard, earliest due first.
+        """
+        now = time.time() if now is None else now
+        return list(heapq.merge(*self._scatter("overdue", now), key=_due))
+
+    def _lend(
+        self, member: Members, books: List[Book], due_at: Optional[float], borrowed_at: Optional[float] = None
+    ) -> List[Loan]:
+        """
+        Lend books to a member on the shards of the books, registering the member as a guest where needed.
+        """
+        owner = self._member_shard(member.id)
+        groups = self._group(books)
+        with self._locked(member.id):
+            record = _plain(member)
+            if set(groups) - {owner}:
+                record = self._call(owner, "get_member", member.id)
+                if record is None:
+                    raise LibraryError("Member not found.")
+                record = _plain(record)
+            loans = self._apply(
+                {shard: ("_lend", record, group, due_at, borrowed_at) for shard, group in groups.items()},
+                lambda shard: ("_return", groups[shard], record),
+            )
+            for shard in groups:
+                if shard != owner:
+                    self._guests.setdefault(member.id, set()).add(shard)
+        by_id = {loan.book.id: loan for shard_loans in loans for loan in shard_loans}
+        return [by_id[book.id] for book in books]
+
+    def _forget_guests(self, shard: int, member_ids: List[int]) -> None:
+        """
+        Forget the guests a shard dropped.
+        """
+        for member_id in member_ids:
+            shards = self._guests.get(member_id)
+            if shards is not None:
+                shards.discard(shard)
+                if not shards:
+                    del self._guests[member_id]
+
+    def _add_guest_loans(self, members: List[Members]) -> None:
+        """
+        Add the books members borrowed from the shards they are guests of to their borrowed books.
+        """
+        for member in members:
+            guest_shards = sorted(self._guests.get(member.id, ()))
+            for loans in self._scatter("get_loans", member.id, shards=guest_shards):
+                member.books_borrowed.extend(loan.book for loan in loans)
+
+    def _merge_page(self, pages: List[list], before: Optional[int], limit: int) -> list:
+        """
+        Merge the pages of every shard into the page of the federation, taking each record from its shard.
+        """
+        records = {}
+        for shard, page in enumerate(pages):
+            for record in page:
+                if record.id not in records or self._ring.node_of(record.id) == shard:
+                    records[record.id] = record
+        ids = sorted(records)
+        ids = ids[max(len(ids) - limit, 0):] if before is not None else ids[:limit]
+        return [records[id] for id in ids]
+
+    def _apply(self, calls: Dict[int, tuple], undo) -> list:
+        """
+        Run an operation on several shards in parallel and undo it where it succeeded if it failed anywhere.
+
+        :param calls: The operation and its arguments for every shard.
+        :param undo: Gets the shard and returns the operation and arguments undoing it there.
+        :return: The results of every shard, in the order of ``calls``.
+        """
+        futures = {shard: self._submit(shard, *call) for shard, call in calls.items()}
+        errors = [future.exception() for future in futures.values()]
+        if not any(errors):
+            return [future.result() for future in futures.values()]
+
+        for (shard, future), error in zip(futures.items(), errors):
+            if error is None:
+                self._call(shard, *undo(shard))
+        raise next(error for error in errors if error is not None)
+
+    def _group(self, books: List[Book]) -> Dict[int, List[Book]]:
+        """
+        Group books by shard.
+        """
+        groups: Dict[int, List[Book]] = {}
+        for book in books:
+            groups.setdefault(self._book_shard(book.id), []).append(book)
+        return groups
+
+    def _book_shard(self, book_id: int) -> int:
+        return self._ring.node_of(book_id)
+
+    def _member_shard(self, member_id: int) -> int:
+        return self._ring.node_of(member_id)
+
+    def _locked(self, *member_ids: int) -> ExitStack:
+        """
+        Acquire the striped locks of some members, in stripe order.
+        """
+        stack = ExitStack()
+        for stripe in sorted({hash(member_id) % LOCK_STRIPES for member_id in member_ids}):
+            stack.enter_context(self._member_locks[stripe])
+        return stack
+
+    def _submit(self, shard: int, operation: str, *args, **kwargs) -> Future:
+        return self._shards[shard].submit(_run, operation, *args, **kwargs)
+
+    def _call(self, shard: int, operation: str, *args, **kwargs):
+        """
+        Run an operation on a shard and wait for the result.
+        """
+        return self._submit(shard, operation, *args, **kwargs).result()
+
+    def _scatter(self, operation: str, *args, shards: Optional[Iterable[int]] = None, **kwargs) -> list:
+        """
+        Run an operation on several shards, every shard by default, in parallel.
+        """
+        shards = range(len(self._shards)) if shards is None else shards
+        return [future.result() for future in [self._submit(shard, operation, *args, **kwargs) for shard in shards]]
+
+    def _gather(self, calls: Dict[int, tuple]) -> list:
+        """
+        Run a different call on several shards in parallel, and get the results in the order of ``calls``.
+        """
+        return [future.result() for future in [self._submit(shard, *call) for shard, call in calls.items()]]
+
+
+def _id(record) -> int:
+    return record.id
+
+
+def _due(loan: Loan) -> Tuple[float, int]:
+    return loan.due_at, loan.book.id
+
+
+def _lowest(records: list):
+    """
+    Get the record with the lowest id among the matches of the shards, if any.
+    """
+    return min((record for record in records if record is not None), key=_id, default=None)
+
+
+def _closest(ranks: List[Optional[Tuple[int, int]]]) -> Optional[int]:
+    """
+    Get the id of the record the fewest edits away among the closest records of the shards, if any.
+    """
+    closest = min((rank for rank in ranks if rank is not None), default=None)
+    return closest[1] if closest is not None else None
+
+
+def _plain(member: Members) -> Members:
+    """
+    Copy a member without their borrowed books, to send them to a shard.
+    """
+    return Members(member.id, member.name, member.phone, [])
+
+
+# The state and operations of the worker process of a shard.
+
+_index: int = 0
+_ring: Optional[HashRing] = None
+_library: Optional[Library] = None
+
+
+def _start_shard(index: int, ring: HashRing, loan_period: float) -> None:
+    """
+    Create the library of a shard in its worker process.
+    """
+    global _index, _ring, _library
+    _index, _ring, _library = index, ring, Library(loan_period=loan_period)
+
+
+def _run(operation: str, *args, **kwargs):
+    """
+    Run an operation on the library of the shard, either a ``Library`` method or one of ``SHARD_OPERATIONS``.
+    """
+    function = SHARD_OPERATIONS.get(operation)
+    result = function(_library, *args, **kwargs) if function else getattr(_library, operation)(*args, **kwargs)
+    return _detach(result)
+
+
+def _detach(result):
+    """
+    Copy the members in a result out of the ledger of the shard, and run iterators, to send it back.
+    """
+    if isinstance(result, (list, GeneratorType)):
+        return [_detach(item) for item in result]
+    if isinstance(result, Members):
+        return Members(result.id, result.name, result.phone, list(result.books_borrowed))
+    return result
+
+
+def _owns(member_id: int) -> bool:
+    return _ring.node_of(member_id) == _index
+
+
+def _lend(
+    library: Library, member: Members, books: List[Book], due_at: Optional[float], borrowed_at: Optional[float]
+) -> List[Loan]:
+    """
+    Lend books of the shard to a member, registering them as a guest if they belong to another shard.
+    """
+    guest = not _owns(member.id) and library.get_member(member.id) is None
+    if guest:
+        library.add_member(_plain(member))
+    try:
+        if len(books) == 1:
+            return [library.lend_book(member, books[0], due_at, borrowed_at)]
+        return library.lend_many(member, books, due_at)
+    except Exception:
+        if guest:
+            library.remove_member(member)
+        raise
+
+
+def _return(library: Library, books: List[Book], member: Optional[Members], drop_guests: bool = True) -> List[int]:
+    """
+    Return books to the shard and drop the guests who no longer have any book from it.
+
+    :return: The ids of the guests dropped.
+    """
+    borrowers = {loan.member_id for loan in _loans_of(library, books) if loan is not None}
+    if len(books) == 1 and member is not None:
+        library.return_book(member, books[0])
+    else:
+        library.return_many(books, member)
+    return _drop_guests(library, borrowers) if drop_guests else []
+
+
+def _drop_guests(library: Library, member_ids: Iterable[int]) -> List[int]:
+    """
+    Remove the guests among some members who no longer have any book from the shard.
+    """
+    dropped = []
+    for member_id in member_ids:
+        member = library.get_member(member_id)
+        if member is not None and not _owns(member_id) and not library.get_loans(member_id):
+            library.remove_member(member)
+            dropped.append(member_id)
+    return dropped
+
+
+def _loans_of(library: Library, books: List[Book]) -> List[Optional[Loan]]:
+    return [library.get_loan(book.id) for book in books]
+
+
+def _restore(library: Library, loans: List[Loan]) -> None:
+    """
+    Lend books again with their former loans, to undo returning them.
+    """
+    for loan in loans:
+        library.lend_book(library._find_member_by_id(loan.member_id), loan.book, loan.due_at, loan.borrowed_at)
+
+
+def _fuzzy_rank(library: Library, field: str, query: str) -> Optional[Tuple[int, int]]:
+    """
+    Get the number of edits and the id of the closest book or member of the shard to a cleaned query.
+    """
+    if field == "name":
+        return library._fuzzy_rank(library._members_by_id, library._member_name_index, query, "search_member")
+    index = library._title_index if field == "title" else library._author_index
+    return library._fuzzy_rank(library._books_by_id, index, query, "search_book")
+
+
+def _remove_books(library: Library, books: List[Book]) -> None:
+    for book in books:
+        library.remove_book(book)
+
+
+SHARD_OPERATIONS = {
+    "_lend": _lend,
+    "_return": _return,
+    "_drop_guests": _drop_guests,
+    "_loans_of": _loans_of,
+    "_restore": _restore,
+    "_remove_books": _remove_books,
+    "_fuzzy_rank": _fuzzy_rank,
+    "_match_book": lambda library, field, query: library._match_book(field, query),
+    "_match_member": lambda library, query: library._match_member(query),
+}
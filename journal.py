@@ -0,0 +1,287 @@
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from typing import Iterator, List, Optional, Tuple
+
+from library_manager import Library, _book_payload, _member_payload
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_PATTERN = "journal-*.log"
+SNAPSHOT_PATTERN = "snapshot-*.json"
+
+
+class Journal:
+    """
+    An append-only journal of the mutations of a ``Library``, with periodic snapshots.
+
+    Every mutation is appended as a JSON line with a sequence number. Lines are written and fsynced in
+    groups: a group is committed once it holds ``group_size`` entries or its oldest entry is
+    ``group_delay`` seconds old, so a crash loses at most the uncommitted group. A background thread
+    commits a group that reaches its delay while no entry arrives, so every entry is durable within
+    ``group_delay`` seconds even when the library goes idle. Every ``snapshot_every`` entries the same
+    thread writes the whole library to a snapshot and starts a new journal segment, so ``recover`` only
+    replays the entries after the latest snapshot, and the mutation that makes a snapshot due does not
+    wait for it.
+
+    :cvar directory: The directory holding the journal segments and snapshots.
+    :cvar group_size: The maximum number of entries per commit.
+    :cvar group_delay: The maximum age in seconds of an uncommitted entry.
+    :cvar snapshot_every: The number of entries between snapshots, or 0 to only snapshot on demand.
+    :cvar seq: The sequence number of the last entry.
+    :cvar pending: The entries not committed yet.
+    :cvar lock: The lock serializing writes to the journal.
+    :cvar wakeup: The condition the background thread waits on for a new group, a snapshot coming due
+        or the journal closing.
+    :cvar snapshot_due: Whether the background thread has a periodic snapshot to take.
+    :cvar snapshot_lock: The lock serializing the writing of snapshots.
+    :cvar closed: Whether the journal is closed.
+    :cvar worker: The background thread committing groups that reach their delay and taking snapshots.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        group_size: int = 64,
+        group_delay: float = 0.05,
+        snapshot_every: int = 10000,
+        seq: int = 0,
+    ) -> None:
+        """
+        Open a journal in a directory, starting a new segment after ``seq``.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self._directory = directory
+        self._group_size = group_size
+        self._group_delay = group_delay
+        self._snapshot_every = snapshot_every
+        self._seq = seq
+        self._since_snapshot = 0
+        self._pending: List[str] = []
+        self._pending_since = 0.0
+        self._library: Optional[Library] = None
+        self._lock = threading.RLock()
+        self._wakeup = threading.Condition(self._lock)
+        self._snapshot_due = False
+        self._snapshot_lock = threading.Lock()
+        self._closed = False
+        self._file = open(self._segment_path(seq + 1), "a", encoding="utf-8")
+        self._worker = threading.Thread(target=self._work, name="journal-worker", daemon=True)
+        self._worker.start()
+
+    @property
+    def seq(self) -> int:
+        """
+        The sequence number of the last entry.
+        """
+        return self._seq
+
+    def attach(self, library: Library) -> None:
+        """
+        Record every mutation of a library from now on, and snapshot it periodically.
+        """
+        self._library = library
+        library.add_listener(self.record)
+
+    def record(self, operation: str, payload: dict) -> None:
+        """
+        Append a mutation to the journal.
+        """
+        with self._lock:
+            self._seq += 1
+            if not self._pending:
+                self._pending_since = time.monotonic()
+                self._wakeup.notify()
+            self._pending.append(json.dumps({"seq": self._seq, "op": operation, "args": payload}))
+
+            if len(self._pending) >= self._group_size or time.monotonic() - self._pending_since >= self._group_delay:
+                self.commit()
+
+            self._since_snapshot += 1
+            if self._snapshot_every and self._since_snapshot >= self._snapshot_every and not self._snapshot_due:
+                self._snapshot_due = True
+                self._wakeup.notify()
+
+    def commit(self) -> None:
+        """
+        Write and fsync the pending entries.
+        """
+        with self._lock:
+            if not self._pending:
+                return
+
+            self._file.write("\n".join(self._pending) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._pending = []
+
+    def snapshot(self, library: Library) -> str:
+        """
+        Write a snapshot of a library as of the last entry, then drop the journal it replaces.
+
+        The library's index lock is only held while the records are copied and a new segment is
+        started, so no mutation lands between the last entry and the snapshot; the snapshot is then
+        written and fsynced without holding up mutations. Loans are written with their member, since
+        a removed member's loans stay in the ledger until the books come back.
+
+        :return: The path of the snapshot.
+        """
+        with self._snapshot_lock:
+            with library._index_lock, self._lock:
+                self.commit()
+                seq = self._seq
+                snapshot = {
+                    "seq": seq,
+                    "books": [_book_payload(book) for book in library._books_by_id.values()],
+                    "members": [_member_payload(member) for member in library._members_by_id.values()],
+                    "loans": [
+                        {
+                            "book_id": loan.book.id,
+                            "member_id": loan.member_id,
+                            "borrowed_at": loan.borrowed_at,
+                            "due_at": loan.due_at,
+                        }
+                        for loan in library._ledger
+                    ],
+                }
+                self._file.close()
+                self._file = open(self._segment_path(seq + 1), "a", encoding="utf-8")
+                self._since_snapshot = 0
+
+            path = os.path.join(self._directory, f"snapshot-{seq:012d}.json")
+            temporary = path + ".tmp"
+            with open(temporary, "w", encoding="utf-8") as file:
+                json.dump(snapshot, file, separators=(",", ":"))
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temporary, path)
+
+            paths = _sorted_paths(self._directory, JOURNAL_PATTERN) + _sorted_paths(self._directory, SNAPSHOT_PATTERN)
+            for old in paths:
+                if _path_seq(old) <= seq and old != path:
+                    os.remove(old)
+            return path
+
+    def close(self) -> None:
+        """
+        Stop the background thread, after the snapshot it has due, then commit the pending entries and
+        close the journal.
+        """
+        with self._lock:
+            self._closed = True
+            self._wakeup.notify()
+        self._worker.join()
+        self.commit()
+        self._file.close()
+        if self._library is not None:
+            self._library.remove_listener(self.record)
+            self._library = None
+
+    def _work(self) -> None:
+        """
+        Commit every group once its oldest entry is ``group_delay`` seconds old, and take the periodic
+        snapshots, until the journal closes.
+        """
+        while True:
+            with self._lock:
+                while not self._snapshot_due:
+                    if self._closed:
+                        return
+                    if not self._pending:
+                        self._wakeup.wait()
+                        continue
+                    remaining = self._pending_since + self._group_delay - time.monotonic()
+                    if remaining > 0:
+                        self._wakeup.wait(remaining)
+                    else:
+                        self.commit()
+                self._snapshot_due = False
+                library = self._library
+            # The index lock is taken before the journal lock, like the mutations do.
+            if library is not None:
+                try:
+                    self.snapshot(library)
+                except OSError as e:
+                    logger.error("Could not write a snapshot: %s", e)
+
+    def _segment_path(self, first_seq: int) -> str:
+        """
+        The path of the journal segment starting at a sequence number.
+        """
+        return os.path.join(self._directory, f"journal-{first_seq:012d}.log")
+
+
+def read_journal(directory: str, after: int = 0) -> Iterator[Tuple[int, str, dict]]:
+    """
+    Read the entries of a journal after a sequence number, in order.
+
+    A partially written last line, left by a crash during a commit, ends its segment.
+
+    :return: The sequence number, operation and arguments of every entry.
+    """
+    for path in _sorted_paths(directory, JOURNAL_PATTERN):
+        with open(path, encoding="utf-8") as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    logger.error("Ignoring a truncated journal entry in %s.", path)
+                    break
+                if entry["seq"] > after:
+                    yield entry["seq"], entry["op"], entry["args"]
+
+
+def recover(directory: str, **options) -> Tuple[Library, Journal]:
+    """
+    Rebuild a library from its latest snapshot and the journal after it.
+
+    The loans of members in the snapshot are made by adding them and only need their dates restored;
+    the loans of removed members are checked out in the ledger directly.
+
+    :param directory: The directory holding the journal and snapshots.
+    :param options: Options for the ``Journal`` that keeps recording the recovered library.
+    :return: The library and its journal.
+    """
+    library = Library()
+    seq = 0
+
+    snapshots = _sorted_paths(directory, SNAPSHOT_PATTERN)
+    if snapshots:
+        with open(snapshots[-1], encoding="utf-8") as file:
+            snapshot = json.load(file)
+        seq = snapshot["seq"]
+        for book in snapshot["books"]:
+            library.apply("add_book", book)
+        for member in snapshot["members"]:
+            library.apply("add_member", member)
+        for loan in snapshot.get("loans", ()):
+            member_id = loan.get("member_id")
+            if member_id is not None and library.get_member(member_id) is None:
+                book = library.get_book(loan["book_id"])
+                library._ledger.checkout(book, member_id, loan["borrowed_at"], loan["due_at"])
+            else:
+                library.apply("reschedule_loan", loan)
+
+    for seq, operation, payload in read_journal(directory, after=seq):
+        library.apply(operation, payload)
+
+    journal = Journal(directory, seq=seq, **options)
+    journal.attach(library)
+    return library, journal
+
+
+def _sorted_paths(directory: str, pattern: str) -> List[str]:
+    """
+    List the journal segments or snapshots of a directory by sequence number.
+    """
+    return sorted(glob.glob(os.path.join(directory, pattern)), key=_path_seq)
+
+
+def _path_seq(path: str) -> int:
+    """
+    Get the sequence number in the name of a journal segment or snapshot.
+    """
+    return int(os.path.basename(path).split("-")[1].split(".")[0])
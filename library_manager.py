@@ -1,14 +1,28 @@
+import heapq
 import logging
+import os
 import re
-from dataclasses import dataclass
-from typing import List
+import sys
+import threading
+import time
+from contextlib import ExitStack
+from dataclasses import dataclass, field
+from functools import lru_cache, wraps
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
 
-import unidecode as unidecode
+from errors import LibraryError
+from loans import DEFAULT_LOAN_PERIOD, BorrowedBooks, Loan, LoanLedger, OverdueEvent
+from metrics import Metrics, hit_rate
+from search_index import SortedIds, TokenIndex, text_score
+
+if TYPE_CHECKING:
+    from parallel_scan import ParallelScanner
+    from storage import Storage
 
 logger = logging.getLogger(__name__)
 
 
-@dataclass
+@dataclass(slots=True)
 class Book:
     """
     A Book class that includes a title, author, and ISBN number.
@@ -17,6 +31,8 @@ class Book:
     :cvar title: A title for a book.
     :cvar author: An author for a book.
     :cvar isbn_no: An ISBN number for a book.
+    :cvar normalized_title: The title cleaned with ``_clean_input``, filled in by the library.
+    :cvar normalized_author: The author cleaned with ``_clean_input``, filled in by the library.
     """
 
     id: int
@@ -24,9 +40,11 @@ class Book:
     author: str
     isbn_no: str
     is_available: bool = True
+    normalized_title: str = field(default="", init=False, repr=False, compare=False)
+    normalized_author: str = field(default="", init=False, repr=False, compare=False)
 
 
-@dataclass
+@dataclass(slots=True)
 class Members:
     """
     A Members class that includes a list of books borrowed.
@@ -34,173 +52,1329 @@ class Members:
     :cvar id: A unique id for a member.
     :cvar name: A name for a member.
     :cvar member_id: A unique id for a member.
-    :cvar books_borrowed: A list of books borrowed.
+    :cvar books_borrowed: A list of books borrowed; a view over the loan ledger once the member is in a library.
+    :cvar normalized_name: The name cleaned with ``_clean_input``, filled in by the library.
     """
 
     id: int
     name: str
     phone: str
     books_borrowed: List[Book]
+    normalized_name: str = field(default="", init=False, repr=False, compare=False)
 
     def borrow_book(self, book: Book) -> None:
         """
         Borrow a book.
         """
-        book.is_available = False
         self.books_borrowed.append(book)
+        book.is_available = False
 
     def return_book(self, book: Book) -> None:
         """
         Return a book.
         """
-        book.is_available = True
         self.books_borrowed.remove(book)
+        book.is_available = True
+
+
+@dataclass(frozen=True)
+class SearchResult:
+    """
+    A book found by ``Library.query_books`` with its relevance score.
+
+    :cvar book: The book that matched.
+    :cvar score: How well the book matched; higher is better.
+    """
+
+    book: Book
+    score: float
+
+    @property
+    def rank(self) -> Tuple[float, int]:
+        """
+        The sort key of the result; results are ordered by descending score, then by book id.
+        """
+        return -self.score, self.book.id
+
+
+def _transliterate(text: str) -> str:
+    """
+    Transliterate text to ASCII.
+
+    ``unidecode`` is imported on the first call, which then replaces this function with it, so importing
+    the module stays cheap and later calls pay nothing extra.
+    """
+    global _transliterate
+    from unidecode import unidecode as _transliterate
+
+    return _transliterate(text)
 
 
 def _clean_input(input_str: str) -> str:
     """
     Clean input string.
     """
-    return unidecode.unidecode(re.sub("[.,();]:", "", input_str.lower().rstrip()))
+    return _transliterate(re.sub("[.,();]:", "", input_str.lower().rstrip()))
+
+
+QUERY_CACHE_SIZE = 4096
+DEFAULT_PAGE_SIZE = 20
+LOCK_STRIPES = 64
+
+
+@lru_cache(maxsize=QUERY_CACHE_SIZE)
+def _clean_query(query: str) -> str:
+    """
+    Clean a search query, remembering the most recently used ones.
+
+    Stored records are cleaned once when they are added, so only queries go through this cache.
+    """
+    return _clean_input(query)
+
+
+def _instrumented(method: Callable) -> Callable:
+    """
+    Record the latency and the errors of every call of a ``Library`` method in the library's metrics.
+    """
+    name = method.__name__
+
+    @wraps(method)
+    def instrumented(self, *args, **kwargs):
+        with self._metrics.timer(name):
+            return method(self, *args, **kwargs)
+
+    return instrumented
 
 
 class Library:
     """
     A Library class that includes a list of books and a list of members.
-    """
 
-    _books: List[Book]
-    _members: List[Members]
+    Books are indexed by id and ISBN, and members by id, so exact lookups and removals do not scan them.
+
+    With a storage backend, the storage holds every record and memory only holds the records loaded
+    so far: mutations are written through, and lookups and searches load what they find on demand.
+
+    A library can be shared by threads. Mutations lock the books and members they touch through a fixed
+    set of striped locks, so lending two different books does not contend, and checking that a book is
+    available and lending it happen under the same lock. The in-memory indexes are then updated and the
+    listeners notified under one short index lock, so listeners see mutations in the order they were
+    applied. Lookups and searches take no lock: they read the indexes through atomic copies of the
+    postings and skip records removed while they run.
+    """
 
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        storage: Optional["Storage"] = None,
+        loan_period: float = DEFAULT_LOAN_PERIOD,
+        metrics: Optional[Metrics] = None,
+    ) -> None:
         """
         Initialize a library with an empty list of books and an empty list of members.
 
-        :cvar books: A list of books.
-        :cvar members: A list of members.
+        :param storage: An optional backend that persists the library.
+        :param loan_period: The time in seconds a book is lent for unless a due date is given.
+        :param metrics: Where to record the metrics of the library's operations; a new one by default.
+        :cvar books_by_id: The books by id, in the order they were added.
+        :cvar books_by_isbn: An index of books by ISBN number, one entry per copy.
+        :cvar members_by_id: The members by id, in the order they were added.
+        :cvar book_ids: The ids of the books in memory in order, to page through the catalog.
+        :cvar member_ids: The ids of the members in memory in order, to page through the members.
+        :cvar title_index: A token index of normalized book titles.
+        :cvar author_index: A token index of normalized book authors.
+        :cvar member_name_index: A token index of normalized member names.
+        :cvar storage: The storage backend, if any.
+        :cvar listeners: Callbacks notified of every mutation.
+        :cvar slots: The internal index of every book id in the availability bitmap.
+        :cvar slot_ids: The book id of every slot, or ``None`` for a free slot.
+        :cvar free_slots: The slots released by removed books.
+        :cvar available: The availability bitmap, one byte per slot.
+        :cvar available_count: The number of available books.
+        :cvar available_by_isbn: The number of available copies of every ISBN number.
+        :cvar ledger: The current loans, by book, by member and by due date.
+        :cvar book_locks: The striped locks of the books.
+        :cvar member_locks: The striped locks of the members.
+        :cvar index_lock: The lock held while updating the in-memory indexes and notifying listeners.
+        :cvar metrics: The call counts, latencies, errors and search statistics of the operations.
+        :cvar scanner: The worker processes that scan the catalog when the indexes cannot narrow a search, if any.
         """
-        self._books: List[Book] = []
-        self._members: List[Members] = []
+        self._books_by_id: Dict[int, Book] = {}
+        self._books_by_isbn: Dict[str, Dict[int, Book]] = {}
+        self._members_by_id: Dict[int, Members] = {}
+        self._book_ids = SortedIds()
+        self._member_ids = SortedIds()
+        self._title_index = TokenIndex()
+        self._author_index = TokenIndex()
+        self._member_name_index = TokenIndex()
+        self._storage = storage
+        self._listeners: List[Callable[[str, dict], None]] = []
+        self._slots: Dict[int, int] = {}
+        self._slot_ids: List[Optional[int]] = []
+        self._free_slots: List[int] = []
+        self._available = bytearray()
+        self._available_count = 0
+        self._available_by_isbn: Dict[str, int] = {}
+        self._ledger = LoanLedger(loan_period)
+        self._book_locks = [threading.RLock() for _ in range(LOCK_STRIPES)]
+        self._member_locks = [threading.RLock() for _ in range(LOCK_STRIPES)]
+        self._index_lock = threading.RLock()
+        self._metrics = metrics if metrics is not None else Metrics()
+        self._scanner: Optional["ParallelScanner"] = None
 
+    def add_listener(self, listener: Callable[[str, dict], None]) -> None:
+        """
+        Call a listener after every successful mutation.
+
+        The listener gets the name of the operation, e.g. ``"lend_book"``, and a dictionary of its
+        arguments made of plain values, so it can be serialized and replayed with ``apply``. The payload
+        of ``"add_book"`` also carries the normalized title and author, so listeners need not clean them,
+        and the payload of ``"remove_book"`` the author, so counts by author need not remember every book.
+        """
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[str, dict], None]) -> None:
+        """
+        Stop calling a listener.
+        """
+        self._listeners.remove(listener)
+
+    def set_scanner(self, scanner: Optional["ParallelScanner"]) -> None:
+        """
+        Run the searches the indexes cannot narrow down with a scanner, or in this thread again with ``None``.
+
+        Use ``ParallelScanner.attach``, which also keeps the scanner up to date with the library.
+        """
+        self._scanner = scanner
+
+    def apply(self, operation: str, payload: dict) -> None:
+        """
+        Apply a mutation described the way listeners receive it.
+        """
+        if operation == "add_book":
+            fields = ("id", "title", "author", "isbn_no", "is_available")
+            self.add_book(Book(*(payload[field] for field in fields)))
+        elif operation == "remove_book":
+            self.remove_book(self._find_book_by_id(payload["id"]))
+        elif operation == "add_member":
+            books = [self._find_book_by_id(book_id) for book_id in payload["books_borrowed"]]
+            dates = {loan["book_id"]: (loan["borrowed_at"], loan["due_at"]) for loan in payload.get("loans", ())}
+            self.add_member(Members(payload["id"], payload["name"], payload["phone"], books), loan_dates=dates)
+        elif operation == "remove_member":
+            self.remove_member(self._find_member_by_id(payload["id"]))
+        elif operation == "lend_book":
+            self.lend_book(
+                self._find_member_by_id(payload["member_id"]),
+                self._find_book_by_id(payload["book_id"]),
+                due_at=payload.get("due_at"),
+                borrowed_at=payload.get("borrowed_at"),
+            )
+        elif operation == "reschedule_loan":
+            self.reschedule_loan(
+                self._find_book_by_id(payload["book_id"]), payload["due_at"], borrowed_at=payload.get("borrowed_at")
+            )
+        elif operation == "return_book":
+            book = self._find_book_by_id(payload["book_id"])
+            member = self.get_member(payload["member_id"])
+            if member is None:
+                # The loan of a removed member, which stays until the book comes back.
+                self.return_many([book])
+            else:
+                self.return_book(member, book)
+        else:
+            raise LibraryError(f"Unknown operation {operation}.")
+
+    def _emit(self, operation: str, payload: dict) -> None:
+        """
+        Notify the listeners of a mutation; callers hold the index lock.
+        """
+        for listener in self._listeners:
+            listener(operation, payload)
+
+    def _locked(self, member_ids: Iterable[int] = (), book_ids: Iterable[int] = ()) -> ExitStack:
+        """
+        Acquire the striped locks of some members and books.
+
+        Member locks are taken before book locks and each kind in stripe order, so callers locking
+        overlapping records cannot deadlock.
+        """
+        stack = ExitStack()
+        try:
+            for locks, keys in ((self._member_locks, member_ids), (self._book_locks, book_ids)):
+                for stripe in sorted({hash(key) % LOCK_STRIPES for key in keys}):
+                    stack.enter_context(locks[stripe])
+        except BaseException:
+            stack.close()
+            raise
+        return stack
+
+    @_instrumented
     def add_book(self, book: Book) -> None:
         """
         Add a book to the library.
+
+        Like every mutation, it is written to the storage backend first, so a failed write leaves the
+        library and its listeners unchanged.
+        """
+        with self._locked(book_ids=(book.id,)):
+            if self.get_book(book.id) is not None:
+                raise LibraryError("Book already exists.")
+
+            _normalize_book(book)
+            if self._storage is not None:
+                self._storage.save_book(_book_row(book))
+            with self._index_lock:
+                self._index_book(book)
+                self._emit("add_book", _book_event(book))
+
+    @_instrumented
+    def add_books(self, books: List[Book]) -> None:
+        """
+        Add several books to the library at once.
+
+        The whole batch is checked before any book is added and is added all or nothing: it is written
+        to the storage backend in one transaction before the indexes are updated once for the batch.
+        Books whose normalized fields are already filled in, e.g. by ``bulk_import``, are not
+        normalized again.
         """
-        self._books.append(book)
+        ids = [book.id for book in books]
+        with self._locked(book_ids=ids):
+            if len(set(ids)) != len(ids) or self.existing_book_ids(ids):
+                raise LibraryError("Book already exists.")
+
+            for book in books:
+                _normalize_book(book)
+            if self._storage is not None:
+                self._storage.save_books([_book_row(book) for book in books])
+            with self._index_lock:
+                self._index_books(books)
+                for book in books:
+                    self._emit("add_book", _book_event(book))
 
+    @_instrumented
     def remove_book(self, book: Book) -> None:
         """
         Remove a book from the library.
         """
-        self._books.remove(book)
+        with self._locked(book_ids=(book.id,)):
+            stored = self.get_book(book.id)
+            if stored is None:
+                raise LibraryError("Book not found.")
+
+            if self._storage is not None:
+                self._storage.delete_book(stored.id)
+            with self._index_lock:
+                self._unindex_book(stored)
+                self._emit("remove_book", {"id": stored.id, "author": stored.author})
 
-    def add_member(self, member: Members) -> None:
+    @_instrumented
+    def add_member(self, member: Members, loan_dates: Optional[Dict[int, Tuple[float, float]]] = None) -> None:
         """
         Add a member to the library.
+
+        Books the member already borrowed are lent to them, and become unavailable. They are looked up
+        by id, so the library's own books are lent whichever objects the member came with.
+
+        :param loan_dates: When each borrowed book was lent and is due back, by book id. Books left out
+            are lent now for one loan period.
+        :raises LibraryError: If the member exists, or a borrowed book is unknown or lent to someone else.
         """
-        self._members.append(member)
+        with self._locked(member_ids=(member.id,), book_ids=[book.id for book in member.books_borrowed]):
+            if self.get_member(member.id) is not None:
+                raise LibraryError("Member already exists.")
+            borrowed: List[Book] = []
+            seen: Set[int] = set()
+            for book in member.books_borrowed:
+                stored = self.get_book(book.id)
+                if stored is None:
+                    raise LibraryError("Book not found.")
+                if self.get_loan(stored.id) is not None or stored.id in seen:
+                    raise LibraryError("Book not available.")
+                seen.add(stored.id)
+                borrowed.append(stored)
 
+            member.normalized_name = _clean_input(member.name)
+            now = time.time()
+            dates = [(loan_dates or {}).get(book.id, (now, now + self._ledger.loan_period)) for book in borrowed]
+            if self._storage is not None:
+                loans = [
+                    {"book_id": book.id, "member_id": member.id, "borrowed_at": borrowed_at, "due_at": due_at}
+                    for book, (borrowed_at, due_at) in zip(borrowed, dates)
+                ]
+                self._storage.save_member(_member_row(member), loans)
+            with self._index_lock:
+                member.books_borrowed = []
+                self._index_member(member)
+                for book, (borrowed_at, due_at) in zip(borrowed, dates):
+                    self._ledger.checkout(book, member.id, borrowed_at, due_at)
+                    book.is_available = False
+                    self._set_available(book, False)
+                self._emit("add_member", _member_payload(member))
+
+    @_instrumented
     def remove_member(self, member: Members) -> None:
         """
         Remove a member from the library.
         """
-        self._members.remove(member)
+        with self._locked(member_ids=(member.id,)):
+            stored = self.get_member(member.id)
+            if stored is None:
+                raise LibraryError("Member not found.")
+
+            if self._storage is not None:
+                self._storage.delete_member(stored.id)
+            with self._index_lock:
+                self._unindex_member(stored)
+                self._emit("remove_member", {"id": stored.id})
+
+    def existing_book_ids(self, book_ids: Iterable[int]) -> Set[int]:
+        """
+        Get which of some book ids are taken, asking the storage backend in batches for those not in memory.
+        """
+        book_ids = set(book_ids)
+        existing = {book_id for book_id in book_ids if book_id in self._books_by_id}
+        if self._storage is not None and len(existing) < len(book_ids):
+            existing |= self._storage.existing_book_ids(book_ids - existing)
+        return existing
+
+    def get_book(self, book_id: int) -> Optional[Book]:
+        """
+        Get a book by id.
+        """
+        book = self._books_by_id.get(book_id)
+        if book is None and self._storage is not None:
+            row = self._storage.load_book(book_id)
+            if row is not None:
+                book = self._load_book(row)
+        return book
+
+    def get_book_by_isbn(self, isbn_no: str) -> Optional[Book]:
+        """
+        Get a book by ISBN number, preferring a copy that is available.
+        """
+        copies = self.get_books_by_isbn(isbn_no)
+        if not copies:
+            return None
+
+        for book in copies:
+            if book.is_available:
+                return book
+        return copies[0]
+
+    def get_books_by_isbn(self, isbn_no: str) -> List[Book]:
+        """
+        Get every copy of a book by ISBN number.
+        """
+        if isbn_no is None:
+            return []
+        if self._storage is not None:
+            for row in self._storage.find_books(isbn_no=isbn_no):
+                self._load_book(row)
+        return list(self._books_by_isbn.get(isbn_no, {}).values())
+
+    def get_member(self, member_id: int) -> Optional[Members]:
+        """
+        Get a member by id.
+        """
+        member = self._members_by_id.get(member_id)
+        if member is None and self._storage is not None:
+            row = self._storage.load_member(member_id)
+            if row is not None:
+                member = self._load_member(row)
+        return member
+
+    @_instrumented
+    def page_books(
+        self, after: Optional[int] = None, before: Optional[int] = None, limit: int = DEFAULT_PAGE_SIZE
+    ) -> List[Book]:
+        """
+        Get a page of the catalog ordered by id, to browse it without loading every book.
+
+        Pages are keyed by id rather than by position, so adding or removing books does not shift them.
+
+        :param after: Get the books with an id greater than this one, from the start by default.
+        :param before: Get the books with an id lower than this one instead, to page backwards.
+        :param limit: The maximum number of books.
+        """
+        if after is not None and before is not None:
+            raise LibraryError("Page either after or before an id, not both.")
+        if self._storage is not None:
+            return [self._load_book(row) for row in self._storage.page_books(after, before, limit)]
+        with self._index_lock:
+            keys = self._book_ids.page(after, before, limit)
+        return [book for book in map(self._books_by_id.get, keys) if book is not None]
+
+    @_instrumented
+    def page_members(
+        self, after: Optional[int] = None, before: Optional[int] = None, limit: int = DEFAULT_PAGE_SIZE
+    ) -> List[Members]:
+        """
+        Get a page of the members ordered by id, see ``page_books``.
+        """
+        if after is not None and before is not None:
+            raise LibraryError("Page either after or before an id, not both.")
+        if self._storage is not None:
+            return [self._load_member(row) for row in self._storage.page_members(after, before, limit)]
+        with self._index_lock:
+            keys = self._member_ids.page(after, before, limit)
+        return [member for member in map(self._members_by_id.get, keys) if member is not None]
+
+    def count_available(self, isbn_no: Optional[str] = None) -> int:
+        """
+        Count the available books, or the available copies of an ISBN number, without scanning them.
+        """
+        if self._storage is not None:
+            return self._storage.count_books(isbn_no=isbn_no, is_available=True)
+        if isbn_no is None:
+            return self._available_count
+        return self._available_by_isbn.get(isbn_no, 0)
+
+    def flush(self) -> None:
+        """
+        Make every change so far durable in the storage backend.
+        """
+        if self._storage is not None:
+            self._storage.flush()
+
+    def close(self) -> None:
+        """
+        Flush and close the storage backend.
+        """
+        if self._storage is not None:
+            self._storage.close()
+
+    def _index_book(self, book: Book) -> None:
+        """
+        Add a book to the in-memory lists and indexes.
+        """
+        self._index_books([book])
+
+    def _index_books(self, books: List[Book]) -> None:
+        """
+        Add books to the in-memory lists and indexes, updating the token indexes once for all of them.
+
+        Normalized fields that are already filled in are kept.
+        """
+        for book in books:
+            _normalize_book(book)
+            self._books_by_id[book.id] = book
+            self._books_by_isbn.setdefault(book.isbn_no, {})[book.id] = book
+            self._allocate_slot(book)
+        self._book_ids.add_many(book.id for book in books)
+        self._title_index.add_many((book.id, book.normalized_title) for book in books)
+        self._author_index.add_many((book.id, book.normalized_author) for book in books)
+
+    def _unindex_book(self, book: Book) -> None:
+        """
+        Remove a book from the in-memory lists and indexes.
+        """
+        self._release_slot(book)
+        del self._books_by_id[book.id]
+        copies = self._books_by_isbn[book.isbn_no]
+        del copies[book.id]
+        if not copies:
+            del self._books_by_isbn[book.isbn_no]
+        self._title_index.remove(book.id, book.normalized_title)
+        self._author_index.remove(book.id, book.normalized_author)
+        self._book_ids.remove(book.id)
+
+    def _allocate_slot(self, book: Book) -> None:
+        """
+        Give a book a slot in the availability bitmap, reusing a released slot if there is one.
+        """
+        if self._free_slots:
+            slot = self._free_slots.pop()
+            self._slot_ids[slot] = book.id
+        else:
+            slot = len(self._slot_ids)
+            self._slot_ids.append(book.id)
+            self._available.append(False)
+        self._slots[book.id] = slot
+        self._set_available(book, book.is_available)
+
+    def _release_slot(self, book: Book) -> None:
+        """
+        Take a book out of the availability bitmap.
+        """
+        self._set_available(book, False)
+        slot = self._slots.pop(book.id)
+        self._slot_ids[slot] = None
+        self._free_slots.append(slot)
+
+    def _set_available(self, book: Book, is_available: bool) -> None:
+        """
+        Update the availability bitmap and counts for a book; books not in the library are ignored.
+        """
+        slot = self._slots.get(book.id)
+        if slot is None or self._available[slot] == is_available:
+            return
+
+        self._available[slot] = is_available
+        delta = 1 if is_available else -1
+        self._available_count += delta
+        copies = self._available_by_isbn.get(book.isbn_no, 0) + delta
+        if copies:
+            self._available_by_isbn[book.isbn_no] = copies
+        else:
+            del self._available_by_isbn[book.isbn_no]
+
+    def _available_ids(self) -> Iterator[int]:
+        """
+        Get the ids of the available books by scanning the bitmap.
+        """
+        slot = self._available.find(1)
+        while slot != -1:
+            yield self._slot_ids[slot]
+            slot = self._available.find(1, slot + 1)
+
+    def _index_member(self, member: Members) -> None:
+        """
+        Add a member to the in-memory lists and indexes, with a view of their loans in the ledger as
+        ``books_borrowed``; the loans themselves are checked out by the caller.
+        """
+        member.books_borrowed = BorrowedBooks(self._ledger, member.id)
+
+        self._members_by_id[member.id] = member
+        self._member_ids.add(member.id)
+        member.normalized_name = member.normalized_name or _clean_input(member.name)
+        self._member_name_index.add(member.id, member.normalized_name)
+
+    def _unindex_member(self, member: Members) -> None:
+        """
+        Remove a member from the in-memory lists and indexes.
+
+        Their loans stay in the ledger, since the books are still out, and the member gets a plain
+        list of them back.
+        """
+        member.books_borrowed = list(member.books_borrowed)
+        del self._members_by_id[member.id]
+        self._member_name_index.remove(member.id, member.normalized_name)
+        self._member_ids.remove(member.id)
+
+    def _load_book(self, row: dict) -> Book:
+        """
+        Get the in-memory book for a row of the storage backend, loading it if needed.
+        """
+        book = self._books_by_id.get(row["id"])
+        if book is None:
+            with self._index_lock:
+                book = self._books_by_id.get(row["id"])
+                if book is None:
+                    book = Book(row["id"], row["title"], row["author"], row["isbn_no"], row["is_available"])
+                    self._index_book(book)
+        return book
+
+    def _load_member(self, row: dict) -> Members:
+        """
+        Get the in-memory member for a row of the storage backend, loading it and their loans if needed.
+        """
+        member = self._members_by_id.get(row["id"])
+        if member is None:
+            with self._index_lock:
+                member = self._members_by_id.get(row["id"])
+                if member is None:
+                    member = Members(row["id"], row["name"], row["phone"], [])
+                    self._index_member(member)
+                    for loan in self._storage.load_loans(member.id):
+                        book = self.get_book(loan["book_id"])
+                        if book is not None and self._ledger.loan_of(book.id) is None:
+                            self._ledger.checkout(book, member.id, loan["borrowed_at"], loan["due_at"])
+        return member
+
+    def get_loan(self, book_id: int) -> Optional[Loan]:
+        """
+        Get the loan of a book, if it is lent.
+        """
+        if self._ledger.loan_of(book_id) is None and self._storage is not None:
+            book = self.get_book(book_id)
+            row = self._storage.load_loan(book_id)
+            if row is not None and self.get_member(row["member_id"]) is None and book is not None:
+                # The loan of a removed member, kept until the book comes back.
+                with self._index_lock:
+                    if self._ledger.loan_of(book_id) is None:
+                        self._ledger.checkout(book, row["member_id"], row["borrowed_at"], row["due_at"])
+        return self._ledger.loan_of(book_id)
+
+    def get_loans(self, member_id: int) -> List[Loan]:
+        """
+        Get the loans of a member, oldest first.
+        """
+        self.get_member(member_id)
+        return self._ledger.loans_of(member_id)
+
+    def get_borrower(self, book_id: int) -> Optional[Members]:
+        """
+        Get the member who has a book, if it is lent.
+        """
+        loan = self.get_loan(book_id)
+        return self.get_member(loan.member_id) if loan is not None else None
+
+    def metrics_snapshot(self) -> dict:
+        """
+        Get the metrics of the library's operations so far, as plain values.
+
+        On top of ``Metrics.snapshot``, ``query_cache`` has the hits of the cache of cleaned queries and
+        ``index`` how often the token indexes narrowed a text search down instead of scanning, and how
+        many searches went to the parallel scanner.
+        """
+        snapshot = self._metrics.snapshot()
+        cache = _clean_query.cache_info()
+        counters = snapshot["counters"]
+        snapshot["query_cache"] = {
+            "hits": cache.hits,
+            "misses": cache.misses,
+            "size": cache.currsize,
+            "hit_rate": hit_rate(cache.hits, cache.misses),
+        }
+        snapshot["index"] = {
+            "hits": counters.get("index.hits", 0),
+            "scans": counters.get("index.scans", 0),
+            "hit_rate": hit_rate(counters.get("index.hits", 0), counters.get("index.scans", 0)),
+            "parallel_scans": counters.get("index.parallel_scans", 0),
+        }
+        return snapshot
 
-    def lend_book(self, member: Members, book: Book) -> None:
+    @staticmethod
+    def query_cache_info():
+        """
+        Get the hits, misses and size of the cache of cleaned search queries.
+        """
+        return _clean_query.cache_info()
+
+    @_instrumented
+    def lend_book(
+        self, member: Members, book: Book, due_at: Optional[float] = None, borrowed_at: Optional[float] = None
+    ) -> Loan:
         """
         Lend a book to a member.
+
+        The loan is recorded in the ledger, where the member's ``books_borrowed`` view sees it. Checking
+        that the book is available and lending it happen under the locks of the member and the book, so
+        concurrent callers cannot lend the same book twice.
+
+        :param due_at: When the book is due back. Defaults to one loan period after it is lent.
+        :param borrowed_at: When the book is lent. Defaults to now.
         """
-        if not self._is_valid_member(member.id):
-            raise Exception("Member not found.")
+        with self._locked(member_ids=(member.id,), book_ids=(book.id,)):
+            member = self._find_member_by_id(member.id)
+            book = self.get_book(book.id) or book
 
-        if not self._is_book_available(book):
-            raise Exception("Book not available.")
+            if not self._is_book_available(book) or self._ledger.loan_of(book.id) is not None:
+                raise LibraryError("Book not available.")
+
+            borrowed_at = time.time() if borrowed_at is None else borrowed_at
+            due_at = borrowed_at + self._ledger.loan_period if due_at is None else due_at
+            payload = {"member_id": member.id, "book_id": book.id, "borrowed_at": borrowed_at, "due_at": due_at}
+            if self._storage is not None:
+                self._storage.save_loans([payload])
+            with self._index_lock:
+                loan = self._ledger.checkout(book, member.id, borrowed_at, due_at)
+                book.is_available = False
+                self._set_available(book, False)
+                self._emit("lend_book", payload)
+            return loan
+
+    @_instrumented
+    def reschedule_loan(self, book: Book, due_at: float, borrowed_at: Optional[float] = None) -> Loan:
+        """
+        Change when a lent book is due back, e.g. to renew it.
+        """
+        with self._locked(book_ids=(book.id,)):
+            if self.get_loan(book.id) is None:
+                raise LibraryError("Book not borrowed.")
 
-        member.borrow_book(book)
+            payload = {"book_id": book.id, "due_at": due_at}
+            if borrowed_at is not None:
+                payload["borrowed_at"] = borrowed_at
+            if self._storage is not None:
+                loan = self._ledger.loan_of(book.id)
+                since = loan.borrowed_at if borrowed_at is None else borrowed_at
+                self._storage.save_loan(book.id, loan.member_id, since, due_at)
+            with self._index_lock:
+                loan = self._ledger.reschedule(book.id, due_at, borrowed_at)
+                self._emit("reschedule_loan", payload)
+            return loan
 
+    @_instrumented
+    def due_soon(self, count: int) -> List[Loan]:
+        """
+        Get the ``count`` loans that come due first, earliest first, leaving out those already swept.
+        """
+        if self._storage is not None:
+            self._load_due_loans(limit=count)
+        with self._index_lock:
+            return self._ledger.due_soon(count)
+
+    @_instrumented
+    def overdue(self, now: Optional[float] = None) -> List[Loan]:
+        """
+        Get every loan past its due date, earliest due first.
+        """
+        now = time.time() if now is None else now
+        if self._storage is not None:
+            self._load_due_loans(until=now)
+        with self._index_lock:
+            return self._ledger.overdue(now)
+
+    @_instrumented
+    def sweep_overdue(self, now: Optional[float] = None) -> List[OverdueEvent]:
+        """
+        Report the loans that came due since the last sweep, each only once, earliest due first.
+
+        Only the loans that came due are visited, so this can run often whatever the size of the library.
+        """
+        now = time.time() if now is None else now
+        if self._storage is not None:
+            self._load_due_loans(until=now)
+        with self._index_lock:
+            return self._ledger.sweep(now)
+
+    def _load_due_loans(self, until: Optional[float] = None, limit: Optional[int] = None) -> None:
+        """
+        Load the loans of the storage backend that are due first into the ledger.
+        """
+        for row in self._storage.load_due_loans(until=until, limit=limit):
+            if self._ledger.loan_of(row["book_id"]) is None:
+                self.get_loan(row["book_id"])
+
+    @_instrumented
     def return_book(self, member: Members, book: Book) -> None:
         """
         Return a book to the library.
         """
-        if not self._is_valid_member(member.id):
-            raise Exception("Member not found.")
+        with self._locked(member_ids=(member.id,), book_ids=(book.id,)):
+            member = self._find_member_by_id(member.id)
+            book = self.get_book(book.id) or book
+
+            if self._is_book_available(book) or not self._ledger.has_loan(member.id, book.id):
+                raise LibraryError("Book not borrowed.")
 
-        if self._is_book_available(book):
-            raise Exception("Book not borrowed.")
+            if self._storage is not None:
+                self._storage.delete_loans([book.id])
+            with self._index_lock:
+                member.return_book(book)
+                self._set_available(book, True)
+                self._emit("return_book", {"member_id": member.id, "book_id": book.id})
 
-        member.return_book(book)
+    @_instrumented
+    def lend_many(self, member: Members, books: List[Book], due_at: Optional[float] = None) -> List[Loan]:
+        """
+        Lend several books to a member at once, e.g. a whole cart at checkout.
+
+        Every book is checked before any is lent, and the batch is lent all or nothing: the loans are
+        written to the storage backend in one transaction, then recorded in the ledger under one hold
+        of the index lock. The books share the same loan dates.
+
+        :param due_at: When the books are due back. Defaults to one loan period from now.
+        """
+        with self._locked(member_ids=(member.id,), book_ids=[book.id for book in books]):
+            member = self._find_member_by_id(member.id)
+            books = [self.get_book(book.id) or book for book in books]
+            if len({book.id for book in books}) != len(books):
+                raise LibraryError("Book not available.")
+            for book in books:
+                if not self._is_book_available(book):
+                    raise LibraryError("Book not available.")
+
+            borrowed_at = time.time()
+            due_at = borrowed_at + self._ledger.loan_period if due_at is None else due_at
+            payloads = [
+                {"member_id": member.id, "book_id": book.id, "borrowed_at": borrowed_at, "due_at": due_at}
+                for book in books
+            ]
+            if self._storage is not None:
+                self._storage.save_loans(payloads)
+            with self._index_lock:
+                loans = []
+                for book, payload in zip(books, payloads):
+                    loans.append(self._ledger.checkout(book, member.id, borrowed_at, due_at))
+                    book.is_available = False
+                    self._set_available(book, False)
+                    self._emit("lend_book", payload)
+            return loans
+
+    @_instrumented
+    def return_many(self, books: List[Book], member: Optional[Members] = None) -> None:
+        """
+        Return several books at once, e.g. a run of the returns shelf.
+
+        Every book is checked to be lent, to ``member`` if given, before any is returned, and the batch
+        is returned all or nothing like ``lend_many``.
+        """
+        borrowers = {loan.member_id for loan in map(self.get_loan, (book.id for book in books)) if loan is not None}
+        if member is not None:
+            borrowers.add(member.id)
+        with self._locked(member_ids=borrowers, book_ids=[book.id for book in books]):
+            books = [self.get_book(book.id) or book for book in books]
+            if len({book.id for book in books}) != len(books):
+                raise LibraryError("Book not borrowed.")
+            loans = [self._ledger.loan_of(book.id) for book in books]
+            for loan in loans:
+                if loan is None or loan.member_id not in borrowers:
+                    raise LibraryError("Book not borrowed.")
+                if member is not None and loan.member_id != member.id:
+                    raise LibraryError("Book not borrowed.")
+
+            if self._storage is not None:
+                self._storage.delete_loans([book.id for book in books])
+            with self._index_lock:
+                for book, loan in zip(books, loans):
+                    self._ledger.checkin(book.id)
+                    book.is_available = True
+                    self._set_available(book, True)
+                    self._emit("return_book", {"member_id": loan.member_id, "book_id": book.id})
 
     def _is_book_available(self, book: Book) -> bool:
         """
         Check if a book is available in the library.
         """
+        slot = self._slots.get(book.id)
+        if slot is not None:
+            return bool(self._available[slot])
+
         if book.is_available:
             return True
 
         return False
 
-    def _find_member_by_id(self, member_id: int) -> Exception:
+    def _find_book_by_id(self, book_id: int) -> Book:
+        """
+        Find a book by id.
+        """
+        book = self.get_book(book_id)
+        if book is None:
+            raise LibraryError("Book not found.")
+        return book
+
+    def _find_member_by_id(self, member_id: int) -> Members:
         """
         Find a member by id.
         """
-        for member in self._members:
-            if member_id == member.id:
-                return member
-        return Exception("Member not found.")
+        member = self.get_member(member_id)
+        if member is None:
+            raise LibraryError("Member not found.")
+        return member
 
     def _is_valid_member(self, member_id: int) -> bool:
         """
         Check if a member is valid.
         """
-        for member in self._members:
-            if member_id == member.id:
-                return True
-            continue
-        return False
+        return self.get_member(member_id) is not None
 
-    def search_book(self, book_info: dict) -> Book:
+    @_instrumented
+    def search_book(self, book_info: dict, fuzzy: bool = False) -> Optional[Book]:
         """
-        Search a book by title.
+        Search a book by id, ISBN number, author or title, in that order.
+
+        Id and ISBN number are answered from the indexes, author and title from the token indexes.
 
         :param book_info: A dictionary of book information.{id: int, title: str, author: str, isbn_no: str}
+        :param fuzzy: Whether to tolerate typos when nothing contains the author or title, see ``_fuzzy_match``.
         """
         try:
-            # TODO: Add more search options. now checking only one field that is available in book_info by priority.
-            for book in self._books:
-                if book_info["id"] == book.id:
-                    return book
-                elif book_info["isbn_no"] == book.isbn_no:
-                    return book
-                # TODO: Add more search options.
-                elif _clean_input(book_info["author"]) in _clean_input(book.author):
+            book = self.get_book(book_info.get("id"))
+            if book is not None:
+                return book
+
+            book = self.get_book_by_isbn(book_info.get("isbn_no"))
+            if book is not None:
+                return book
+
+            if book_info.get("author"):
+                book = self._match_book("author", _clean_query(book_info["author"]))
+                if book is not None:
                     return book
-                # TODO: Add more search options.
-                elif _clean_input(book_info["title"]) in _clean_input(book.title):
+
+            if book_info.get("title"):
+                book = self._match_book("title", _clean_query(book_info["title"]))
+                if book is not None:
                     return book
 
+            for field, index in (("author", self._author_index), ("title", self._title_index)):
+                if fuzzy and book_info.get(field):
+                    book = self._fuzzy_match(self._books_by_id, index, _clean_query(book_info[field]), "search_book")
+                    if book is not None:
+                        return book
+
         except Exception as e:
-            logger.error(e, "Please try again with different input.")
+            logger.error("%s Please try again with different input.", e)
+
+        self._metrics.count("search_book.misses")
+        logger.error("Book not found. Please try again with different input.")
+        return None
+
+    def query_books(
+        self,
+        id: Optional[int] = None,
+        isbn_no: Optional[str] = None,
+        title: Optional[str] = None,
+        author: Optional[str] = None,
+        is_available: Optional[bool] = None,
+        limit: int = DEFAULT_PAGE_SIZE,
+        offset: int = 0,
+        after: Optional[SearchResult] = None,
+    ) -> Iterator[SearchResult]:
+        """
+        Search books matching every given filter, best matches first.
+
+        Title and author match as substrings of the normalized fields, and the other filters match
+        exactly. Only the best ``offset + limit`` results are kept, so asking for a page does not sort
+        every match; with storage, the page is ranked by the storage and only its books are loaded.
+        Results are computed when the iterator is first advanced.
+
+        :param id: A book id.
+        :param isbn_no: An ISBN number.
+        :param title: A part of the title.
+        :param author: A part of the author.
+        :param is_available: Whether the book is available.
+        :param limit: The maximum number of results.
+        :param offset: The number of results to skip.
+        :param after: A result from a previous page; only results ranked after it are returned.
+        """
+        with self._metrics.timer("query_books"):
+            title = _clean_query(title) if title else None
+            author = _clean_query(author) if author else None
+
+            if self._storage is not None and id is None:
+                page = self._rank_stored_books(isbn_no, title, author, is_available, offset + limit, after)
+            else:
+                page = self._rank_books(id, isbn_no, title, author, is_available, offset + limit, after)
+        yield from page[offset:]
+
+    def _rank_books(
+        self,
+        id: Optional[int],
+        isbn_no: Optional[str],
+        title: Optional[str],
+        author: Optional[str],
+        is_available: Optional[bool],
+        limit: int,
+        after: Optional[SearchResult],
+    ) -> List[SearchResult]:
+        """
+        Get the best matches of a search from the books in memory, or from the scanner for long scans.
+        """
+        keys = self._book_candidates(id, isbn_no, title, author, is_available)
+        if self._scans_in_parallel(len(keys) if isinstance(keys, (set, list)) else self._available_count):
+            return self._scan_books(title, author, isbn_no, is_available, limit, after)
+        scored = self._score_books(keys, isbn_no, title, author, is_available)
+        if after is not None:
+            scored = (result for result in scored if result.rank > after.rank)
+        return heapq.nsmallest(limit, scored, key=lambda result: result.rank)
+
+    def _book_candidates(
+        self,
+        id: Optional[int],
+        isbn_no: Optional[str],
+        title: Optional[str],
+        author: Optional[str],
+        is_available: Optional[bool],
+    ) -> Iterable[int]:
+        """
+        Get the ids of the books that may match the filters, narrowed down with the indexes.
+        """
+        if id is not None and self._storage is not None:
+            return [id] if self.get_book(id) is not None else []
+
+        postings: List[Set[int]] = []
+        if id is not None:
+            postings.append({id} if id in self._books_by_id else set())
+        if isbn_no is not None:
+            postings.append(set(self._books_by_isbn.get(isbn_no, ())))
+        for index, query in ((self._title_index, title), (self._author_index, author)):
+            if query is not None:
+                keys = index.candidates(query)
+                self._metrics.count("index.scans" if keys is None else "index.hits")
+                if keys is not None:
+                    postings.append(keys)
+
+        if not postings:
+            return self._available_ids() if is_available else list(self._books_by_id)
+
+        postings.sort(key=len)
+        keys = postings[0]
+        for other in postings[1:]:
+            keys = keys & other
+        return keys
+
+    def _score_books(
+        self,
+        keys: Iterable[int],
+        isbn_no: Optional[str],
+        title: Optional[str],
+        author: Optional[str],
+        is_available: Optional[bool],
+    ) -> Iterator[SearchResult]:
+        """
+        Check the candidate books against the filters and score the ones that match.
+
+        The number of candidates checked is recorded as ``records_scanned.query_books``.
+        """
+        scanned = 0
+        try:
+            for key in keys:
+                scanned += 1
+                book = self._books_by_id.get(key)
+                slot = self._slots.get(key)
+                if book is None or slot is None:
+                    continue
+                if isbn_no is not None and book.isbn_no != isbn_no:
+                    continue
+                if is_available is not None and self._available[slot] != is_available:
+                    continue
+
+                score = 1.0
+                if title is not None:
+                    if title not in book.normalized_title:
+                        continue
+                    score += text_score(book.normalized_title, title)
+                if author is not None:
+                    if author not in book.normalized_author:
+                        continue
+                    score += text_score(book.normalized_author, author)
+                yield SearchResult(book, score)
+        finally:
+            self._metrics.observe_value("records_scanned.query_books", scanned)
 
-        return logger.error(e, "Book not found. Please try again with different input.")
+    def _rank_stored_books(
+        self,
+        isbn_no: Optional[str],
+        title: Optional[str],
+        author: Optional[str],
+        is_available: Optional[bool],
+        limit: int,
+        after: Optional[SearchResult],
+    ) -> List[SearchResult]:
+        """
+        Get the best matches of a search from the storage, loading only the books returned.
+        """
+        rows = self._storage.rank_books(
+            isbn_no, title, author, is_available, limit, after.rank if after is not None else None
+        )
+        self._metrics.observe_value("records_scanned.query_books", len(rows))
+        return [SearchResult(self._load_book(row), score) for row, score in rows]
 
-    def search_member(self, member_info: dict) -> Members:
+    def _scans_in_parallel(self, count: int) -> bool:
+        """
+        Check whether a search that has to check ``count`` books goes to the scanner.
+        """
+        return self._scanner is not None and self._storage is None and count >= self._scanner.min_records
+
+    def _scan_books(
+        self,
+        title: Optional[str],
+        author: Optional[str],
+        isbn_no: Optional[str],
+        is_available: Optional[bool],
+        limit: int,
+        after: Optional[SearchResult],
+    ) -> List[SearchResult]:
+        """
+        Get the best matches of a search from the scanner, leaving out books removed since it answered.
+        """
+        ranks, scanned = self._scanner.query(
+            title, author, isbn_no, is_available, limit, after.rank if after is not None else None
+        )
+        self._metrics.count("index.parallel_scans")
+        self._metrics.observe_value("records_scanned.query_books", scanned)
+        books = [(self._books_by_id.get(book_id), -score) for score, book_id in ranks]
+        return [SearchResult(book, score) for book, score in books if book is not None]
+
+    @_instrumented
+    def search_member(self, member_info: dict, fuzzy: bool = False) -> Optional[Members]:
         """
         Search a member by name or id.
 
         :param member_info:
+        :param fuzzy: Whether to tolerate typos when no name contains the query, see ``_fuzzy_match``.
         :return:
         """
         try:
-            for member in self._members:
-                if member_info["id"] == member.id:
+            member = self.get_member(member_info.get("id"))
+            if member is not None:
+                return member
+
+            if member_info.get("name"):
+                member = self._match_member(_clean_query(member_info["name"]))
+                if member is not None:
                     return member
-                elif _clean_input(member_info["name"]) in _clean_input(member.name):
+
+            if fuzzy and member_info.get("name"):
+                query = _clean_query(member_info["name"])
+                member = self._fuzzy_match(self._members_by_id, self._member_name_index, query, "search_member")
+                if member is not None:
                     return member
 
         except Exception as e:
-            logger.error(e, "Please try again with different input.")
+            logger.error("%s Please try again with different input.", e)
+
+        self._metrics.count("search_member.misses")
+        logger.error("Member info is not found. Please try again with different input.")
+        return None
+
+    def _match_book(self, field: str, query: str) -> Optional[Book]:
+        """
+        Find the book with the lowest id whose normalized title or author contains the cleaned query.
+        """
+        if self._storage is not None:
+            for row in self._storage.find_books(**{field: query}, limit=1):
+                return self._load_book(row)
+            return None
+
+        index = self._title_index if field == "title" else self._author_index
+        keys = index.candidates(query)
+        if self._scans_in_parallel(len(self._books_by_id) if keys is None else len(keys)):
+            self._metrics.count("index.parallel_scans")
+            return self._books_by_id.get(self._scanner.first(field, query))
+        if keys is None:
+            keys = self._ordered_ids(self._book_ids)
+        return _first_match(self._books_by_id, keys, field, query, self._metrics, "search_book")
+
+    def _fuzzy_match(self, records: dict, index: TokenIndex, query: str, operation: str):
+        """
+        Find the record whose tokens are the fewest edits away from the tokens of the cleaned query.
+
+        Every query token has to be within ``FUZZY_DISTANCE`` edits of a token of the record, fewer for
+        short tokens, and ties go to the lowest id. Only the records in memory are searched. The first
+        fuzzy search of an index builds its deletes, which are then kept up to date by the mutations.
+        """
+        best = self._fuzzy_rank(records, index, query, operation)
+        return records.get(best[1]) if best is not None else None
+
+    def _fuzzy_rank(self, records: dict, index: TokenIndex, query: str, operation: str) -> Optional[Tuple[int, int]]:
+        """
+        Get the number of edits and the id of the closest record to a cleaned query, see ``_fuzzy_match``.
+        """
+        if not index.fuzzy:
+            with self._index_lock:
+                index.build_deletes()
+        self._metrics.count(operation + ".fuzzy")
+        closest = index.closest(query)
+        if closest is None:
+            return None
+        total, keys = closest
+        return min(((total, key) for key in keys if key in records), default=None)
+
+    def _match_member(self, query: str) -> Optional[Members]:
+        """
+        Find the member with the lowest id whose normalized name contains the cleaned query.
+        """
+        if self._storage is not None:
+            for row in self._storage.find_members(query, limit=1):
+                return self._load_member(row)
+            return None
+
+        keys = self._member_name_index.candidates(query)
+        if keys is None:
+            keys = self._ordered_ids(self._member_ids)
+        return _first_match(self._members_by_id, keys, "name", query, self._metrics, "search_member")
+
+    def _ordered_ids(self, ids: SortedIds) -> List[int]:
+        """
+        Get the ids of the records in memory in increasing order, to scan them from the lowest.
+        """
+        with self._index_lock:
+            return ids.ordered()
+
+
+def _first_match(records: dict, keys: Union[Set, List], field: str, query: str, metrics: Metrics, operation: str):
+    """
+    Find the record with the lowest id whose normalized field contains the cleaned query.
+
+    ``keys`` is either the set of candidates the index gave for the query, which are heapified and popped
+    from the lowest, or every id in increasing order when the index cannot narrow the query down; either
+    way the records are checked until the first match, without sorting every key. Whether the index
+    helped is counted as ``index.hits`` or ``index.scans``, and the number of records checked is recorded
+    as ``records_scanned.<operation>``.
+    """
+    attribute = "normalized_" + field
+    if isinstance(keys, set):
+        metrics.count("index.hits")
+        heap = list(keys)
+        heapq.heapify(heap)
+        keys = (heapq.heappop(heap) for _ in range(len(heap)))
+    else:
+        metrics.count("index.scans")
+
+    scanned = 0
+    try:
+        for key in keys:
+            scanned += 1
+            record = records.get(key)
+            if record is not None and query in getattr(record, attribute):
+                return record
+        return None
+    finally:
+        metrics.observe_value("records_scanned." + operation, scanned)
+
+
+def _normalize_book(book: Book) -> None:
+    """
+    Fill in the normalized fields of a book unless they already are, and intern its author.
+
+    Authors repeat across many books, so they are interned to share one string per author.
+    """
+    book.author = sys.intern(book.author)
+    book.normalized_title = book.normalized_title or _clean_input(book.title)
+    book.normalized_author = sys.intern(book.normalized_author or _clean_input(book.author))
+
+
+def _book_payload(book: Book) -> dict:
+    """
+    Convert a book to the arguments of an ``add_book`` mutation.
+    """
+    return {
+        "id": book.id,
+        "title": book.title,
+        "author": book.author,
+        "isbn_no": book.isbn_no,
+        "is_available": book.is_available,
+    }
+
+
+def _book_event(book: Book) -> dict:
+    """
+    Convert a book to the payload of an ``add_book`` mutation: its arguments and its normalized fields.
+    """
+    payload = _book_payload(book)
+    payload.update(normalized_title=book.normalized_title, normalized_author=book.normalized_author)
+    return payload
+
+
+def _member_payload(member: Members) -> dict:
+    """
+    Convert a member to the arguments of an ``add_member`` mutation, with the dates of their loans.
+    """
+    loans = member.books_borrowed.loans() if isinstance(member.books_borrowed, BorrowedBooks) else []
+    return {
+        "id": member.id,
+        "name": member.name,
+        "phone": member.phone,
+        "books_borrowed": [book.id for book in member.books_borrowed],
+        "loans": [{"book_id": loan.book.id, "borrowed_at": loan.borrowed_at, "due_at": loan.due_at} for loan in loans],
+    }
+
+
+def _book_row(book: Book) -> dict:
+    """
+    Convert a book to a row of the storage backend.
+    """
+    return {
+        "id": book.id,
+        "title": book.title,
+        "author": book.author,
+        "isbn_no": book.isbn_no,
+        "is_available": book.is_available,
+        "normalized_title": book.normalized_title,
+        "normalized_author": book.normalized_author,
+    }
+
+
+def _member_row(member: Members) -> dict:
+    """
+    Convert a member to a row of the storage backend.
+    """
+    return {"id": member.id, "name": member.name, "phone": member.phone, "normalized_name": member.normalized_name}
 
-        return logger.error(e, "Member info is not found. Please try again with different input.")
 
 
 def print_menu() -> None:
@@ -228,11 +1402,18 @@ class LibraryManager:
     A Library Management System that includes Library, Book, and Members.
     """
 
-    def __init__(self) -> None:
+    def __init__(self, database: Optional[str] = None) -> None:
         """
         Initialize a library management system.
+
+        :param database: An optional SQLite database file that keeps the library between runs.
         """
-        self.library = Library()
+        if database:
+            from storage import SQLiteStorage
+
+            self.library = Library(SQLiteStorage(database))
+        else:
+            self.library = Library()
         self.command_dict = {
             "1": "Add a book",
             "2": "Remove a book",
@@ -263,7 +1444,7 @@ class LibraryManager:
                     self.add_book()
                 elif command == "2":
                     book_info = self._get_book_info(command)
-                    book = self.library.search_book(book_info)
+                    book = self.library.get_book(book_info["id"])
                     self.library.remove_book(book)
                 elif command == "3":
                     member_info = self._get_member_info(command)
@@ -272,7 +1453,7 @@ class LibraryManager:
                     self.library.add_member(member)
                 elif command == "4":
                     member_info = self._get_member_info(command)
-                    member = self.library.search_member(member_info)
+                    member = self.library.get_member(member_info["id"])
                     self.library.remove_member(member)
                 elif command == "5":
                     member_info = self._get_member_info(command)
@@ -297,7 +1478,10 @@ class LibraryManager:
         """
         An interface for the Library Management System.
         """
-        self.get_command()
+        try:
+            self.get_command()
+        finally:
+            self.library.close()
 
     def _get_book_info(self) -> dict:
         """
@@ -350,7 +1534,7 @@ def main() -> None:
     """
 
     logger.info("Starting library management system...")
-    library_manager = LibraryManager()
+    library_manager = LibraryManager(os.environ.get("LIBRARY_DATABASE"))
     library_manager.interface()
 
 
@@ -1,16 +1,46 @@
-import asyncio
 import json
-from typing import Callable
+import re
+from functools import lru_cache, partial
+from typing import Any, Callable, Optional, Sequence
 
-from rich.json import JSON
 from textual import on
 from textual.app import App, ComposeResult
 from textual.containers import ScrollableContainer, VerticalScroll
-from textual.widgets import ContentSwitcher, Button, Footer, Header, Input, Static, Label, TextLog
+from textual.suggester import Suggester
+from textual.timer import Timer
+from textual.widgets import ContentSwitcher, Button, DataTable, Footer, Header, Input, Static, Label, TextLog
+from textual.worker import get_current_worker
 
-from library_manager import LibraryManager, Book
+from autocomplete import Completions
+from library_manager import DEFAULT_PAGE_SIZE, Book, Library, LibraryManager, Members
+from views import Dashboard
+
+
+@lru_cache(maxsize=None)
+def library() -> Library:
+    """
+    Get the library of the app, creating it on first use so importing this module stays cheap.
+    """
+    return LibraryManager().library
+
+
+@lru_cache(maxsize=None)
+def dashboard() -> Dashboard:
+    """
+    Get the views of the app's library, building them on first use.
+    """
+    return Dashboard(library())
+
+
+@lru_cache(maxsize=None)
+def completions() -> Completions:
+    """
+    Get the completions of the app's library, kept up to date by the feed of its dashboard.
+    """
+    view = Completions()
+    dashboard().feed.subscribe(view)
+    return view
 
-lm = LibraryManager()
 
 BOOK_EXAMPLE = """
 {"id": Book ID Number, "title": "Sample Title", "author": "Author Name", "isbn_no": "ISBN Number"}
@@ -22,17 +52,65 @@ MEMBER_EXAMPLE = """
 
 MEMBER_BOOK_EXAMPLE = MEMBER_EXAMPLE + ",  " + BOOK_EXAMPLE
 
+LOOKUP_TEXT = """
+A name or a title may be given instead of an id; press the right arrow key to accept a suggestion.
+"""
+
 TEXT = f"""
     Please enter the details in the following format:
     """
 
+# The output of a form keeps only its latest lines, so a long session does not pile up widgets.
+OUTPUT_LINES = 200
+BROWSER_PAGE_SIZE = 50
+SEARCH_DEBOUNCE_SECONDS = 0.25
+# The string value being typed at the end of a JSON form, after its key.
+JSON_VALUE = re.compile(r'"(\w+)"\s*:\s*"([^"]*)$')
+
 
 ###############
 #   Widgets   #
 ###############
 
 
-class BookManagerBaseClass(Static):
+class CompletionSuggester(Suggester):
+    """
+    A suggester completing the most popular title, author or member name that starts with what is typed.
+
+    A search box completes its whole value as one field, while a form completes the string it ends
+    with when that is the value of one of ``fields`` in its JSON, closing the string.
+    """
+
+    def __init__(self, field: Optional[str] = None, fields: Sequence[str] = ()) -> None:
+        super().__init__(use_cache=False, case_sensitive=True)
+        self.field = field
+        self.fields = fields
+
+    async def get_suggestion(self, value: str) -> Optional[str]:
+        """A method to get the value followed by the rest of the most popular completion."""
+        field, prefix, end = self.field, value, ""
+        if field is None:
+            match = JSON_VALUE.search(value)
+            if match is None or match.group(1) not in self.fields:
+                return None
+            (field, prefix), end = match.groups(), '"'
+        if not prefix.strip():
+            return None
+        text = completions().suggest(field, prefix)
+        return None if text is None else value + text[len(prefix):] + end
+
+
+class FormBaseClass(Static):
+    """
+    A Base class for the forms, with a bounded log of their output.
+    """
+
+    def report(self, message: str) -> None:
+        """A method to write a line to the output, dropping the oldest lines past ``OUTPUT_LINES``."""
+        self.query_one(TextLog).write(message)
+
+
+class BookManagerBaseClass(FormBaseClass):
     """
     A Base class for the Book Manager.
     """
@@ -41,23 +119,26 @@ class BookManagerBaseClass(Static):
         """A method to compose a screen of a library."""
         yield Header(name="Library Manager")
         yield Label(TEXT + BOOK_EXAMPLE)
-        yield Input(placeholder="Please enter the details here")
+        yield Input(
+            placeholder="Please enter the details here", suggester=CompletionSuggester(fields=("title", "author"))
+        )
         yield Button("Submit the details")
+        yield TextLog(max_lines=OUTPUT_LINES)
 
     def accepts_book(self, function: Callable, msg: str) -> None:
         """ A function to handle the event when the user presses the enter key or button."""
         input = self.query_one(Input)
         data = input.value
-        self.mount(Label(data))
+        self.report(data)
         if not data:
-            self.mount(Label("Please enter the details"))
+            self.report("Please enter the details")
             return
         try:
             book = Book(**json.loads(data))
             function(book)
-            self.mount(Label(msg))
+            self.report(msg)
         except ValueError as e:
-            self.mount(Label(str(e)))
+            self.report(str(e))
         input.value = ""
 
 
@@ -70,7 +151,7 @@ class AddBookManagerBaseClass(BookManagerBaseClass):
     @on(Button.Pressed)
     def accepts_add_book(self) -> None:
         """ A method to handle the event when the user presses the enter key."""
-        self.accepts_book(lm.library.add_book, "Book added successfully")
+        self.accepts_book(library().add_book, "Book added successfully")
 
 
 class RemoveBookManagerBaseClass(BookManagerBaseClass):
@@ -82,10 +163,10 @@ class RemoveBookManagerBaseClass(BookManagerBaseClass):
     @on(Button.Pressed)
     def accepts_add_book(self) -> None:
         """ A method to handle the event when the user presses the enter key."""
-        self.accepts_book(lm.library.remove_book, "Book removed successfully")
+        self.accepts_book(library().remove_book, "Book removed successfully")
 
 
-class MemberManagerBaseClass(Static):
+class MemberManagerBaseClass(FormBaseClass):
     """
     A Base class for the Member Manager.
     """
@@ -94,23 +175,24 @@ class MemberManagerBaseClass(Static):
         """A method to compose a screen of a library."""
         yield Header(name="Library Manager")
         yield Label(TEXT + MEMBER_EXAMPLE)
-        yield Input(placeholder="Please enter the details here")
+        yield Input(placeholder="Please enter the details here", suggester=CompletionSuggester(fields=("name",)))
         yield Button("Submit the details")
+        yield TextLog(max_lines=OUTPUT_LINES)
 
     def accepts_member(self, function: Callable, msg: str) -> None:
         """ A method to handle the event when the user presses the enter key."""
         input = self.query_one(Input)
         data = input.value
-        self.mount(Label(data))
+        self.report(data)
         if not data:
-            self.mount(Label("Please enter the details"))
+            self.report("Please enter the details")
             return
         try:
-            member = Book(**json.loads(data))
+            member = Members(**json.loads(data), books_borrowed=[])
             function(member)
-            self.mount(Label(msg))
+            self.report(msg)
         except ValueError as e:
-            self.mount(Label(str(e)))
+            self.report(str(e))
         input.value = ""
 
 
@@ -123,7 +205,7 @@ class AddMemberManagerBaseClass(MemberManagerBaseClass):
     @on(Button.Pressed)
     def accepts_add_member(self) -> None:
         """ A method to handle the event when the user presses the enter key."""
-        self.accepts_member(lm.library.add_member, "Member added successfully")
+        self.accepts_member(library().add_member, "Member added successfully")
 
 
 class RemoveMemberManagerBaseClass(MemberManagerBaseClass):
@@ -135,10 +217,10 @@ class RemoveMemberManagerBaseClass(MemberManagerBaseClass):
     @on(Button.Pressed)
     def accepts_remove_member(self) -> None:
         """ A method to handle the event when the user presses the enter key."""
-        self.accepts_member(lm.library.remove_member, "Member removed successfully")
+        self.accepts_member(library().remove_member, "Member removed successfully")
 
 
-class LibrarianBaseClass(Static):
+class LibrarianBaseClass(FormBaseClass):
     """
     A Base class for the Librarian.
     """
@@ -146,25 +228,33 @@ class LibrarianBaseClass(Static):
     def compose(self) -> ComposeResult:
         """A method to compose a screen of a library."""
         yield Header(name="Librarian")
-        yield Label(TEXT + MEMBER_BOOK_EXAMPLE)
-        yield Input(placeholder="Please enter the details here")
+        yield Label(TEXT + MEMBER_BOOK_EXAMPLE + LOOKUP_TEXT)
+        yield Input(
+            placeholder="Please enter the details here", suggester=CompletionSuggester(fields=("name", "title"))
+        )
         yield Button("Submit the details")
+        yield TextLog(max_lines=OUTPUT_LINES)
 
     def accepts_member_book(self, function: Callable, msg: str) -> None:
         input = self.query_one(Input)
         data = input.value
-        self.mount(Label(data))
+        self.report(data)
         if not data:
-            self.mount(Label("Please enter the details"))
+            self.report("Please enter the details")
             return
         try:
-            data = Book(**json.loads(data))
-            member = data[0]
-            book = data[1]
+            member_info, book_info = json.loads(f"[{data}]")
+            if "id" in member_info:
+                member = library().get_member(member_info["id"])
+            else:
+                member = library().search_member(member_info)
+            book = library().get_book(book_info["id"]) if "id" in book_info else library().search_book(book_info)
+            if member is None or book is None:
+                raise ValueError("Member or book not found")
             function(member, book)
-            self.mount(Label(msg))
+            self.report(msg)
         except ValueError as e:
-            self.mount(Label(str(e)))
+            self.report(str(e))
         input.value = ""
 
 
@@ -177,7 +267,7 @@ class LendBook(LibrarianBaseClass):
     @on(Button.Pressed)
     def accepts_lend_book(self) -> None:
         """ A method to handle the event when the user presses the enter key."""
-        self.accepts_member_book(lm.library.lend_book, "Book lent successfully")
+        self.accepts_member_book(library().lend_book, "Book lent successfully")
 
 
 class ReturnBook(LibrarianBaseClass):
@@ -189,54 +279,303 @@ class ReturnBook(LibrarianBaseClass):
     @on(Button.Pressed)
     def accepts_add_member(self) -> None:
         """ A method to handle the event when the user presses the enter key."""
-        self.accepts_member_book(lm.library.return_book, "Book returned successfully")
+        self.accepts_member_book(library().return_book, "Book returned successfully")
 
 
 ###############
-#     Log     #
+#   Browser   #
+###############
+class PagedTable(DataTable):
+    """
+    A table that holds one page of records at a time and fetches the next or previous page from the
+    library when the cursor moves past either end, so browsing a huge catalog stays cheap.
+    """
+
+    BINDINGS = [
+        ("pagedown", "next_page", "Next page"),
+        ("pageup", "previous_page", "Previous page"),
+        ("r", "first_page", "Reload"),
+    ]
+
+    def __init__(
+        self,
+        fetch: Callable[..., list],
+        columns: Sequence[str],
+        row_of: Callable[[Any], tuple],
+        page_size: int = BROWSER_PAGE_SIZE,
+        **kwargs,
+    ) -> None:
+        """
+        :param fetch: A function like ``Library.page_books`` taking ``after``, ``before`` and ``limit``.
+        :param columns: The column labels; the first column is the id of the record.
+        :param row_of: A function converting a record to its row, starting with its id.
+        :param page_size: The number of rows of a page.
+        """
+        super().__init__(**kwargs)
+        self.cursor_type = "row"
+        self._fetch = fetch
+        self._columns = columns
+        self._row_of = row_of
+        self._page_size = page_size
+        self._first_id: Optional[int] = None
+        self._last_id: Optional[int] = None
+
+    def on_mount(self) -> None:
+        """A method to show the first page."""
+        self.add_columns(*self._columns)
+        self.load_page()
+
+    def load_page(self, after: Optional[int] = None, before: Optional[int] = None) -> bool:
+        """A method to replace the rows with a page, keeping the current one if the page is empty."""
+        rows = [self._row_of(record) for record in self._fetch(after=after, before=before, limit=self._page_size)]
+        if not rows and (after is not None or before is not None):
+            return False
+        self.clear()
+        for row in rows:
+            self.add_row(*(str(value) for value in row))
+        self._first_id = rows[0][0] if rows else None
+        self._last_id = rows[-1][0] if rows else None
+        return True
+
+    def action_first_page(self) -> None:
+        """An action to reload the first page."""
+        self.load_page()
+
+    def action_next_page(self) -> None:
+        """An action to show the next page."""
+        if self._last_id is not None and self.load_page(after=self._last_id):
+            self.move_cursor(row=0)
+
+    def action_previous_page(self) -> None:
+        """An action to show the previous page."""
+        if self._first_id is not None and self.load_page(before=self._first_id):
+            self.move_cursor(row=self.row_count - 1)
+
+    def action_cursor_down(self) -> None:
+        """An action to move down, turning to the next page from the last row."""
+        if self.cursor_row >= self.row_count - 1:
+            self.action_next_page()
+        else:
+            super().action_cursor_down()
+
+    def action_cursor_up(self) -> None:
+        """An action to move up, turning to the previous page from the first row."""
+        if self.cursor_row <= 0:
+            self.action_previous_page()
+        else:
+            super().action_cursor_up()
+
+
+class BookTable(PagedTable):
+    """
+    A table to browse the catalog.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(
+            library().page_books,
+            ("Id", "Title", "Author", "ISBN", "Available"),
+            lambda book: (book.id, book.title, book.author, book.isbn_no, book.is_available),
+            **kwargs,
+        )
+
+
+class MemberTable(PagedTable):
+    """
+    A table to browse the members.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(
+            library().page_members,
+            ("Id", "Name", "Phone", "Borrowed"),
+            lambda member: (member.id, member.name, member.phone, len(member.books_borrowed)),
+            **kwargs,
+        )
+
+
+###############
+#    Search   #
 ###############
 class Screen(Static):
     """
-    A class to represent the screen of a library. Disabled for now.
+    A class to search books as you type.
+
+    Typing restarts a short debounce timer, and only when it fires is a search started in a worker
+    thread. Starting a search cancels the one in flight, and a search that was overtaken by a newer
+    query never shows its results, so results always match the latest input.
     """
     TITLE = "Screen"
     SUB_TITLE = "Please enter details here"
 
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._debounce: Optional[Timer] = None
+        self._generation = 0
+
     def compose(self) -> ComposeResult:
         """A method to compose a screen of a library."""
         yield Header(name="Library Manager")
         yield Input(placeholder="Please enter Book Id", id="book_id")
-        yield Input(placeholder="Please enter Book title", id="book_title")
-        yield Input(placeholder="Please enter Book author", id="book_author")
+        yield Input(placeholder="Please enter Book title", id="book_title", suggester=CompletionSuggester("title"))
+        yield Input(placeholder="Please enter Book author", id="book_author", suggester=CompletionSuggester("author"))
         yield Input(placeholder="Please enter Book isbn_no", id="book_isbn_no")
+        yield Label("", id="search_status")
+        yield DataTable(id="results")
+
+    def on_mount(self) -> None:
+        """A method to set up the results table."""
+        self.query_one("#results", DataTable).add_columns("Id", "Title", "Author", "ISBN", "Available", "Score")
+
+    def on_input_changed(self, message: Input.Changed) -> None:
+        """A method to restart the debounce timer on every keystroke."""
+        self._generation += 1
+        if self._debounce is not None:
+            self._debounce.stop()
+        self._debounce = self.set_timer(SEARCH_DEBOUNCE_SECONDS, self.start_search)
+
+    def start_search(self) -> None:
+        """A method to search the current input in a worker thread, cancelling the previous search."""
+        query = self.read_query()
+        if not query:
+            self.show_results(self._generation, [], "")
+            return
+        generation = self._generation
+        self.query_one("#search_status", Label).update("Searching...")
+        self.run_worker(partial(self.search, generation, query), group="search", exclusive=True, thread=True)
+
+    def read_query(self) -> dict:
+        """A method to turn the inputs into filters of ``Library.query_books``."""
+        query = {}
+        for field in ("id", "title", "author", "isbn_no"):
+            value = self.query_one(f"#book_{field}", Input).value.strip()
+            if value:
+                query[field] = value
+        if "id" in query:
+            query["id"] = int(query["id"]) if query["id"].isdigit() else -1
+        return query
+
+    def search(self, generation: int, query: dict) -> None:
+        """A method to run a search in a worker thread and hand the first page back to the UI."""
+        results = list(library().query_books(**query, limit=DEFAULT_PAGE_SIZE))
+        if not get_current_worker().is_cancelled:
+            self.app.call_from_thread(self.show_results, generation, results, f"{len(results)} results")
+
+    def show_results(self, generation: int, results: list, status: str) -> None:
+        """A method to show the results of a search unless a newer query was typed since."""
+        if generation != self._generation:
+            return
+        table = self.query_one("#results", DataTable)
+        table.clear()
+        for result in results:
+            book = result.book
+            table.add_row(
+                str(book.id), book.title, book.author, book.isbn_no, str(book.is_available), f"{result.score:.2f}"
+            )
+        self.query_one("#search_status", Label).update(status)
 
-    async def on_input_changed(self, message: Input.Changed) -> None:
-        """A coroutine to handle a text changed message."""
-        if message.value:
-            # Look up the word in the background
-            asyncio.create_task(self.lookup_word(message.value))
-        else:
-            # Clear the results
-            self.query_one("#results", Static).update()
 
-    async def lookup_word(self, word: str) -> None:
-        """Looks up a word."""
+###############
+#  Dashboard  #
+###############
+class MetricsPanel(Static):
+    """
+    A widget to show the live metrics of the library's operations.
+    """
+
+    REFRESH_SECONDS = 1.0
 
-        # if word == self.query_one(Input).value:
-        self.query_one("#results", Static).update(JSON(word))
+    def on_mount(self) -> None:
+        """A method to start refreshing the metrics."""
+        self.refresh_metrics()
+        self.set_interval(self.REFRESH_SECONDS, self.refresh_metrics)
 
+    def refresh_metrics(self) -> None:
+        """A method to render the latest metrics snapshot."""
+        self.update(render_metrics(library().metrics_snapshot()))
 
-class LogWidget(Static):
+
+class DashboardPanel(Static):
+    """
+    A widget to show the figures of the library's views, read without scanning the library.
     """
-    A widget to represent a terminal widget."""
 
-    def compose(self) -> ComposeResult:
-        """A method to compose a log widget."""
-        yield TextLog()
+    REFRESH_SECONDS = 1.0
+    TOP = 5
+
+    def on_mount(self) -> None:
+        """A method to start refreshing the figures."""
+        self.refresh_dashboard()
+        self.set_interval(self.REFRESH_SECONDS, self.refresh_dashboard)
+
+    def refresh_dashboard(self) -> None:
+        """A method to render the latest figures."""
+        self.update(render_dashboard(dashboard().snapshot(self.TOP)))
+
 
-    def on_ready(self) -> None:
-        log = self.query_one(TextLog)
-        log.write_line("Log widget ready")
+def render_dashboard(snapshot: dict) -> "Group":
+    """
+    Render a dashboard snapshot as the utilization followed by the rankings.
+    """
+    from rich.console import Group
+    from rich.table import Table
+
+    summary = Table(title="Catalog", expand=True)
+    summary.add_column("Statistic")
+    summary.add_column("Value", justify="right")
+    summary.add_row("Books", str(snapshot["books"]))
+    summary.add_row("Lent", f"{snapshot['lent']} ({snapshot['utilization']:.1%})")
+    summary.add_row("Authors", str(snapshot["authors"]))
+    tables = [summary]
+    for title, key, label in (
+        ("Most books", "top_authors", "Author"),
+        ("Most loans", "top_borrowers", "Member id"),
+        ("Most borrowed", "top_borrowed", "Title"),
+    ):
+        table = Table(title=title, expand=True)
+        table.add_column(label)
+        table.add_column("Count", justify="right")
+        for name, count in snapshot[key]:
+            table.add_row(str(name), str(count))
+        tables.append(table)
+    return Group(*tables)
+
+
+def render_metrics(snapshot: dict) -> "Group":
+    """
+    Render a metrics snapshot as a table of operations followed by the search statistics.
+    """
+    from rich.console import Group
+    from rich.table import Table
+
+    operations = Table(title=f"Operations in the last {snapshot['seconds']:.0f}s", expand=True)
+    operations.add_column("Operation")
+    for column in ("Calls", "Errors", "Mean ms", "p50 ms", "p90 ms", "p99 ms", "Max ms"):
+        operations.add_column(column, justify="right")
+    for name, stats in sorted(snapshot["operations"].items()):
+        operations.add_row(
+            name,
+            str(stats["calls"]),
+            str(stats["errors"]),
+            *(f"{stats[key]:.3f}" for key in ("mean_ms", "p50_ms", "p90_ms", "p99_ms", "max_ms")),
+        )
+
+    searches = Table(title="Searches", expand=True)
+    searches.add_column("Statistic")
+    searches.add_column("Value", justify="right")
+    cache, index = snapshot["query_cache"], snapshot["index"]
+    searches.add_row("Query cache hit rate", f"{cache['hit_rate']:.1%} of {cache['hits'] + cache['misses']}")
+    searches.add_row("Index hit rate", f"{index['hit_rate']:.1%} of {index['hits'] + index['scans']}")
+    for name, counter in sorted(snapshot["counters"].items()):
+        if name.endswith(".misses"):
+            searches.add_row(f"{name.rsplit('.', 1)[0]} misses", str(counter))
+    for name, stats in sorted(snapshot["values"].items()):
+        if name.startswith("records_scanned."):
+            searches.add_row(
+                f"{name.split('.', 1)[1]} records scanned",
+                f"mean {stats['mean']:.1f}  p99 {stats['p99']:.0f}  max {stats['max']:.0f}",
+            )
+    return Group(operations, searches)
 
 
 ###############
@@ -255,7 +594,11 @@ class LibraryMenu(Static):
         yield Button("4. Remove a member", variant="error", id="remove_member")
         yield Button("5. Lend a book", variant="primary", id="lend_book")
         yield Button("6. Return a book", variant="error", id="return_book")
-        yield Button("Log", id="log")
+        yield Button("Search", id="search")
+        yield Button("Catalog", id="catalog")
+        yield Button("Members", id="members")
+        yield Button("Dashboard", id="dashboard")
+        yield Button("Metrics", id="metrics")
 
 
 ###############
@@ -287,8 +630,13 @@ class LibraryApp(App):
             yield LibraryMenu("Library Menu", classes="box")
 
         # Widgets for each menu item
-        with ContentSwitcher(initial="log"):
-            yield LogWidget("Log", classes="box", id="log")
+        with ContentSwitcher(initial="metrics"):
+            yield MetricsPanel("Metrics", classes="box", id="metrics")
+            yield DashboardPanel("Dashboard", classes="box", id="dashboard")
+            with VerticalScroll(id="search"):
+                yield Screen("Search", classes="box")
+            yield BookTable(classes="box", id="catalog")
+            yield MemberTable(classes="box", id="members")
             with VerticalScroll(id="add_book"):
                 yield AddBookManagerBaseClass("Add Book", classes="box")
             with VerticalScroll(id="remove_book"):
@@ -340,6 +688,5 @@ class LibraryApp(App):
 
 
 if __name__ == "__main__":
-    lm = LibraryManager()
     app = LibraryApp()
     app.run()
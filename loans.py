@@ -0,0 +1,271 @@
+import heapq
+import itertools
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from errors import LibraryError
+
+DAY = 24 * 60 * 60
+DEFAULT_LOAN_PERIOD = 14 * DAY
+
+
+@dataclass(slots=True)
+class Loan:
+    """
+    A Loan class that records a book lent to a member.
+
+    :cvar book: The book that is lent.
+    :cvar member_id: The id of the member who borrowed the book.
+    :cvar borrowed_at: When the book was lent, as a Unix timestamp.
+    :cvar due_at: When the book is due back, as a Unix timestamp.
+    """
+
+    book: Any
+    member_id: int
+    borrowed_at: float
+    due_at: float
+
+
+@dataclass(frozen=True)
+class OverdueEvent:
+    """
+    An OverdueEvent class that reports a loan found overdue by a sweep.
+
+    :cvar book_id: The id of the overdue book.
+    :cvar member_id: The id of the member who has it.
+    :cvar due_at: When the book was due back.
+    :cvar overdue_by: How many seconds past due the book was at the sweep.
+    """
+
+    book_id: int
+    member_id: int
+    due_at: float
+    overdue_by: float
+
+
+class LoanLedger:
+    """
+    A LoanLedger class that holds every current loan, indexed by book id and by member id.
+
+    Loans are also scheduled on a min-heap by due date. Returned and rescheduled loans are not removed
+    from the heap; their entries are skipped and dropped when they reach the top. So the next ``k`` due
+    dates and the ``k`` overdue loans cost ``O(k log n)``, however many loans there are. A sweep moves
+    the loans that came due to a separate set, so each one is reported once.
+
+    :cvar loan_period: The time in seconds a book is lent for unless a due date is given.
+    :cvar by_book: The loan of every lent book id.
+    :cvar by_member: The loans of every member id, keyed by book id in the order they were made.
+    :cvar schedule: The heap of ``(due_at, sequence, loan)`` entries for loans not swept yet.
+    :cvar swept: The loans reported overdue by a sweep, by book id.
+    """
+
+    def __init__(self, loan_period: float = DEFAULT_LOAN_PERIOD) -> None:
+        """
+        Initialize an empty ledger.
+        """
+        self.loan_period = loan_period
+        self._by_book: Dict[int, Loan] = {}
+        self._by_member: Dict[int, Dict[int, Loan]] = {}
+        self._schedule: List[Tuple[float, int, Loan]] = []
+        self._sequence = itertools.count()
+        self._swept: Dict[int, Loan] = {}
+
+    def checkout(
+        self, book, member_id: int, borrowed_at: Optional[float] = None, due_at: Optional[float] = None
+    ) -> Loan:
+        """
+        Record that a book is lent to a member.
+        """
+        if book.id in self._by_book:
+            raise LibraryError("Book not available.")
+
+        borrowed_at = time.time() if borrowed_at is None else borrowed_at
+        due_at = borrowed_at + self.loan_period if due_at is None else due_at
+        loan = Loan(book, member_id, borrowed_at, due_at)
+        self._by_book[book.id] = loan
+        self._by_member.setdefault(member_id, {})[book.id] = loan
+        self._schedule_loan(loan)
+        return loan
+
+    def reschedule(self, book_id: int, due_at: float, borrowed_at: Optional[float] = None) -> Loan:
+        """
+        Change the due date of a loan, and optionally when it was made.
+        """
+        loan = self._by_book.get(book_id)
+        if loan is None:
+            raise LibraryError("Book not borrowed.")
+
+        loan.due_at = due_at
+        if borrowed_at is not None:
+            loan.borrowed_at = borrowed_at
+        self._swept.pop(book_id, None)
+        self._schedule_loan(loan)
+        return loan
+
+    def due_soon(self, count: int) -> List[Loan]:
+        """
+        Get the ``count`` loans that are due first and not swept yet, earliest first.
+        """
+        entries = []
+        while self._schedule and len(entries) < count:
+            entry = heapq.heappop(self._schedule)
+            if self._is_current(entry):
+                entries.append(entry)
+        for entry in entries:
+            heapq.heappush(self._schedule, entry)
+        return [loan for _, _, loan in entries]
+
+    def overdue(self, now: Optional[float] = None) -> List[Loan]:
+        """
+        Get every loan past its due date, earliest due first.
+        """
+        now = time.time() if now is None else now
+        for book_id, loan in list(self._swept.items()):
+            if self._by_book.get(book_id) is not loan:
+                del self._swept[book_id]
+
+        entries = []
+        while self._schedule and self._schedule[0][0] <= now:
+            entry = heapq.heappop(self._schedule)
+            if self._is_current(entry):
+                entries.append(entry)
+        for entry in entries:
+            heapq.heappush(self._schedule, entry)
+
+        loans = sorted(self._swept.values(), key=lambda loan: loan.due_at)
+        return list(heapq.merge(loans, [loan for _, _, loan in entries], key=lambda loan: loan.due_at))
+
+    def sweep(self, now: Optional[float] = None) -> List[OverdueEvent]:
+        """
+        Report the loans that came due since the last sweep, each only once.
+        """
+        now = time.time() if now is None else now
+        events = []
+        while self._schedule and self._schedule[0][0] <= now:
+            entry = heapq.heappop(self._schedule)
+            if not self._is_current(entry):
+                continue
+            loan = entry[2]
+            self._swept[loan.book.id] = loan
+            events.append(OverdueEvent(loan.book.id, loan.member_id, loan.due_at, now - loan.due_at))
+        return events
+
+    def _schedule_loan(self, loan: Loan) -> None:
+        """
+        Push a loan on the schedule, rebuilding the heap when stale entries outnumber current ones.
+        """
+        heapq.heappush(self._schedule, (loan.due_at, next(self._sequence), loan))
+        if len(self._schedule) > 2 * len(self._by_book) + 64:
+            self._schedule = [entry for entry in self._schedule if self._is_current(entry)]
+            heapq.heapify(self._schedule)
+
+    def _is_current(self, entry: Tuple[float, int, Loan]) -> bool:
+        """
+        Check that a schedule entry still belongs to an outstanding loan with the same due date.
+        """
+        due_at, _, loan = entry
+        return self._by_book.get(loan.book.id) is loan and loan.due_at == due_at and loan.book.id not in self._swept
+
+    def checkin(self, book_id: int) -> Loan:
+        """
+        Record that a book is returned.
+        """
+        loan = self._by_book.pop(book_id, None)
+        if loan is None:
+            raise LibraryError("Book not borrowed.")
+
+        loans = self._by_member[loan.member_id]
+        del loans[book_id]
+        if not loans:
+            del self._by_member[loan.member_id]
+        self._swept.pop(book_id, None)
+        return loan
+
+    def loan_of(self, book_id: int) -> Optional[Loan]:
+        """
+        Get the loan of a book, if it is lent.
+        """
+        return self._by_book.get(book_id)
+
+    def loans_of(self, member_id: int) -> List[Loan]:
+        """
+        Get the loans of a member, oldest first.
+        """
+        return list(self._by_member.get(member_id, {}).values())
+
+    def has_loan(self, member_id: int, book_id: int) -> bool:
+        """
+        Check if a member has a book.
+        """
+        return book_id in self._by_member.get(member_id, ())
+
+    def count(self, member_id: int) -> int:
+        """
+        Count the loans of a member.
+        """
+        return len(self._by_member.get(member_id, ()))
+
+    def __len__(self) -> int:
+        return len(self._by_book)
+
+    def __iter__(self) -> Iterator[Loan]:
+        return iter(list(self._by_book.values()))
+
+
+class BorrowedBooks:
+    """
+    The books a member has borrowed, as a list-like view over a ``LoanLedger``.
+
+    ``Members.books_borrowed`` becomes this view once the member joins a library, so ``append`` and
+    ``remove`` check books out and in without scanning a list.
+
+    :cvar ledger: The ledger holding the loans.
+    :cvar member_id: The id of the member.
+    """
+
+    __slots__ = ("_ledger", "_member_id")
+
+    def __init__(self, ledger: LoanLedger, member_id: int) -> None:
+        self._ledger = ledger
+        self._member_id = member_id
+
+    def append(self, book) -> None:
+        """
+        Check a book out to the member.
+        """
+        self._ledger.checkout(book, self._member_id)
+
+    def remove(self, book) -> None:
+        """
+        Check a book the member has back in.
+        """
+        if not self._ledger.has_loan(self._member_id, book.id):
+            raise ValueError("Book is not borrowed by this member.")
+        self._ledger.checkin(book.id)
+
+    def loans(self) -> List[Loan]:
+        """
+        Get the loans of the member, oldest first.
+        """
+        return self._ledger.loans_of(self._member_id)
+
+    def __contains__(self, book) -> bool:
+        return self._ledger.has_loan(self._member_id, getattr(book, "id", None))
+
+    def __iter__(self) -> Iterator:
+        return iter([loan.book for loan in self._ledger.loans_of(self._member_id)])
+
+    def __len__(self) -> int:
+        return self._ledger.count(self._member_id)
+
+    def __getitem__(self, index):
+        return list(self)[index]
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (list, BorrowedBooks)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return repr(list(self))
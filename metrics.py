@@ -0,0 +1,183 @@
+import threading
+import time
+from typing import Dict, List, Optional
+
+BUCKETS = 64
+
+
+class Histogram:
+    """
+    A histogram of non-negative integers in power-of-two buckets.
+
+    Recording a value is a bit length and an increment, so it is cheap enough for every call.
+    Percentiles are estimated as the upper bound of the bucket they fall in, which is within a factor
+    of two of the exact value.
+
+    :cvar buckets: The number of values in every bucket; bucket ``b`` holds values below ``2 ** b``.
+    :cvar count: The number of values recorded.
+    :cvar total: The sum of the values recorded.
+    :cvar max: The largest value recorded.
+    """
+
+    __slots__ = ("buckets", "count", "total", "max")
+
+    def __init__(self) -> None:
+        self.buckets: List[int] = [0] * BUCKETS
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, value: int) -> None:
+        """
+        Record a value.
+        """
+        self.buckets[min(value.bit_length(), BUCKETS - 1)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, percentile: float) -> int:
+        """
+        Estimate a percentile of the values recorded.
+        """
+        rank = self.count * percentile / 100
+        seen = 0
+        for bucket, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= rank:
+                return min(2 ** bucket - 1, self.max)
+        return self.max
+
+    def summary(self, scale: float = 1.0) -> dict:
+        """
+        Summarize the histogram, with values multiplied by ``scale``.
+        """
+        return {
+            "count": self.count,
+            "mean": self.total / self.count * scale if self.count else 0.0,
+            "p50": self.percentile(50) * scale,
+            "p90": self.percentile(90) * scale,
+            "p99": self.percentile(99) * scale,
+            "max": self.max * scale,
+        }
+
+
+class Metrics:
+    """
+    Counters and histograms of the operations of a ``Library``.
+
+    Latencies are recorded in microseconds under the name of the operation, errors are counted under
+    ``<operation>.errors``, and other distributions, like the number of records a search scanned, are
+    recorded as plain values. A lock keeps updates from different threads apart.
+
+    :cvar enabled: Whether anything is recorded.
+    :cvar counters: The counters by name.
+    :cvar latencies: The latency histograms by operation, in microseconds.
+    :cvar values: The histograms of other values by name.
+    :cvar started: When the metrics were last reset, as a Unix timestamp.
+    """
+
+    def __init__(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Forget everything recorded so far.
+        """
+        with self._lock:
+            self._counters: Dict[str, int] = {}
+            self._latencies: Dict[str, Histogram] = {}
+            self._values: Dict[str, Histogram] = {}
+            self._started = time.time()
+
+    def count(self, name: str, amount: int = 1) -> None:
+        """
+        Add to a counter.
+        """
+        if self.enabled:
+            with self._lock:
+                self._counters[name] = self._counters.get(name, 0) + amount
+
+    def observe(self, name: str, seconds: float) -> None:
+        """
+        Record the latency of an operation.
+        """
+        if self.enabled:
+            with self._lock:
+                histogram = self._latencies.get(name)
+                if histogram is None:
+                    histogram = self._latencies[name] = Histogram()
+                histogram.record(int(seconds * 1e6))
+
+    def observe_value(self, name: str, value: int) -> None:
+        """
+        Record a value of a distribution.
+        """
+        if self.enabled:
+            with self._lock:
+                histogram = self._values.get(name)
+                if histogram is None:
+                    histogram = self._values[name] = Histogram()
+                histogram.record(value)
+
+    def timer(self, name: str) -> "Timer":
+        """
+        Time a block of code as an operation, counting the exceptions it raises as errors.
+        """
+        return Timer(self, name)
+
+    def snapshot(self) -> dict:
+        """
+        Get a copy of everything recorded, as plain values.
+
+        :return: ``operations`` maps every operation to its calls, errors and latency summary in
+            milliseconds, ``values`` the other distributions, ``counters`` the counters, and
+            ``seconds`` the time since the metrics were reset.
+        """
+        with self._lock:
+            operations = {}
+            for name, histogram in self._latencies.items():
+                summary = histogram.summary(scale=1e-3)
+                operations[name] = {
+                    "calls": summary.pop("count"),
+                    "errors": self._counters.get(name + ".errors", 0),
+                    **{key + "_ms": value for key, value in summary.items()},
+                }
+            return {
+                "seconds": time.time() - self._started,
+                "operations": operations,
+                "values": {name: histogram.summary() for name, histogram in self._values.items()},
+                "counters": dict(self._counters),
+            }
+
+
+class Timer:
+    """
+    A context manager that records how long its block took, see ``Metrics.timer``.
+    """
+
+    __slots__ = ("_metrics", "_name", "_start")
+
+    def __init__(self, metrics: Metrics, name: str) -> None:
+        self._metrics = metrics
+        self._name = name
+        self._start: Optional[float] = None
+
+    def __enter__(self) -> "Timer":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        self._metrics.observe(self._name, time.perf_counter() - self._start)
+        if exc_type is not None and issubclass(exc_type, Exception):
+            self._metrics.count(self._name + ".errors")
+
+
+def hit_rate(hits: int, misses: int) -> float:
+    """
+    The share of lookups that hit, or 0 when there were none.
+    """
+    return hits / (hits + misses) if hits + misses else 0.0
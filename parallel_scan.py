@@ -0,0 +1,261 @@
+import heapq
+import multiprocessing
+import os
+import threading
+from itertools import islice
+from multiprocessing.connection import Connection
+from typing import Dict, List, Optional, Tuple
+
+from library_manager import Book, Library, LibraryError
+from search_index import text_score
+
+PARALLEL_SCAN_MIN = 50000
+FLUSH_SIZE = 1000
+
+# The normalized title, normalized author, ISBN number and availability of a book, in a worker.
+Record = Tuple[str, str, str, bool]
+
+
+class ParallelScanner:
+    """
+    Worker processes that scan the catalog of a library in parallel when its indexes cannot narrow a search.
+
+    Every worker holds the books whose id falls in its partition, as the normalized fields searches
+    compare. By default the workers are forked with their partition, so it is not copied through a
+    pipe; with the ``"spawn"`` or ``"forkserver"`` start method, e.g. where fork is not available,
+    the partition is pickled to the worker instead, which takes longer to attach. The scanner
+    follows the library as a listener and queues the mutations of every partition, which are sent
+    to the worker ahead of the next scan, or once ``FLUSH_SIZE`` are queued, so lending a book
+    does not wait on a worker. A scan sends the query to every worker, each checks and ranks its own
+    books with the same predicate and score as ``Library.query_books``, and the ranked lists are merged.
+
+    A library with a scanner uses it for searches that would check at least ``min_records`` books, and
+    checks smaller candidate sets itself, since a scan pays for a round trip to every worker.
+
+    :cvar workers: The number of worker processes.
+    :cvar min_records: The number of books a search has to check before it is run in parallel.
+    :cvar start_method: How the worker processes are started, see ``default_start_method``.
+    :cvar connections: The pipe to every worker.
+    :cvar processes: The worker processes.
+    :cvar pending: The mutations not yet sent to every worker.
+    :cvar library: The library the scanner is attached to, if any.
+    """
+
+    def __init__(
+        self, workers: Optional[int] = None, min_records: int = PARALLEL_SCAN_MIN, start_method: Optional[str] = None
+    ) -> None:
+        self.workers = workers or os.cpu_count() or 1
+        self.min_records = min_records
+        self.start_method = start_method or default_start_method()
+        self._connections: List[Connection] = []
+        self._processes: List[multiprocessing.Process] = []
+        self._pending: List[List[tuple]] = [[] for _ in range(self.workers)]
+        self._pending_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._library: Optional[Library] = None
+
+    def attach(self, library: Library) -> None:
+        """
+        Start the workers with the catalog of an in-memory library and start following its mutations.
+        """
+        if library._storage is not None:
+            raise LibraryError("Only an in-memory library can be scanned in parallel.")
+        with library._index_lock:
+            context = multiprocessing.get_context(self.start_method)
+            partitions: List[Dict[int, Record]] = [{} for _ in range(self.workers)]
+            for book in library._books_by_id.values():
+                partitions[book.id % self.workers][book.id] = _record(book, library._is_book_available(book))
+            for partition in partitions:
+                connection, child = context.Pipe()
+                process = context.Process(target=_serve, args=(child, partition), daemon=True)
+                process.start()
+                child.close()
+                self._connections.append(connection)
+                self._processes.append(process)
+            library.add_listener(self.record)
+            library.set_scanner(self)
+            self._library = library
+
+    def close(self) -> None:
+        """
+        Stop following the library and stop the workers.
+        """
+        if self._library is not None:
+            with self._library._index_lock:
+                self._library.remove_listener(self.record)
+                self._library.set_scanner(None)
+            self._library = None
+        with self._lock:
+            for connection, process in zip(self._connections, self._processes):
+                connection.send(("close",))
+                process.join()
+                connection.close()
+            self._connections, self._processes = [], []
+
+    def record(self, operation: str, payload: dict) -> None:
+        """
+        Queue a mutation of the library for the worker of the book it changes.
+        """
+        if operation == "add_book":
+            book = self._library._books_by_id[payload["id"]]
+            self._queue(book.id, ("add", book.id, _record(book, payload["is_available"])))
+        elif operation == "remove_book":
+            self._queue(payload["id"], ("remove", payload["id"]))
+        elif operation == "lend_book":
+            self._queue(payload["book_id"], ("available", payload["book_id"], False))
+        elif operation == "return_book":
+            self._queue(payload["book_id"], ("available", payload["book_id"], True))
+        elif operation == "add_member":
+            for book_id in payload["books_borrowed"]:
+                self._queue(book_id, ("available", book_id, False))
+
+    def query(
+        self,
+        title: Optional[str],
+        author: Optional[str],
+        isbn_no: Optional[str],
+        is_available: Optional[bool],
+        limit: int,
+        after: Optional[Tuple[float, int]] = None,
+    ) -> Tuple[List[Tuple[float, int]], int]:
+        """
+        Get the best matches of a search from every worker, see ``Library.query_books``.
+
+        :param title: A part of the normalized title.
+        :param author: A part of the normalized author.
+        :param after: The rank of a result from a previous page; only results ranked after it are returned.
+        :return: The ranks ``(-score, id)`` of at most ``limit`` matches, best first, and the number of
+            books checked.
+        """
+        results = self._ask(("query", title, author, isbn_no, is_available, limit, after))
+        ranks = list(islice(heapq.merge(*(ranks for ranks, _ in results)), limit))
+        return ranks, sum(scanned for _, scanned in results)
+
+    def first(self, field: str, query: str) -> Optional[int]:
+        """
+        Get the lowest id of the books whose normalized title or author contains a normalized query.
+        """
+        return min((book_id for book_id in self._ask(("first", field, query)) if book_id is not None), default=None)
+
+    def _ask(self, message: tuple) -> list:
+        """
+        Send the pending mutations and a request to every worker, and get their answers.
+        """
+        with self._lock:
+            self._flush()
+            for connection in self._connections:
+                connection.send(message)
+            answers = [connection.recv() for connection in self._connections]
+        for answer in answers:
+            if isinstance(answer, Exception):
+                raise answer
+        return answers
+
+    def _queue(self, book_id: int, mutation: tuple) -> None:
+        """
+        Queue a mutation for a worker, sending the queues if it is full and no scan is running.
+        """
+        with self._pending_lock:
+            pending = self._pending[book_id % self.workers]
+            pending.append(mutation)
+            full = len(pending) >= FLUSH_SIZE
+        if full and self._lock.acquire(blocking=False):
+            try:
+                self._flush()
+            finally:
+                self._lock.release()
+
+    def _flush(self) -> None:
+        """
+        Send the queued mutations to the workers; callers hold the lock of the pipes.
+        """
+        with self._pending_lock:
+            pending, self._pending = self._pending, [[] for _ in range(self.workers)]
+        for connection, mutations in zip(self._connections, pending):
+            if mutations:
+                connection.send(("apply", mutations))
+
+
+def _record(book: Book, is_available: bool) -> Record:
+    return book.normalized_title, book.normalized_author, book.isbn_no, bool(is_available)
+
+
+def default_start_method() -> str:
+    """
+    Get the start method of worker processes: fork where the platform has it, since it starts them
+    fastest, and spawn otherwise.
+    """
+    return "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+def _serve(connection: Connection, records: Dict[int, Record]) -> None:
+    """
+    Answer the requests of the scanner in a worker process until it is closed.
+    """
+    while True:
+        message = connection.recv()
+        if message[0] == "close":
+            break
+        if message[0] == "apply":
+            _apply(records, message[1])
+            continue
+        try:
+            if message[0] == "query":
+                connection.send(_query(records, *message[1:]))
+            else:
+                connection.send(_first(records, *message[1:]))
+        except Exception as e:
+            connection.send(e)
+    connection.close()
+
+
+def _apply(records: Dict[int, Record], mutations: List[tuple]) -> None:
+    for mutation in mutations:
+        if mutation[0] == "add":
+            records[mutation[1]] = mutation[2]
+        elif mutation[0] == "remove":
+            records.pop(mutation[1], None)
+        else:
+            record = records.get(mutation[1])
+            if record is not None:
+                records[mutation[1]] = record[:3] + (mutation[2],)
+
+
+def _query(
+    records: Dict[int, Record],
+    title: Optional[str],
+    author: Optional[str],
+    isbn_no: Optional[str],
+    is_available: Optional[bool],
+    limit: int,
+    after: Optional[Tuple[float, int]],
+) -> Tuple[List[Tuple[float, int]], int]:
+    """
+    Check and rank the books of a partition like ``Library._score_books``, keeping the best ``limit``.
+    """
+
+    def ranks():
+        for book_id, (book_title, book_author, book_isbn_no, available) in records.items():
+            if isbn_no is not None and book_isbn_no != isbn_no:
+                continue
+            if is_available is not None and available != is_available:
+                continue
+            score = 1.0
+            if title is not None:
+                if title not in book_title:
+                    continue
+                score += text_score(book_title, title)
+            if author is not None:
+                if author not in book_author:
+                    continue
+                score += text_score(book_author, author)
+            rank = (-score, book_id)
+            if after is None or rank > after:
+                yield rank
+
+    return heapq.nsmallest(limit, ranks()), len(records)
+
+
+def _first(records: Dict[int, Record], field: str, query: str) -> Optional[int]:
+    column = 0 if field == "title" else 1
+    return min((book_id for book_id, record in records.items() if query in record[column]), default=None)
@@ -0,0 +1,373 @@
+import bisect
+import heapq
+import re
+from itertools import islice
+from typing import Dict, Hashable, Iterable, Iterator, List, Optional, Set, Tuple
+
+TOKEN_PATTERN = re.compile(r"\w+")
+TRIGRAM_SIZE = 3
+FUZZY_DISTANCE = 2
+
+
+def tokenize(text: str) -> Set[str]:
+    """
+    Split a normalized string into its distinct word tokens.
+    """
+    return set(TOKEN_PATTERN.findall(text))
+
+
+def text_score(text: str, query: str) -> float:
+    """
+    Score how well a normalized text matches a normalized query it contains.
+
+    An exact match scores highest, then a match on whole tokens, then a match at the start of a token.
+    """
+    if text == query:
+        return 4.0
+    if tokenize(query) <= tokenize(text):
+        return 3.0 if text.startswith(query) else 2.0
+    if text.startswith(query) or " " + query in text:
+        return 1.5
+    return 1.0
+
+
+def trigrams(text: str) -> Set[str]:
+    """
+    Split a normalized string into its distinct trigrams.
+    """
+    return {text[i:i + TRIGRAM_SIZE] for i in range(len(text) - TRIGRAM_SIZE + 1)}
+
+
+class TokenIndex:
+    """
+    An inverted index from normalized tokens and trigrams to record keys.
+
+    Texts are expected to be normalized already, e.g. with ``_clean_input``. Token postings answer
+    whole-word lookups and trigram postings narrow substring lookups down to a candidate set.
+
+    Misspelled lookups are answered with symmetric deletes: every token is filed under the strings left
+    by deleting up to ``FUZZY_DISTANCE`` of its characters, so tokens within that many edits of a query
+    share one of the deletes of the query, and only those tokens have their distance computed. The
+    deletes are built on the first such lookup and then kept up to date as tokens come and go.
+
+    :cvar tokens: Postings for every word token.
+    :cvar trigrams: Postings for every trigram.
+    :cvar deletes: The tokens filed under every delete, once built.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initialize an empty index.
+        """
+        self._tokens: Dict[str, Set[Hashable]] = {}
+        self._trigrams: Dict[str, Set[Hashable]] = {}
+        self._deletes: Optional[Dict[str, Set[str]]] = None
+
+    def add(self, key: Hashable, text: str) -> None:
+        """
+        Index a record under its normalized text.
+        """
+        for token in tokenize(text):
+            postings = self._tokens.get(token)
+            if postings is None:
+                postings = self._tokens[token] = set()
+                self._add_deletes(token)
+            postings.add(key)
+        for trigram in trigrams(text):
+            self._trigrams.setdefault(trigram, set()).add(key)
+
+    def add_many(self, items: Iterable[Tuple[Hashable, str]]) -> None:
+        """
+        Index several records at once, merging each term's postings in a single update.
+        """
+        tokens: Dict[str, List[Hashable]] = {}
+        trigram_keys: Dict[str, List[Hashable]] = {}
+        for key, text in items:
+            for token in tokenize(text):
+                tokens.setdefault(token, []).append(key)
+            for trigram in trigrams(text):
+                trigram_keys.setdefault(trigram, []).append(key)
+
+        for token, keys in tokens.items():
+            postings = self._tokens.get(token)
+            if postings is None:
+                postings = self._tokens[token] = set()
+                self._add_deletes(token)
+            postings.update(keys)
+        for trigram, keys in trigram_keys.items():
+            self._trigrams.setdefault(trigram, set()).update(keys)
+
+    def remove(self, key: Hashable, text: str) -> None:
+        """
+        Remove a record that was indexed under the same normalized text.
+        """
+        for token in _discard(self._tokens, tokenize(text), key):
+            self._remove_deletes(token)
+        _discard(self._trigrams, trigrams(text), key)
+
+    def lookup(self, token: str) -> Set[Hashable]:
+        """
+        Get the keys of records containing a whole token.
+        """
+        return set(self._tokens.get(token, ()))
+
+    def candidates(self, query: str) -> Optional[Set[Hashable]]:
+        """
+        Get the keys of records that may contain a normalized query as a substring.
+
+        The result is a superset of the matches, so callers still verify each candidate. ``None``
+        means the index cannot narrow the query down and the caller has to scan.
+        """
+        if len(query) >= TRIGRAM_SIZE:
+            return _intersect(self._trigrams.get(trigram, set()) for trigram in trigrams(query))
+
+        if not query or not TOKEN_PATTERN.fullmatch(query):
+            return None
+
+        keys: Set[Hashable] = set()
+        for token, postings in list(self._tokens.items()):
+            if query in token:
+                keys |= postings
+        return keys
+
+    @property
+    def fuzzy(self) -> bool:
+        """
+        Whether the deletes for misspelled lookups are built.
+        """
+        return self._deletes is not None
+
+    def build_deletes(self) -> None:
+        """
+        Build the deletes of every token, to answer misspelled lookups.
+        """
+        if self._deletes is None:
+            self._deletes = {}
+            for token in list(self._tokens):
+                self._add_deletes(token)
+
+    def similar(self, token: str, max_distance: int = FUZZY_DISTANCE) -> Dict[str, int]:
+        """
+        Get the indexed tokens within ``max_distance`` edits of a token, with their distance.
+
+        Edits are insertions, deletions, substitutions and swaps of adjacent characters.
+        """
+        self.build_deletes()
+        max_distance = min(max_distance, FUZZY_DISTANCE)
+        found: Dict[str, int] = {}
+        for variant in deletes(token, max_distance):
+            for candidate in tuple(self._deletes.get(variant, ())):
+                if candidate not in found:
+                    found[candidate] = edit_distance(token, candidate, max_distance)
+        return {candidate: distance for candidate, distance in found.items() if distance <= max_distance}
+
+    def closest(self, query: str, max_distance: int = FUZZY_DISTANCE) -> Optional[Tuple[int, Set[Hashable]]]:
+        """
+        Get the records whose tokens are the fewest edits away from the tokens of a normalized query.
+
+        Every query token has to be within ``max_distance`` edits of a token of a record, fewer for short
+        tokens, see ``allowed_distance``. The records are gathered per query token and number of edits,
+        and merged token by token into one set per running total of edits, so a query costs its number
+        of tokens times the totals kept rather than every combination of edits. A token no record comes
+        close to ends the search.
+
+        :return: The total number of edits and the keys of the records that close, or ``None``.
+        """
+        totals: List[Set[Hashable]] = []
+        for token in tokenize(query):
+            distance = allowed_distance(token, max_distance)
+            by_distance: List[Set[Hashable]] = [set() for _ in range(distance + 1)]
+            for candidate, edits in self.similar(token, distance).items():
+                by_distance[edits] |= self._tokens.get(candidate, set())
+            if not any(by_distance):
+                return None
+            if not totals:
+                totals = by_distance
+                continue
+            merged: List[Set[Hashable]] = [set() for _ in range(len(totals) + distance)]
+            for total, keys in enumerate(totals):
+                if keys:
+                    for edits, others in enumerate(by_distance):
+                        merged[total + edits] |= keys & others
+            if not any(merged):
+                return None
+            totals = merged
+
+        for total, keys in enumerate(totals):
+            if keys:
+                return total, keys
+        return None
+
+    def _add_deletes(self, token: str) -> None:
+        if self._deletes is not None:
+            for variant in deletes(token, FUZZY_DISTANCE):
+                self._deletes.setdefault(variant, set()).add(token)
+
+    def _remove_deletes(self, token: str) -> None:
+        if self._deletes is not None:
+            _discard(self._deletes, deletes(token, FUZZY_DISTANCE), token)
+
+
+class SortedIds:
+    """
+    The ids of a set of records in increasing order, to page through them by id.
+
+    Adding or removing an id is O(1), where keeping a sorted list up to date moves O(N) ids each time.
+    Added ids are collected and merged into the sorted list on the next read: k ids greater than every
+    other one, as imports usually add them, are appended in O(k log k), others cost an O(N + k log k)
+    merge. Removed ids stay in the list and are skipped until they are half of it, when the next read
+    drops them. So a page after a run of writes pays for them once, but a page after every write that
+    adds ids out of order pays a merge each time.
+
+    :cvar ids: The sorted ids, including removed ones not dropped yet.
+    :cvar added: The ids added since the last read, in no particular order.
+    :cvar removed: The ids removed since the last read that are still in ``ids`` or ``added``.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initialize an empty list.
+        """
+        self._ids: List[int] = []
+        self._added: List[int] = []
+        self._removed: Set[int] = set()
+
+    def __len__(self) -> int:
+        return len(self._ids) + len(self._added) - len(self._removed)
+
+    def add(self, id: int) -> None:
+        """
+        Add an id that is not in the list.
+        """
+        if id in self._removed:
+            self._removed.discard(id)
+        else:
+            self._added.append(id)
+
+    def add_many(self, ids: Iterable[int]) -> None:
+        """
+        Add ids that are not in the list.
+        """
+        for id in ids:
+            self.add(id)
+
+    def remove(self, id: int) -> None:
+        """
+        Remove an id that is in the list.
+        """
+        self._removed.add(id)
+
+    def page(self, after: Optional[int], before: Optional[int], limit: int) -> List[int]:
+        """
+        Get up to ``limit`` ids after or before an id, in increasing order.
+        """
+        ids = self._sorted()
+        if before is not None:
+            end = bisect.bisect_left(ids, before)
+            keys = list(islice(self._live(ids[i] for i in range(end - 1, -1, -1)), limit))
+            keys.reverse()
+            return keys
+        start = bisect.bisect_right(ids, after) if after is not None else 0
+        return list(islice(self._live(ids[i] for i in range(start, len(ids))), limit))
+
+    def ordered(self) -> List[int]:
+        """
+        Get the sorted list to walk it in order. Removed ids may still be in it, and later additions may be
+        appended to it, so callers check that the records they find still exist.
+        """
+        return self._sorted()
+
+    def _live(self, ids: Iterator[int]) -> Iterator[int]:
+        removed = self._removed
+        return (id for id in ids if id not in removed)
+
+    def _sorted(self) -> List[int]:
+        """
+        Merge the added ids into the sorted list, and drop the removed ones once they are half of it.
+        """
+        if self._added:
+            self._added.sort()
+            if self._ids and self._added[0] < self._ids[-1]:
+                self._ids = list(heapq.merge(self._ids, self._added))
+            else:
+                self._ids.extend(self._added)
+            self._added = []
+        if len(self._removed) * 2 > len(self._ids):
+            self._ids = [id for id in self._ids if id not in self._removed]
+            self._removed = set()
+        return self._ids
+
+
+def _intersect(postings: Iterable[Set[Hashable]]) -> Set[Hashable]:
+    """
+    Intersect postings, starting from the shortest one.
+    """
+    postings = sorted(postings, key=len)
+    result = set(postings[0])
+    for keys in postings[1:]:
+        if not result:
+            break
+        result &= keys
+    return result
+
+
+def allowed_distance(token: str, max_distance: int = FUZZY_DISTANCE) -> int:
+    """
+    Get the number of edits allowed for a query token: none up to 2 characters, 1 up to 4, then ``max_distance``.
+
+    Short tokens are within two edits of too many others for a match to mean anything.
+    """
+    return min(max_distance, max(0, (len(token) - 1) // 2))
+
+
+def deletes(token: str, distance: int) -> Set[str]:
+    """
+    Get the strings left by deleting up to ``distance`` characters of a token, the token included.
+    """
+    result = {token}
+    layer = {token}
+    for _ in range(distance):
+        layer = {text[:i] + text[i + 1:] for text in layer for i in range(len(text))}
+        result |= layer
+    return result
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """
+    Get the edit distance between two strings, counting swaps of adjacent characters as one edit.
+
+    Rows stop being computed once every entry exceeds ``limit``, and ``limit + 1`` is returned then.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2: List[int] = []
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return min(previous[-1], limit + 1)
+
+
+def _discard(index: Dict[str, Set[Hashable]], terms: Iterable[str], key: Hashable) -> List[str]:
+    """
+    Remove a key from the postings of the given terms, dropping postings that become empty.
+
+    :return: The terms dropped.
+    """
+    dropped = []
+    for term in terms:
+        postings = index.get(term)
+        if postings is None:
+            continue
+        postings.discard(key)
+        if not postings:
+            del index[term]
+            dropped.append(term)
+    return dropped
@@ -0,0 +1,453 @@
+import asyncio
+import json
+import logging
+import os
+from concurrent.futures import Executor, ThreadPoolExecutor
+from http import HTTPStatus
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, TypeVar
+from urllib.parse import parse_qsl, urlsplit
+
+from library_manager import DEFAULT_PAGE_SIZE, Book, Library, LibraryError, Members, _book_payload, _member_payload
+from storage import SQLiteStorage
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 8080
+MAX_HEADER_SIZE = 16 * 1024
+MAX_BODY_SIZE = 1024 * 1024
+MAX_PIPELINE = 32
+KEEP_ALIVE_TIMEOUT = 15.0
+
+T = TypeVar("T")
+_MISSING = object()
+
+
+class HTTPError(Exception):
+    """
+    An error that is answered with an HTTP status.
+    """
+
+    def __init__(self, status: HTTPStatus, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+class Request:
+    """
+    A parsed HTTP request.
+
+    :cvar method: The request method, e.g. ``"GET"``.
+    :cvar path: The path without the query string.
+    :cvar query: The query string parameters.
+    :cvar headers: The headers, with lowercase names.
+    :cvar body: The request body.
+    :cvar keep_alive: Whether the client keeps the connection open after the response.
+    """
+
+    def __init__(self, method: str, target: str, version: str, headers: Dict[str, str], body: bytes) -> None:
+        url = urlsplit(target)
+        self.method = method
+        self.path = url.path.rstrip("/") or "/"
+        self.query = dict(parse_qsl(url.query))
+        self.headers = headers
+        self.body = body
+        connection = headers.get("connection", "").lower()
+        self.keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+
+    def json(self) -> dict:
+        """
+        Decode the body as a JSON object.
+        """
+        try:
+            data = json.loads(self.body or b"{}")
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Body is not valid JSON.")
+        if not isinstance(data, dict):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Body is not a JSON object.")
+        return data
+
+
+class LibraryServer:
+    """
+    An HTTP/JSON API over a ``Library``, served with asyncio.
+
+    Connections are kept alive between requests and clients may pipeline them: requests are read as
+    they arrive and handled concurrently, and the responses are written back in request order, with at
+    most ``max_pipeline`` requests in flight per connection. Handlers run in an executor, so a slow search,
+    a SQLite write or a journal fsync does not hold up the other connections. Within a connection a
+    request that changes the library waits for the requests before it, and the requests after it wait
+    for it, so clients read their own writes.
+
+    Invalid requests are answered with 400, unknown records with 404 and refused operations with 409;
+    any other error is logged and answered with 500.
+
+    Endpoints:
+
+    * ``GET /books?title=&author=&isbn_no=&is_available=&limit=&offset=`` searches books
+    * ``GET /books/{id}``, ``POST /books`` and ``DELETE /books/{id}``
+    * ``GET /members?name=&fuzzy=`` searches members, tolerating typos with ``fuzzy=1``
+    * ``GET /members/{id}``, ``POST /members`` and ``DELETE /members/{id}``
+    * ``POST /loans`` lends the book ``book_id`` to the member ``member_id``
+    * ``DELETE /loans/{book_id}`` returns a book
+    * ``GET /loans/overdue`` lists the overdue loans
+
+    :cvar library: The library served.
+    :cvar host: The interface to listen on.
+    :cvar port: The port to listen on; 0 picks a free one.
+    :cvar executor: The executor running the handlers.
+    :cvar max_pipeline: The maximum number of requests in flight per connection.
+    :cvar keep_alive_timeout: The seconds an idle connection is kept open.
+    """
+
+    def __init__(
+        self,
+        library: Library,
+        host: str = "127.0.0.1",
+        port: int = DEFAULT_PORT,
+        executor: Optional[Executor] = None,
+        max_pipeline: int = MAX_PIPELINE,
+        keep_alive_timeout: float = KEEP_ALIVE_TIMEOUT,
+    ) -> None:
+        self.library = library
+        self.host = host
+        self.port = port
+        self._executor = executor or ThreadPoolExecutor(thread_name_prefix="library-server")
+        self._max_pipeline = max_pipeline
+        self._keep_alive_timeout = keep_alive_timeout
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._routes: List[Tuple[str, str, Callable]] = [
+            ("GET", "/books", self._search_books),
+            ("GET", "/books/{id}", self._get_book),
+            ("POST", "/books", self._add_book),
+            ("DELETE", "/books/{id}", self._remove_book),
+            ("GET", "/members", self._search_members),
+            ("GET", "/members/{id}", self._get_member),
+            ("POST", "/members", self._add_member),
+            ("DELETE", "/members/{id}", self._remove_member),
+            ("GET", "/loans/overdue", self._overdue),
+            ("POST", "/loans", self._lend_book),
+            ("DELETE", "/loans/{id}", self._return_book),
+        ]
+
+    async def start(self) -> None:
+        """
+        Start listening; ``port`` is updated to the actual port.
+        """
+        self._server = await asyncio.start_server(
+            self._handle_connection, self.host, self.port, limit=MAX_HEADER_SIZE
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info("Serving the library on http://%s:%d", self.host, self.port)
+
+    async def serve_forever(self) -> None:
+        """
+        Start listening if needed and serve until cancelled.
+        """
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self) -> None:
+        """
+        Stop listening and shut the executor down.
+        """
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        self._executor.shutdown(wait=False)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        Read the requests of a connection and hand them to a writer that answers them in order.
+
+        Reads since the last write of the connection run concurrently, after that write; a write runs
+        after the reads before it, or after the previous write if there were none.
+        """
+        responses: asyncio.Queue = asyncio.Queue(self._max_pipeline)
+        respond = asyncio.create_task(self._write_responses(responses, writer))
+        reads: List[asyncio.Task] = []
+        write: Optional[asyncio.Task] = None
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(_read_request(reader), self._keep_alive_timeout)
+                except HTTPError as e:
+                    await responses.put(_completed(_error_response(e.status, str(e), keep_alive=False)))
+                    break
+                if request is None:
+                    break
+                if request.method == "GET":
+                    task = asyncio.create_task(self._respond(request, [write] if write is not None else []))
+                    reads = [read for read in reads if not read.done()] + [task]
+                else:
+                    task = asyncio.create_task(self._respond(request, reads or ([write] if write is not None else [])))
+                    write, reads = task, []
+                await responses.put(task)
+                if not request.keep_alive:
+                    break
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            await responses.put(None)
+            await respond
+            writer.close()
+
+    async def _write_responses(self, responses: asyncio.Queue, writer: asyncio.StreamWriter) -> None:
+        """
+        Write the responses of a connection in request order.
+
+        Responses are still awaited after the connection is closed or lost, so the reader never waits
+        on a full queue.
+        """
+        connected = True
+        while True:
+            task = await responses.get()
+            if task is None:
+                return
+            response, keep_alive = await task
+            if not connected:
+                continue
+            try:
+                writer.write(response)
+                await writer.drain()
+            except ConnectionError:
+                connected = False
+            connected = connected and keep_alive
+
+    async def _respond(self, request: Request, after: Sequence[asyncio.Task]) -> Tuple[bytes, bool]:
+        """
+        Handle a request in the executor once the requests it comes after are answered, and encode its
+        response.
+        """
+        if after:
+            await asyncio.wait(after)
+        try:
+            handler, params = self._route(request)
+            loop = asyncio.get_running_loop()
+            status, body = await loop.run_in_executor(self._executor, handler, request, *params)
+        except HTTPError as e:
+            return _error_response(e.status, str(e), request.keep_alive)
+        except LibraryError as e:
+            status = HTTPStatus.NOT_FOUND if "not found" in str(e).lower() else HTTPStatus.CONFLICT
+            return _error_response(status, str(e), request.keep_alive)
+        except Exception:
+            logger.exception("Failed to handle %s %s", request.method, request.path)
+            return _error_response(HTTPStatus.INTERNAL_SERVER_ERROR, "Internal server error.", request.keep_alive)
+        return _response(status, body, request.keep_alive)
+
+    def _route(self, request: Request) -> Tuple[Callable, list]:
+        """
+        Find the handler of a request, with the parameters taken from its path.
+        """
+        parts = request.path.split("/")
+        allowed = []
+        for method, pattern, handler in self._routes:
+            pattern_parts = pattern.split("/")
+            if len(pattern_parts) != len(parts):
+                continue
+            params = []
+            for part, pattern_part in zip(parts, pattern_parts):
+                if pattern_part == "{id}":
+                    if not part.lstrip("-").isdigit():
+                        break
+                    params.append(int(part))
+                elif part != pattern_part:
+                    break
+            else:
+                if method == request.method:
+                    return handler, params
+                allowed.append(method)
+        if allowed:
+            raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, f"Use {', '.join(allowed)}.")
+        raise HTTPError(HTTPStatus.NOT_FOUND, "No such endpoint.")
+
+    def _search_books(self, request: Request) -> Tuple[HTTPStatus, object]:
+        query = request.query
+        is_available = query.get("is_available")
+        results = self.library.query_books(
+            isbn_no=query.get("isbn_no"),
+            title=query.get("title"),
+            author=query.get("author"),
+            is_available=None if is_available is None else is_available.lower() in ("1", "true", "yes"),
+            limit=_field(query, "limit", int, DEFAULT_PAGE_SIZE),
+            offset=_field(query, "offset", int, 0),
+        )
+        return HTTPStatus.OK, [dict(_book_payload(result.book), score=result.score) for result in results]
+
+    def _get_book(self, request: Request, book_id: int) -> Tuple[HTTPStatus, object]:
+        book = self.library.get_book(book_id)
+        if book is None:
+            raise HTTPError(HTTPStatus.NOT_FOUND, "Book not found.")
+        return HTTPStatus.OK, _book_payload(book)
+
+    def _add_book(self, request: Request) -> Tuple[HTTPStatus, object]:
+        data = request.json()
+        book = Book(
+            _field(data, "id", int), _field(data, "title", str), _field(data, "author", str),
+            _field(data, "isbn_no", str), _field(data, "is_available", bool, True),
+        )
+        self.library.add_book(book)
+        return HTTPStatus.CREATED, _book_payload(book)
+
+    def _remove_book(self, request: Request, book_id: int) -> Tuple[HTTPStatus, object]:
+        self.library.remove_book(_find(self.library.get_book(book_id), "Book not found."))
+        return HTTPStatus.OK, {"id": book_id}
+
+    def _search_members(self, request: Request) -> Tuple[HTTPStatus, object]:
+        name = request.query.get("name")
+        fuzzy = request.query.get("fuzzy", "").lower() in ("1", "true", "yes")
+        member = self.library.search_member({"name": name}, fuzzy=fuzzy) if name else None
+        return HTTPStatus.OK, [_member_payload(member)] if member is not None else []
+
+    def _get_member(self, request: Request, member_id: int) -> Tuple[HTTPStatus, object]:
+        return HTTPStatus.OK, _member_payload(_find(self.library.get_member(member_id), "Member not found."))
+
+    def _add_member(self, request: Request) -> Tuple[HTTPStatus, object]:
+        data = request.json()
+        member = Members(_field(data, "id", int), _field(data, "name", str), _field(data, "phone", str), [])
+        self.library.add_member(member)
+        return HTTPStatus.CREATED, _member_payload(member)
+
+    def _remove_member(self, request: Request, member_id: int) -> Tuple[HTTPStatus, object]:
+        self.library.remove_member(_find(self.library.get_member(member_id), "Member not found."))
+        return HTTPStatus.OK, {"id": member_id}
+
+    def _lend_book(self, request: Request) -> Tuple[HTTPStatus, object]:
+        data = request.json()
+        member = _find(self.library.get_member(_field(data, "member_id", int)), "Member not found.")
+        book = _find(self.library.get_book(_field(data, "book_id", int)), "Book not found.")
+        loan = self.library.lend_book(member, book, due_at=_field(data, "due_at", float, None))
+        return HTTPStatus.CREATED, _loan_payload(loan)
+
+    def _return_book(self, request: Request, book_id: int) -> Tuple[HTTPStatus, object]:
+        book = _find(self.library.get_book(book_id), "Book not found.")
+        member = self.library.get_borrower(book_id)
+        if member is None:
+            raise HTTPError(HTTPStatus.CONFLICT, "Book not borrowed.")
+        self.library.return_book(member, book)
+        return HTTPStatus.OK, {"book_id": book_id, "member_id": member.id}
+
+    def _overdue(self, request: Request) -> Tuple[HTTPStatus, object]:
+        now = _field(request.query, "now", float, None)
+        return HTTPStatus.OK, [_loan_payload(loan) for loan in self.library.overdue(now)]
+
+
+async def _read_request(reader: asyncio.StreamReader) -> Optional[Request]:
+    """
+    Read one request from a connection, or ``None`` if the client closed it.
+    """
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError as e:
+        if not e.partial.strip():
+            return None
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Incomplete request.")
+    except asyncio.LimitOverrunError:
+        raise HTTPError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "Request headers too large.")
+
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, target, version = lines[0].split(" ")
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Invalid request line.")
+
+    headers = {}
+    for line in lines[1:]:
+        if line:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+    try:
+        length = int(headers.get("content-length", 0))
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Invalid Content-Length.")
+    if length > MAX_BODY_SIZE:
+        raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Request body too large.")
+    body = await reader.readexactly(length) if length else b""
+    return Request(method, target, version, headers, body)
+
+
+def _response(status: HTTPStatus, body: object, keep_alive: bool) -> Tuple[bytes, bool]:
+    """
+    Encode a JSON response.
+    """
+    content = json.dumps(body, separators=(",", ":")).encode()
+    head = (
+        f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+        f"Content-Type: application/json\r\n"
+        f"Content-Length: {len(content)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    return head.encode() + content, keep_alive
+
+
+def _error_response(status: HTTPStatus, message: str, keep_alive: bool) -> Tuple[bytes, bool]:
+    """
+    Encode an error response.
+    """
+    return _response(status, {"error": message}, keep_alive)
+
+
+def _completed(result) -> asyncio.Future:
+    """
+    Wrap a result that is already known in a future.
+    """
+    future = asyncio.get_running_loop().create_future()
+    future.set_result(result)
+    return future
+
+
+def _find(record, message: str):
+    """
+    Return a record, or answer 404 if there is none.
+    """
+    if record is None:
+        raise HTTPError(HTTPStatus.NOT_FOUND, message)
+    return record
+
+
+def _field(data: dict, name: str, kind: Callable[[object], T], default=_MISSING) -> T:
+    """
+    Convert a field of a request body or query string, or answer 400 if it is missing or invalid.
+
+    :param default: The value of a missing field; without one the field is required.
+    """
+    value = data.get(name)
+    if value is None:
+        if default is _MISSING:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"Missing {name}.")
+        return default
+    try:
+        return kind(value)
+    except (TypeError, ValueError):
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"Invalid {name}.")
+
+
+def _loan_payload(loan) -> dict:
+    """
+    Convert a loan to JSON.
+    """
+    return {"book_id": loan.book.id, "member_id": loan.member_id, "borrowed_at": loan.borrowed_at, "due_at": loan.due_at}
+
+
+def main() -> None:
+    """
+    Serve the library database named by ``LIBRARY_DATABASE``, or an empty library, on ``LIBRARY_PORT``.
+    """
+    logging.basicConfig(level=logging.INFO)
+    database = os.environ.get("LIBRARY_DATABASE")
+    library = Library(SQLiteStorage(database)) if database else Library()
+    server = LibraryServer(
+        library, os.environ.get("LIBRARY_HOST", "127.0.0.1"), int(os.environ.get("LIBRARY_PORT", DEFAULT_PORT))
+    )
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        library.close()
+
+
+if __name__ == "__main__":
+    main()
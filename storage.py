@@ -0,0 +1,607 @@
+import heapq
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from typing import Callable, Iterable, Iterator, List, Optional, Set, Tuple
+
+from search_index import TRIGRAM_SIZE, text_score
+
+FIND_BATCH = 1000
+ID_BATCH = 500
+BOOK_COLUMNS = ("id", "title", "author", "isbn_no", "is_available", "normalized_title", "normalized_author")
+MEMBER_COLUMNS = ("id", "name", "phone", "normalized_name")
+
+
+class Storage(ABC):
+    """
+    A storage backend that persists the records of a ``Library``.
+
+    Records are passed around as dictionaries keyed by the ``Book`` and ``Members`` field names, so a
+    backend does not depend on the record classes. Text filters are matched as substrings of the
+    normalized fields. Searches return iterators that read the matches as they are consumed, so a
+    caller that stops early does not load the rest.
+    """
+
+    @abstractmethod
+    def save_book(self, row: dict) -> None:
+        """
+        Insert a new book.
+        """
+
+    def save_books(self, rows: List[dict]) -> None:
+        """
+        Insert several new books.
+        """
+        for row in rows:
+            self.save_book(row)
+
+    @abstractmethod
+    def delete_book(self, book_id: int) -> None:
+        """
+        Delete a book.
+        """
+
+    @abstractmethod
+    def set_book_available(self, book_id: int, is_available: bool) -> None:
+        """
+        Update whether a book is available.
+        """
+
+    @abstractmethod
+    def load_book(self, book_id: int) -> Optional[dict]:
+        """
+        Load a book by id.
+        """
+
+    @abstractmethod
+    def existing_book_ids(self, book_ids: Iterable[int]) -> Set[int]:
+        """
+        Get which of some book ids are taken, without loading the books.
+        """
+
+    @abstractmethod
+    def find_books(
+        self,
+        isbn_no: Optional[str] = None,
+        title: Optional[str] = None,
+        author: Optional[str] = None,
+        is_available: Optional[bool] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[dict]:
+        """
+        Load the books matching every given filter, ordered by id, at most ``limit`` if given.
+        """
+
+    def rank_books(
+        self,
+        isbn_no: Optional[str] = None,
+        title: Optional[str] = None,
+        author: Optional[str] = None,
+        is_available: Optional[bool] = None,
+        limit: int = 20,
+        after: Optional[Tuple[float, int]] = None,
+    ) -> List[Tuple[dict, float]]:
+        """
+        Load the best ``limit`` books matching every given filter with their scores, ranked like
+        ``Library.query_books``: by descending score, then by id.
+
+        :param after: The rank ``(-score, id)`` of a result from a previous page; only books ranked after
+            it are returned.
+        """
+
+        def ranked():
+            for row in self.find_books(isbn_no, title, author, is_available):
+                score = 1.0
+                if title is not None:
+                    score += text_score(row["normalized_title"], title)
+                if author is not None:
+                    score += text_score(row["normalized_author"], author)
+                if after is None or (-score, row["id"]) > after:
+                    yield (-score, row["id"]), row
+
+        return [(row, -rank[0]) for rank, row in heapq.nsmallest(limit, ranked(), key=lambda item: item[0])]
+
+    @abstractmethod
+    def count_books(self, isbn_no: Optional[str] = None, is_available: Optional[bool] = None) -> int:
+        """
+        Count the books matching every given filter.
+        """
+
+    @abstractmethod
+    def count_books_by_author(self) -> List[Tuple[str, int]]:
+        """
+        Count the books of every author, copies included.
+        """
+
+    @abstractmethod
+    def page_books(self, after: Optional[int] = None, before: Optional[int] = None, limit: int = 20) -> List[dict]:
+        """
+        Load up to ``limit`` books ordered by id, with an id greater than ``after`` or lower than ``before``.
+        """
+
+    @abstractmethod
+    def save_member(self, row: dict, loans: List[dict] = ()) -> None:
+        """
+        Insert a new member, with the loans of the books they already borrowed, like ``save_loans``, all
+        or nothing.
+        """
+
+    @abstractmethod
+    def delete_member(self, member_id: int) -> None:
+        """
+        Delete a member. Their loans are kept, since the books are still out, until the books come back.
+        """
+
+    @abstractmethod
+    def load_member(self, member_id: int) -> Optional[dict]:
+        """
+        Load a member by id.
+        """
+
+    @abstractmethod
+    def find_members(self, name: str, limit: Optional[int] = None) -> Iterator[dict]:
+        """
+        Load the members whose normalized name contains the given text, ordered by id, at most ``limit``
+        if given.
+        """
+
+    @abstractmethod
+    def page_members(self, after: Optional[int] = None, before: Optional[int] = None, limit: int = 20) -> List[dict]:
+        """
+        Load up to ``limit`` members ordered by id, with an id greater than ``after`` or lower than ``before``.
+        """
+
+    @abstractmethod
+    def save_loan(self, book_id: int, member_id: int, borrowed_at: float, due_at: float) -> None:
+        """
+        Record that a book is lent to a member, replacing the dates of an existing loan of the book.
+        """
+
+    @abstractmethod
+    def delete_loan(self, book_id: int) -> None:
+        """
+        Record that a book is returned.
+        """
+
+    def save_loans(self, rows: List[dict]) -> None:
+        """
+        Record several loans, as ``book_id``, ``member_id``, ``borrowed_at`` and ``due_at``, and mark their
+        books unavailable.
+        """
+        for row in rows:
+            self.save_loan(row["book_id"], row["member_id"], row["borrowed_at"], row["due_at"])
+            self.set_book_available(row["book_id"], False)
+
+    def delete_loans(self, book_ids: List[int]) -> None:
+        """
+        Record that several books are returned and mark them available.
+        """
+        for book_id in book_ids:
+            self.delete_loan(book_id)
+            self.set_book_available(book_id, True)
+
+    @abstractmethod
+    def load_loans(self, member_id: int) -> List[dict]:
+        """
+        Load the loans of a member, oldest first, as ``book_id``, ``borrowed_at`` and ``due_at``.
+        """
+
+    @abstractmethod
+    def load_loan(self, book_id: int) -> Optional[dict]:
+        """
+        Load the loan of a book, with the id of the member it is lent to.
+        """
+
+    @abstractmethod
+    def load_due_loans(self, until: Optional[float] = None, limit: Optional[int] = None) -> List[dict]:
+        """
+        Load the loans due first, as ``book_id`` and ``member_id``, optionally only those due by ``until``.
+        """
+
+    @abstractmethod
+    def count_loans_by_member(self) -> List[Tuple[int, int]]:
+        """
+        Count the loans of every member id, including the loans of removed members.
+        """
+
+    def flush(self) -> None:
+        """
+        Make every write so far durable.
+        """
+
+    def close(self) -> None:
+        """
+        Flush and release the backend.
+        """
+        self.flush()
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS books (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    author TEXT NOT NULL,
+    isbn_no TEXT NOT NULL,
+    is_available INTEGER NOT NULL,
+    normalized_title TEXT NOT NULL,
+    normalized_author TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS books_isbn_no ON books (isbn_no);
+DROP INDEX IF EXISTS books_normalized_title;
+DROP INDEX IF EXISTS books_normalized_author;
+CREATE VIRTUAL TABLE IF NOT EXISTS books_text USING fts5(
+    normalized_title, normalized_author, content='books', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS books_text_insert AFTER INSERT ON books BEGIN
+    INSERT INTO books_text (rowid, normalized_title, normalized_author)
+    VALUES (new.id, new.normalized_title, new.normalized_author);
+END;
+CREATE TRIGGER IF NOT EXISTS books_text_delete AFTER DELETE ON books BEGIN
+    INSERT INTO books_text (books_text, rowid, normalized_title, normalized_author)
+    VALUES ('delete', old.id, old.normalized_title, old.normalized_author);
+END;
+
+CREATE TABLE IF NOT EXISTS members (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    phone TEXT NOT NULL,
+    normalized_name TEXT NOT NULL
+);
+DROP INDEX IF EXISTS members_normalized_name;
+CREATE VIRTUAL TABLE IF NOT EXISTS members_text USING fts5(
+    normalized_name, content='members', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS members_text_insert AFTER INSERT ON members BEGIN
+    INSERT INTO members_text (rowid, normalized_name) VALUES (new.id, new.normalized_name);
+END;
+CREATE TRIGGER IF NOT EXISTS members_text_delete AFTER DELETE ON members BEGIN
+    INSERT INTO members_text (members_text, rowid, normalized_name) VALUES ('delete', old.id, old.normalized_name);
+END;
+
+CREATE TABLE IF NOT EXISTS loans (
+    book_id INTEGER PRIMARY KEY,
+    member_id INTEGER NOT NULL,
+    borrowed_at REAL NOT NULL,
+    due_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS loans_member_id ON loans (member_id);
+CREATE INDEX IF NOT EXISTS loans_due_at ON loans (due_at);
+"""
+
+INSERT_BOOK = f"INSERT INTO books ({', '.join(BOOK_COLUMNS)}) VALUES ({', '.join('?' * len(BOOK_COLUMNS))})"
+DELETE_BOOK = "DELETE FROM books WHERE id = ?"
+UPDATE_BOOK_AVAILABLE = "UPDATE books SET is_available = ? WHERE id = ?"
+SELECT_BOOKS = f"SELECT {', '.join(BOOK_COLUMNS)} FROM books"
+INSERT_MEMBER = f"INSERT INTO members ({', '.join(MEMBER_COLUMNS)}) VALUES ({', '.join('?' * len(MEMBER_COLUMNS))})"
+DELETE_MEMBER = "DELETE FROM members WHERE id = ?"
+SELECT_MEMBERS = f"SELECT {', '.join(MEMBER_COLUMNS)} FROM members"
+INSERT_LOAN = "INSERT OR REPLACE INTO loans (book_id, member_id, borrowed_at, due_at) VALUES (?, ?, ?, ?)"
+DELETE_LOAN = "DELETE FROM loans WHERE book_id = ?"
+SELECT_LOANS = "SELECT book_id, borrowed_at, due_at FROM loans WHERE member_id = ? ORDER BY borrowed_at, rowid"
+SELECT_LOAN = "SELECT book_id, member_id, borrowed_at, due_at FROM loans WHERE book_id = ?"
+SELECT_DUE_LOANS = "SELECT book_id, member_id FROM loans WHERE due_at <= ? ORDER BY due_at LIMIT ?"
+COUNT_BOOKS_BY_AUTHOR = "SELECT author, count(*) FROM books GROUP BY author"
+COUNT_LOANS_BY_MEMBER = "SELECT member_id, count(*) FROM loans GROUP BY member_id"
+SELECT_TEXT_TABLES = "SELECT name FROM sqlite_master WHERE name IN ('books_text', 'members_text')"
+
+
+class SQLiteStorage(Storage):
+    """
+    A storage backend on a SQLite database.
+
+    The database runs in WAL mode so readers do not block the writer. Statements are fixed strings, so
+    the connection compiles each of them once and reuses the prepared statement. Writes are committed
+    in batches of ``batch_size``; call ``flush`` to commit earlier. The connection may be shared by
+    threads; a lock keeps each statement and the rows it returns together.
+
+    Normalized titles, authors and names are kept in FTS5 trigram tables, updated by triggers, which
+    narrow substring filters of three characters or more down to the rows containing every trigram of
+    the query. Searches read their rows ``FIND_BATCH`` at a time by increasing id, and ranked searches
+    are scored, sorted and cut to a page by SQLite, with ``text_score`` registered as a SQL function.
+
+    :cvar connection: The SQLite connection.
+    :cvar lock: The lock serializing the use of the connection.
+    :cvar batch_size: The number of writes per commit.
+    :cvar pending: The number of writes since the last commit.
+    """
+
+    def __init__(self, path: str, batch_size: int = 1000) -> None:
+        """
+        Open or create a database.
+
+        :param path: The database file, or ``":memory:"``.
+        :param batch_size: The number of writes per commit.
+        """
+        self._connection = sqlite3.connect(path, cached_statements=256, check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        self._connection.execute("PRAGMA journal_mode = WAL")
+        self._connection.execute("PRAGMA synchronous = NORMAL")
+        self._connection.create_function("text_score", 2, text_score, deterministic=True)
+        existing = {row[0] for row in self._connection.execute(SELECT_TEXT_TABLES)}
+        self._connection.executescript(SCHEMA)
+        for table in {"books_text", "members_text"} - existing:
+            self._connection.execute(f"INSERT INTO {table} ({table}) VALUES ('rebuild')")
+        self._connection.commit()
+        self._batch_size = batch_size
+        self._pending = 0
+        self._lock = threading.RLock()
+
+    def save_book(self, row: dict) -> None:
+        self._write(INSERT_BOOK, [row[column] for column in BOOK_COLUMNS])
+
+    def save_books(self, rows: List[dict]) -> None:
+        self._write_many([(INSERT_BOOK, [[row[column] for column in BOOK_COLUMNS] for row in rows])])
+
+    def delete_book(self, book_id: int) -> None:
+        with self._lock:
+            self._write(DELETE_BOOK, (book_id,))
+            self._write(DELETE_LOAN, (book_id,))
+
+    def set_book_available(self, book_id: int, is_available: bool) -> None:
+        self._write(UPDATE_BOOK_AVAILABLE, (is_available, book_id))
+
+    def load_book(self, book_id: int) -> Optional[dict]:
+        return _book_row(self._fetchone(SELECT_BOOKS + " WHERE id = ?", (book_id,)))
+
+    def existing_book_ids(self, book_ids: Iterable[int]) -> Set[int]:
+        book_ids = list(book_ids)
+        existing = set()
+        for start in range(0, len(book_ids), ID_BATCH):
+            batch = book_ids[start:start + ID_BATCH]
+            sql = f"SELECT id FROM books WHERE id IN ({', '.join('?' * len(batch))})"
+            existing.update(row[0] for row in self._fetchall(sql, batch))
+        return existing
+
+    def find_books(
+        self,
+        isbn_no: Optional[str] = None,
+        title: Optional[str] = None,
+        author: Optional[str] = None,
+        is_available: Optional[bool] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[dict]:
+        conditions, params = _book_filters(isbn_no, title, author, is_available)
+        return self._find(SELECT_BOOKS, conditions, params, limit, _book_row)
+
+    def rank_books(
+        self,
+        isbn_no: Optional[str] = None,
+        title: Optional[str] = None,
+        author: Optional[str] = None,
+        is_available: Optional[bool] = None,
+        limit: int = 20,
+        after: Optional[Tuple[float, int]] = None,
+    ) -> List[Tuple[dict, float]]:
+        conditions, params = _book_filters(isbn_no, title, author, is_available)
+        if title is None and author is None:
+            # Every match scores 1, so the ranking is the order of the primary key.
+            if after is not None and after[0] > -1.0:
+                return []
+            if after is not None and after[0] == -1.0:
+                conditions, params = conditions + ["id > ?"], params + [after[1]]
+            return [(row, 1.0) for row in self._find(SELECT_BOOKS, conditions, params, limit, _book_row)]
+
+        score, score_params = "1.0", []
+        for column, query in (("normalized_title", title), ("normalized_author", author)):
+            if query is not None:
+                score += f" + text_score({column}, ?)"
+                score_params.append(query)
+        sql = f"SELECT * FROM ({SELECT_BOOKS.replace(' FROM', f', {score} AS score FROM')}{_where(conditions)})"
+        params = score_params + params
+        if after is not None:
+            sql += " WHERE score < ? OR (score = ? AND id > ?)"
+            params += [-after[0], -after[0], after[1]]
+        rows = self._fetchall(sql + " ORDER BY score DESC, id LIMIT ?", params + [limit])
+        return [(_book_row(row), row["score"]) for row in rows]
+
+    def count_books(self, isbn_no: Optional[str] = None, is_available: Optional[bool] = None) -> int:
+        conditions, params = _book_filters(isbn_no=isbn_no, is_available=is_available)
+        return self._fetchone("SELECT count(*) FROM books" + _where(conditions), params)[0]
+
+    def count_books_by_author(self) -> List[Tuple[str, int]]:
+        return [tuple(row) for row in self._fetchall(COUNT_BOOKS_BY_AUTHOR, ())]
+
+    def page_books(self, after: Optional[int] = None, before: Optional[int] = None, limit: int = 20) -> List[dict]:
+        return [_book_row(row) for row in self._fetchall(*_page_query(SELECT_BOOKS, after, before, limit))]
+
+    def save_member(self, row: dict, loans: List[dict] = ()) -> None:
+        if not loans:
+            self._write(INSERT_MEMBER, [row[column] for column in MEMBER_COLUMNS])
+            return
+        self._write_many([
+            (INSERT_MEMBER, [[row[column] for column in MEMBER_COLUMNS]]),
+            (INSERT_LOAN, [(row["book_id"], row["member_id"], row["borrowed_at"], row["due_at"]) for row in loans]),
+            (UPDATE_BOOK_AVAILABLE, [(False, loan["book_id"]) for loan in loans]),
+        ])
+
+    def delete_member(self, member_id: int) -> None:
+        self._write(DELETE_MEMBER, (member_id,))
+
+    def load_member(self, member_id: int) -> Optional[dict]:
+        row = self._fetchone(SELECT_MEMBERS + " WHERE id = ?", (member_id,))
+        return dict(row) if row is not None else None
+
+    def find_members(self, name: str, limit: Optional[int] = None) -> Iterator[dict]:
+        conditions, params = _text_filter("members_text", "normalized_name", name)
+        return self._find(SELECT_MEMBERS, conditions, params, limit, dict)
+
+    def page_members(self, after: Optional[int] = None, before: Optional[int] = None, limit: int = 20) -> List[dict]:
+        return [dict(row) for row in self._fetchall(*_page_query(SELECT_MEMBERS, after, before, limit))]
+
+    def save_loan(self, book_id: int, member_id: int, borrowed_at: float, due_at: float) -> None:
+        self._write(INSERT_LOAN, (book_id, member_id, borrowed_at, due_at))
+
+    def delete_loan(self, book_id: int) -> None:
+        self._write(DELETE_LOAN, (book_id,))
+
+    def save_loans(self, rows: List[dict]) -> None:
+        self._write_many([
+            (INSERT_LOAN, [(row["book_id"], row["member_id"], row["borrowed_at"], row["due_at"]) for row in rows]),
+            (UPDATE_BOOK_AVAILABLE, [(False, row["book_id"]) for row in rows]),
+        ])
+
+    def delete_loans(self, book_ids: List[int]) -> None:
+        self._write_many([
+            (DELETE_LOAN, [(book_id,) for book_id in book_ids]),
+            (UPDATE_BOOK_AVAILABLE, [(True, book_id) for book_id in book_ids]),
+        ])
+
+    def load_loans(self, member_id: int) -> List[dict]:
+        return [dict(row) for row in self._fetchall(SELECT_LOANS, (member_id,))]
+
+    def load_loan(self, book_id: int) -> Optional[dict]:
+        row = self._fetchone(SELECT_LOAN, (book_id,))
+        return dict(row) if row is not None else None
+
+    def load_due_loans(self, until: Optional[float] = None, limit: Optional[int] = None) -> List[dict]:
+        params = (float("inf") if until is None else until, -1 if limit is None else limit)
+        return [dict(row) for row in self._fetchall(SELECT_DUE_LOANS, params)]
+
+    def count_loans_by_member(self) -> List[Tuple[int, int]]:
+        return [tuple(row) for row in self._fetchall(COUNT_LOANS_BY_MEMBER, ())]
+
+    def flush(self) -> None:
+        with self._lock:
+            self._connection.commit()
+            self._pending = 0
+
+    def close(self) -> None:
+        with self._lock:
+            self.flush()
+            self._connection.close()
+
+    def _write(self, sql: str, params) -> None:
+        """
+        Run a write statement, committing once a batch is full.
+        """
+        with self._lock:
+            self._connection.execute(sql, params)
+            self._pending += 1
+            if self._pending >= self._batch_size:
+                self.flush()
+
+    def _write_many(self, statements: List[Tuple[str, list]]) -> None:
+        """
+        Run write statements over many rows all or nothing, committing once a batch is full.
+
+        The savepoint is nested in the current transaction, so releasing it does not commit.
+        """
+        with self._lock:
+            if not self._connection.in_transaction:
+                self._connection.execute("BEGIN")
+            self._connection.execute("SAVEPOINT write_many")
+            try:
+                for sql, rows in statements:
+                    self._connection.executemany(sql, rows)
+            except BaseException:
+                self._connection.execute("ROLLBACK TO write_many")
+                raise
+            finally:
+                self._connection.execute("RELEASE write_many")
+            self._pending += sum(len(rows) for _, rows in statements)
+            if self._pending >= self._batch_size:
+                self.flush()
+
+    def _find(
+        self, select: str, conditions: List[str], params: list, limit: Optional[int], convert: Callable
+    ) -> Iterator[dict]:
+        """
+        Read the rows matching the conditions by increasing id, at most ``limit`` if given.
+
+        Rows are fetched ``FIND_BATCH`` at a time, each batch resuming after the last id of the previous
+        one, so only the rows consumed are read and the lock is not held between batches.
+        """
+        last = None
+        while limit is None or limit > 0:
+            batch = FIND_BATCH if limit is None else min(FIND_BATCH, limit)
+            where, values = (conditions, params) if last is None else (conditions + ["id > ?"], params + [last])
+            rows = self._fetchall(select + _where(where) + " ORDER BY id LIMIT ?", values + [batch])
+            for row in rows:
+                yield convert(row)
+            if len(rows) < batch:
+                return
+            last = rows[-1]["id"]
+            if limit is not None:
+                limit -= batch
+
+    def _fetchone(self, sql: str, params) -> Optional[sqlite3.Row]:
+        """
+        Run a query and get its first row.
+        """
+        with self._lock:
+            return self._connection.execute(sql, params).fetchone()
+
+    def _fetchall(self, sql: str, params) -> List[sqlite3.Row]:
+        """
+        Run a query and get all its rows.
+        """
+        with self._lock:
+            return self._connection.execute(sql, params).fetchall()
+
+
+def _book_filters(
+    isbn_no: Optional[str] = None,
+    title: Optional[str] = None,
+    author: Optional[str] = None,
+    is_available: Optional[bool] = None,
+) -> Tuple[List[str], list]:
+    """
+    Get the conditions for the given book filters, with their parameters.
+    """
+    conditions: List[str] = []
+    params: list = []
+    if isbn_no is not None:
+        conditions.append("isbn_no = ?")
+        params.append(isbn_no)
+    for column, query in (("normalized_title", title), ("normalized_author", author)):
+        if query is not None:
+            text_conditions, text_params = _text_filter("books_text", column, query)
+            conditions += text_conditions
+            params += text_params
+    if is_available is not None:
+        conditions.append("is_available = ?")
+        params.append(is_available)
+    return conditions, params
+
+
+def _text_filter(table: str, column: str, query: str) -> Tuple[List[str], list]:
+    """
+    Get the conditions for a normalized column to contain a query.
+
+    A query of at least three characters is looked up as a phrase of trigrams in the column of the FTS5
+    table, and every query is checked with ``instr``, which is then only run on the rows found.
+    """
+    conditions, params = ["instr(" + column + ", ?) > 0"], [query]
+    if len(query) >= TRIGRAM_SIZE:
+        phrase = '"' + query.replace('"', '""') + '"'
+        conditions.insert(0, f"id IN (SELECT rowid FROM {table} WHERE {table} MATCH ?)")
+        params.insert(0, f"{column} : {phrase}")
+    return conditions, params
+
+
+def _where(conditions: List[str]) -> str:
+    return " WHERE " + " AND ".join(conditions) if conditions else ""
+
+
+def _page_query(sql: str, after: Optional[int], before: Optional[int], limit: int) -> Tuple[str, list]:
+    """
+    Make a query for a page of rows by id, walking the primary key backwards for ``before`` and putting the
+    rows back in increasing order.
+    """
+    if before is not None:
+        return f"SELECT * FROM ({sql} WHERE id < ? ORDER BY id DESC LIMIT ?) ORDER BY id", [before, limit]
+    if after is not None:
+        return sql + " WHERE id > ? ORDER BY id LIMIT ?", [after, limit]
+    return sql + " ORDER BY id LIMIT ?", [limit]
+
+
+def _book_row(row: Optional[sqlite3.Row]) -> Optional[dict]:
+    """
+    Convert a database row to a book dictionary.
+    """
+    if row is None:
+        return None
+
+    book = dict(row)
+    book["is_available"] = bool(book["is_available"])
+    return book
@@ -0,0 +1,97 @@
+import random
+from unittest import TestCase
+
+from autocomplete import Completions, PrefixIndex
+from library_manager import Book, Library, LibraryError, Members, _clean_query
+from views import ChangeFeed
+
+
+class TestAutocomplete(TestCase):
+    """
+    Tests for the prefix index and the completions of a library.
+    """
+
+    def setUp(self):
+        """
+        Set up a library with a few books and members, followed by completions.
+        """
+        self.library = Library()
+        self.library.add_books([
+            Book(1, "The Great Gatsby", "F. Scott Fitzgerald", "111"),
+            Book(2, "The Great Gatsby", "F. Scott Fitzgerald", "111"),
+            Book(3, "The Grapes of Wrath", "John Steinbeck", "222"),
+            Book(4, "Theory of Everything", "Stephen Hawking", "333"),
+            Book(5, "East of Eden", "John Steinbeck", "444"),
+        ])
+        self.members = [Members(1, "John Smith", "555-0100", []), Members(2, "Joan Smith", "555-0101", [])]
+        for member in self.members:
+            self.library.add_member(member)
+        self.completions = Completions()
+        self.feed = ChangeFeed()
+        self.feed.subscribe(self.completions)
+        self.feed.attach(self.library)
+
+    def test_prefix_index(self):
+        """
+        Test that completions match a scan of the keys through additions, removals and weight changes.
+        """
+        rng = random.Random(1234)
+        index = PrefixIndex(merge_size=8)
+        keys = ["".join(rng.choice("abc") for _ in range(rng.randint(1, 5))) for _ in range(200)]
+        weights = {}
+        for _ in range(5000):
+            key = rng.choice(keys)
+            choice = rng.random()
+            if choice < 0.5:
+                weights[key] = rng.randint(0, 5)
+                index.update(key, weights[key], key.upper())
+            elif choice < 0.7 and key in weights:
+                index.remove(key)
+                del weights[key]
+            else:
+                prefix, limit = key[:rng.randint(0, len(key))], rng.randint(1, 6)
+                expected = sorted((-weight, key) for key, weight in weights.items() if key.startswith(prefix))
+                completions = [(key.upper(), -weight) for weight, key in expected[:limit]]
+                self.assertEqual(index.complete(prefix, limit), completions)
+        self.assertEqual(len(index), len(weights))
+
+    def test_popularity(self):
+        """
+        Test that completions rank by copies and loans, and follow the library.
+        """
+        self.assertEqual(
+            self.completions.complete("title", "the gr"), [("The Great Gatsby", 2), ("The Grapes of Wrath", 1)]
+        )
+        titles = [text for text, _ in self.completions.complete("title", "The ")]
+        self.assertEqual(titles, ["The Great Gatsby", "The Grapes of Wrath"])
+        self.assertEqual(self.completions.complete("author", "j"), [("John Steinbeck", 2)])
+
+        for book_id in (3, 5):
+            self.library.lend_book(self.members[1], self.library.get_book(book_id))
+        self.library.return_book(self.members[1], self.library.get_book(3))
+        self.library.lend_book(self.members[0], self.library.get_book(3))
+        self.assertEqual(self.completions.complete("title", "the gr")[0], ("The Grapes of Wrath", 3))
+        self.assertEqual(self.completions.complete("name", "jo"), [("Joan Smith", 3), ("John Smith", 2)])
+        self.assertEqual(self.completions.suggest("author", "jOHN s"), "John Steinbeck")
+        self.assertIsNone(self.completions.suggest("author", "steinbeck"))
+
+        self.library.remove_book(self.library.get_book(4))
+        self.library.remove_book(self.library.get_book(1))
+        self.library.add_book(Book(6, "Theatre", "Jane Doe", "555"))
+        self.library.remove_member(self.members[1])
+        self.assertEqual(
+            self.completions.complete("title", "the", limit=2), [("The Grapes of Wrath", 3), ("The Great Gatsby", 1)]
+        )
+        self.assertEqual(self.completions.complete("title", "thea"), [("Theatre", 1)])
+        self.assertEqual(self.completions.complete("name", "jo"), [("John Smith", 2)])
+        with self.assertRaises(LibraryError):
+            self.completions.complete("isbn_no", "1")
+
+    def test_books_leave_query_cache(self):
+        """
+        Test that adding books completes their normalized fields without going through the query cache.
+        """
+        cached = _clean_query.cache_info().currsize
+        self.library.add_books([Book(i, f"Title {i}", f"Author {i}", str(i)) for i in range(10, 20)])
+        self.assertEqual(_clean_query.cache_info().currsize, cached)
+        self.assertEqual(self.completions.complete("author", "author 1", limit=1), [("Author 10", 1)])
@@ -0,0 +1,125 @@
+import csv
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+from faker import Faker
+
+from bulk_import import import_books
+from library_manager import Book, Library
+from storage import SQLiteStorage
+
+
+class TestBulkImport(TestCase):
+    """
+    Tests for importing catalog files.
+    """
+
+    def setUp(self):
+        """
+        Set up a library and a temporary directory for the catalog files.
+        """
+        self.directory = tempfile.TemporaryDirectory()
+        self.library = Library()
+        self.faker = Faker()
+        self.rows = [
+            dict(id=i, title=self.faker.sentence(), author=self.faker.name(), isbn_no=self.faker.isbn13())
+            for i in range(50)
+        ]
+
+    def tearDown(self):
+        """
+        Remove the catalog files.
+        """
+        self.directory.cleanup()
+
+    def write_csv(self, rows):
+        """
+        Write rows to a CSV catalog.
+        """
+        path = os.path.join(self.directory.name, "catalog.csv")
+        with open(path, "w", newline="", encoding="utf-8") as file:
+            writer = csv.DictWriter(file, fieldnames=["id", "title", "author", "isbn_no", "is_available"])
+            writer.writeheader()
+            writer.writerows(rows)
+        return path
+
+    def write_jsonl(self, lines):
+        """
+        Write lines to a JSON Lines catalog.
+        """
+        path = os.path.join(self.directory.name, "catalog.jsonl")
+        with open(path, "w", encoding="utf-8") as file:
+            file.write("\n".join(lines) + "\n")
+        return path
+
+    def test_import_csv(self):
+        """
+        Test importing a CSV catalog in chunks.
+        """
+        report = import_books(self.library, self.write_csv(self.rows), chunk_size=7, workers=0)
+
+        self.assertEqual((report.rows, report.imported, report.rejected), (50, 50, []))
+        self.assertEqual(self.library.get_book(3), Book(**self.rows[3]))
+        self.assertEqual(self.library.get_book(3).normalized_title, self.rows[3]["title"].lower())
+        self.assertIs(self.library.search_book({"title": self.rows[3]["title"]}), self.library.get_book(3))
+
+    def test_import_jsonl_in_worker_processes(self):
+        """
+        Test importing a JSON Lines catalog with a process pool.
+        """
+        lines = [json.dumps(row) for row in self.rows]
+        report = import_books(self.library, self.write_jsonl(lines), chunk_size=10, workers=2)
+
+        self.assertEqual(report.imported, 50)
+        self.assertEqual(len(self.library._books_by_id), 50)
+        self.assertGreater(report.rows_per_second, 0)
+
+    def test_rejected_rows(self):
+        """
+        Test that invalid and duplicate rows are reported without stopping the import.
+        """
+        self.library.add_book(Book(**self.rows[0]))
+        lines = [
+            json.dumps(self.rows[0]),
+            json.dumps(self.rows[1]),
+            json.dumps(dict(self.rows[2], isbn_no="12")),
+            "{not json",
+            json.dumps(dict(self.rows[3], id="three")),
+            json.dumps(self.rows[1]),
+            json.dumps(dict(self.rows[4], is_available="false")),
+        ]
+        report = import_books(self.library, self.write_jsonl(lines), workers=0)
+
+        self.assertEqual(report.imported, 2)
+        self.assertEqual([line_no for line_no, _ in report.rejected], [3, 4, 5, 1, 6])
+        self.assertFalse(self.library.get_book(4).is_available)
+
+    def test_rejected_rows_are_capped(self):
+        """
+        Test that only the first rejected rows are kept, and all of them are counted.
+        """
+        lines = [json.dumps(dict(row, isbn_no="12")) for row in self.rows[:30]] + [json.dumps(self.rows[30])]
+        report = import_books(self.library, self.write_jsonl(lines), chunk_size=7, workers=0, max_rejected=4)
+
+        self.assertEqual(report.imported, 1)
+        self.assertEqual(report.rejected_count, 30)
+        self.assertEqual([line_no for line_no, _ in report.rejected], [1, 2, 3, 4])
+
+    def test_duplicates_in_storage(self):
+        """
+        Test that ids already in the storage backend are rejected without loading those books.
+        """
+        path = os.path.join(self.directory.name, "library.db")
+        library = Library(SQLiteStorage(path))
+        library.add_books([Book(**row) for row in self.rows[:20]])
+        library.close()
+        library = Library(SQLiteStorage(path))
+
+        report = import_books(library, self.write_csv(self.rows[10:]), chunk_size=8, workers=0)
+
+        self.assertEqual((report.imported, report.rejected_count), (30, 10))
+        self.assertEqual(sorted(library._books_by_id), list(range(20, 50)))
+        self.assertEqual(library.count_available(), 50)
+        library.close()
@@ -0,0 +1,132 @@
+import os
+import random
+import tempfile
+from unittest import TestCase
+
+from faker import Faker
+
+from catalog_snapshot import SnapshotLibrary, write_snapshot
+from library_manager import Book, Library, LibraryError, Members
+from storage import SQLiteStorage
+
+
+class TestCatalogSnapshot(TestCase):
+    """
+    Tests for the memory-mapped catalog snapshot.
+    """
+
+    def setUp(self):
+        """
+        Set up a library with copies of fake books, lend some of them and snapshot it.
+        """
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "catalog.snap")
+        self.faker = Faker()
+        self.library = Library()
+        isbn_nos = [self.faker.isbn13() for _ in range(60)]
+        authors = [self.faker.name() for _ in range(20)]
+        self.books = [
+            Book(i * 3, self.faker.sentence(), random.choice(authors), random.choice(isbn_nos))
+            for i in range(200, 0, -1)
+        ]
+        self.library.add_books(self.books)
+        member = Members(1, self.faker.name(), self.faker.phone_number(), [])
+        self.library.add_member(member)
+        self.library.lend_many(member, self.books[::7])
+        write_snapshot(self.library, self.path)
+        self.snapshot = SnapshotLibrary(self.path)
+
+    def tearDown(self):
+        """
+        Unmap and remove the snapshot.
+        """
+        self.snapshot.close()
+        self.directory.cleanup()
+
+    def test_lookups(self):
+        """
+        Test that lookups by id and ISBN number give the books of the library.
+        """
+        self.assertEqual(len(self.snapshot), len(self.books))
+        self.assertEqual(self.snapshot.count_available(), self.library.count_available())
+        for book in self.books[:50]:
+            self.assertEqual(self.snapshot.get_book(book.id), book)
+            copies = sorted(self.library.get_books_by_isbn(book.isbn_no), key=lambda copy: copy.id)
+            self.assertEqual(self.snapshot.get_books_by_isbn(book.isbn_no), copies)
+            self.assertIn(self.snapshot.get_book_by_isbn(book.isbn_no), copies)
+            self.assertEqual(
+                self.snapshot.get_book_by_isbn(book.isbn_no).is_available, any(copy.is_available for copy in copies)
+            )
+            self.assertEqual(self.snapshot.count_available(book.isbn_no), self.library.count_available(book.isbn_no))
+        self.assertIsNone(self.snapshot.get_book(1))
+        self.assertEqual(self.snapshot.get_books_by_isbn("0"), [])
+
+    def test_searches(self):
+        """
+        Test that searches give the same results as the library.
+        """
+        for book in self.books[:40]:
+            for query in (
+                {"title": book.title.split()[0]},
+                {"title": book.title[2:8]},
+                {"author": book.author.split()[-1]},
+                {"author": book.author[:2]},
+                {"title": "zzzzzz"},
+            ):
+                self.assertEqual(self.snapshot.search_book(query), self.library.search_book(query), query)
+                self.assertEqual(
+                    list(self.snapshot.query_books(**query)), list(self.library.query_books(**query)), query
+                )
+
+        query = dict(author=self.books[0].author[:4], is_available=True, limit=5)
+        first = list(self.snapshot.query_books(**query))
+        self.assertEqual(first, list(self.library.query_books(**query)))
+        self.assertEqual(
+            list(self.snapshot.query_books(**query, after=first[-1])),
+            list(self.library.query_books(**query, after=first[-1])),
+        )
+
+    def test_paging(self):
+        """
+        Test paging through the snapshot by id.
+        """
+        self.assertEqual(self.snapshot.page_books(limit=5), self.library.page_books(limit=5))
+        self.assertEqual(self.snapshot.page_books(after=300, limit=5), self.library.page_books(after=300, limit=5))
+        self.assertEqual(self.snapshot.page_books(before=9), self.library.page_books(before=9))
+
+    def test_read_only(self):
+        """
+        Test that the snapshot cannot be changed.
+        """
+        with self.assertRaises(Exception):
+            self.snapshot.add_book(Book(1, "Title", "Author", "123"))
+        with self.assertRaises(Exception):
+            self.snapshot.remove_book(self.books[0])
+
+    def test_not_a_snapshot(self):
+        """
+        Test that a file that is not a snapshot is refused.
+        """
+        path = os.path.join(self.directory.name, "other.snap")
+        with open(path, "wb") as file:
+            file.write(bytes(os.path.getsize(self.path)))
+
+        with self.assertRaises(LibraryError):
+            SnapshotLibrary(path)
+
+    def test_from_storage(self):
+        """
+        Test snapshotting a library stored in SQLite without loading it.
+        """
+        library = Library(SQLiteStorage(os.path.join(self.directory.name, "library.db")))
+        library.add_books([Book(book.id, book.title, book.author, book.isbn_no) for book in self.books])
+        library.close()
+        library = Library(SQLiteStorage(os.path.join(self.directory.name, "library.db")))
+        path = os.path.join(self.directory.name, "stored.snap")
+
+        self.assertEqual(write_snapshot(library, path), len(self.books))
+        self.assertEqual(library._books_by_id, {})
+        snapshot = SnapshotLibrary(path)
+        self.assertEqual(snapshot.get_book(self.books[0].id).title, self.books[0].title)
+        snapshot.close()
+        library.close()
@@ -0,0 +1,65 @@
+from unittest import TestCase
+
+from faker import Faker
+
+from compact_catalog import CompactCatalog
+from library_manager import Book, LibraryError
+
+
+class TestCompactCatalog(TestCase):
+    """
+    Tests for the columnar catalog.
+    """
+
+    def setUp(self):
+        """
+        Set up a catalog with a few books.
+        """
+        self.faker = Faker()
+        self.books = [
+            Book(book_id, self.faker.sentence(), self.faker.name(), self.faker.isbn13())
+            for book_id in (5, 1, 9, 3)
+        ]
+        self.catalog = CompactCatalog(self.books)
+
+    def test_get(self):
+        """
+        Test that views read back the fields of the books.
+        """
+        for book in self.books:
+            self.assertEqual(self.catalog.get(book.id), book)
+        self.assertIsNone(self.catalog.get(2))
+        self.assertEqual([view.id for view in self.catalog], [1, 3, 5, 9])
+
+    def test_remove(self):
+        """
+        Test that removing a book keeps the views of the other books valid.
+        """
+        view = self.catalog.get(9)
+        self.catalog.remove(5)
+        self.catalog.compact()
+
+        self.assertEqual(len(self.catalog), 3)
+        self.assertNotIn(5, self.catalog)
+        self.assertEqual(view, self.books[2])
+        with self.assertRaises(LibraryError):
+            self.catalog.remove(5)
+
+    def test_availability(self):
+        """
+        Test updating availability through a view.
+        """
+        self.catalog.get(3).is_available = False
+
+        self.assertFalse(self.catalog.get(3).is_available)
+        self.assertEqual(self.catalog.count_available(), 3)
+
+    def test_shared_strings(self):
+        """
+        Test that authors and ISBN numbers shared by several books are stored once.
+        """
+        self.catalog.add(10, "Another Copy", self.books[0].author, self.books[0].isbn_no)
+
+        self.assertEqual(len(self.catalog._authors), 4)
+        self.assertEqual(len(self.catalog._isbn_nos), 4)
+        self.assertIs(self.catalog.get(10).author, self.catalog.get(5).author)
@@ -0,0 +1,243 @@
+import os
+import random
+import sys
+import tempfile
+import threading
+from unittest import TestCase
+
+from faker import Faker
+
+from library_manager import Book, Library, LibraryError, Members
+from storage import SQLiteStorage
+
+THREADS = 16
+# Searcher threads stop after this many rounds even if the churn is not done, so they cannot starve it.
+SEARCHES = 50
+
+
+class TestConcurrentLibrary(TestCase):
+    """
+    Stress tests for a library shared by threads.
+    """
+
+    def setUp(self):
+        """
+        Set up a library with books and one member per thread, switching threads as often as possible.
+        """
+        self.switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        self.faker = Faker()
+        self.library = Library()
+        self.books = [Book(i, self.faker.sentence(), self.faker.name(), self.faker.isbn13()) for i in range(200)]
+        self.members = [Members(i, self.faker.name(), self.faker.phone_number(), []) for i in range(THREADS)]
+        self.library.add_books(self.books)
+        for member in self.members:
+            self.library.add_member(member)
+
+    def tearDown(self):
+        """
+        Restore the thread switch interval.
+        """
+        sys.setswitchinterval(self.switch_interval)
+
+    def run_threads(self, target, count=THREADS):
+        """
+        Run a function in several threads at once and collect what they raise.
+        """
+        errors = []
+        barrier = threading.Barrier(count)
+
+        def run(index):
+            barrier.wait()
+            try:
+                target(index)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def assertConsistent(self):
+        """
+        Assert that the loans, the availability bitmap and the counts agree.
+        """
+        lent = {loan.book.id for loan in self.library._ledger}
+        self.assertEqual(sum(len(member.books_borrowed) for member in self.members), len(lent))
+        self.assertEqual(self.library.count_available(), len(self.books) - len(lent))
+        for book in self.books:
+            self.assertEqual(book.is_available, book.id not in lent)
+            self.assertEqual(self.library._is_book_available(book), book.id not in lent)
+
+    def test_every_book_is_lent_once(self):
+        """
+        Test that threads racing to lend the same books lend each of them exactly once.
+        """
+        lent = [[] for _ in self.members]
+
+        def lend_everything(index):
+            for book in random.sample(self.books, len(self.books)):
+                try:
+                    self.library.lend_book(self.members[index], book)
+                    lent[index].append(book.id)
+                except Exception as e:
+                    if str(e) != "Book not available.":
+                        raise
+
+        self.run_threads(lend_everything)
+
+        self.assertEqual(sorted(sum(lent, [])), [book.id for book in self.books])
+        self.assertEqual(self.library.count_available(), 0)
+        self.assertConsistent()
+
+    def test_churn_with_searches(self):
+        """
+        Test lending and returning from many threads while other threads search.
+        """
+        done = threading.Event()
+
+        def churn(index):
+            member = self.members[index]
+            rng = random.Random(index)
+            for _ in range(300):
+                book = rng.choice(self.books)
+                try:
+                    if book in member.books_borrowed:
+                        self.library.return_book(member, book)
+                    else:
+                        self.library.lend_book(member, book)
+                except Exception as e:
+                    if str(e) not in ("Book not available.", "Book not borrowed."):
+                        raise
+
+        def churn_or_search(index):
+            if index % 2:
+                churn(index)
+                with lock:
+                    churners[0] -= 1
+                    if not churners[0]:
+                        done.set()
+                return
+            for _ in range(SEARCHES):
+                if done.is_set():
+                    break
+                list(self.library.query_books(title=self.books[index].title[:5], is_available=True))
+                list(self.library.query_books(is_available=True, limit=5))
+                self.library.search_book({"author": self.books[index].author})
+                self.library.overdue()
+
+        lock = threading.Lock()
+        churners = [THREADS // 2]
+        self.run_threads(churn_or_search)
+
+        self.assertConsistent()
+
+    def test_batches_are_all_or_nothing(self):
+        """
+        Test that batches racing for overlapping books are each lent or returned whole.
+        """
+        lent = [[] for _ in self.members]
+
+        def lend_and_return(index):
+            member = self.members[index]
+            rng = random.Random(index)
+            for _ in range(100):
+                if lent[index] and rng.random() < 0.5:
+                    batch = lent[index][: rng.randint(1, len(lent[index]))]
+                    self.library.return_many([self.library.get_book(book_id) for book_id in batch], member)
+                    del lent[index][: len(batch)]
+                    continue
+                batch = rng.sample([book for book in self.books if book.id not in lent[index]], 5)
+                try:
+                    self.library.lend_many(member, batch)
+                    lent[index].extend(book.id for book in batch)
+                except LibraryError as e:
+                    if str(e) != "Book not available.":
+                        raise
+                    loans = self.library.get_loans(member.id)
+                    self.assertEqual(sorted(loan.book.id for loan in loans), sorted(lent[index]))
+
+        self.run_threads(lend_and_return)
+
+        for member, book_ids in zip(self.members, lent):
+            self.assertEqual(sorted(loan.book.id for loan in self.library.get_loans(member.id)), sorted(book_ids))
+        self.assertConsistent()
+
+    def test_catalog_changes_with_paging(self):
+        """
+        Test that pages stay sorted and complete while threads add and remove books.
+        """
+        done = threading.Event()
+        kept = {book.id for book in self.books if book.id % 2 == 0}
+
+        def change(index):
+            for round in range(20):
+                book_id = 1000 + index * 100 + round
+                self.library.add_book(Book(book_id, self.faker.sentence(), self.faker.name(), self.faker.isbn13()))
+                self.library.remove_book(self.library.get_book(book_id))
+            for book in self.books[index::THREADS // 2]:
+                if book.id % 2:
+                    self.library.remove_book(book)
+
+        def change_or_page(index):
+            if index % 2:
+                try:
+                    change(index // 2)
+                finally:
+                    with lock:
+                        changers[0] -= 1
+                        if not changers[0]:
+                            done.set()
+                return
+            for _ in range(SEARCHES):
+                if done.is_set():
+                    break
+                ids, after = [], None
+                while True:
+                    page = self.library.page_books(after=after, limit=17)
+                    if not page:
+                        break
+                    ids.extend(book.id for book in page)
+                    after = page[-1].id
+                self.assertEqual(ids, sorted(set(ids)))
+                self.assertTrue(kept <= set(ids))
+
+        lock = threading.Lock()
+        changers = [THREADS // 2]
+        self.run_threads(change_or_page)
+
+        self.assertEqual([book.id for book in self.library.page_books(limit=len(self.books))], sorted(kept))
+        self.assertEqual(self.library.count_available(), len(kept))
+
+    def test_concurrent_loads(self):
+        """
+        Test that records loaded from storage by several threads at once are loaded once.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "library.db")
+            library = Library(SQLiteStorage(path))
+            library.add_books(self.books)
+            for member in self.members:
+                library.add_member(Members(member.id, member.name, member.phone, []))
+            library.lend_book(library.get_member(0), self.books[0])
+            library.close()
+
+            library = Library(SQLiteStorage(path))
+            loaded = [[] for _ in range(THREADS)]
+
+            def load(index):
+                for member in self.members:
+                    loaded[index].append(library.get_member(member.id))
+                    loaded[index].append(library.get_book(member.id))
+
+            self.run_threads(load)
+            library.close()
+
+        for records in loaded[1:]:
+            self.assertTrue(all(a is b for a, b in zip(records, loaded[0])))
+        self.assertEqual(len(library._members_by_id), THREADS)
+        self.assertEqual(len(library._books_by_id), THREADS)
+        self.assertEqual(len(library._ledger), 1)
@@ -0,0 +1,183 @@
+import random
+from unittest import TestCase
+
+from faker import Faker
+
+from federation import FederatedLibrary, HashRing
+from library_manager import Book, Library, LibraryError, Members
+
+
+class TestFederation(TestCase):
+    """
+    Tests for the sharded library, against a single library holding the same records.
+    """
+
+    def setUp(self):
+        """
+        Set up a federation of three shards and a library with the same books and members.
+        """
+        self.faker = Faker()
+        self.federation = FederatedLibrary(shards=3)
+        self.library = Library()
+        isbn_nos = [self.faker.isbn13() for _ in range(40)]
+        authors = [self.faker.name() for _ in range(15)]
+        self.books = [
+            Book(i, self.faker.sentence(), random.choice(authors), random.choice(isbn_nos)) for i in range(150)
+        ]
+        self.members = [Members(i, self.faker.name(), self.faker.phone_number(), []) for i in range(30)]
+        for target in (self.federation, self.library):
+            target.add_books([Book(book.id, book.title, book.author, book.isbn_no) for book in self.books])
+            for member in self.members:
+                target.add_member(Members(member.id, member.name, member.phone, []))
+
+    def tearDown(self):
+        """
+        Stop the shards.
+        """
+        self.federation.close()
+
+    def test_hash_ring(self):
+        """
+        Test that keys spread over the nodes and that a new node only takes keys from the others.
+        """
+        ring = HashRing(range(4))
+        before = {key: ring.node_of(key) for key in range(4000)}
+        self.assertTrue(all(800 < list(before.values()).count(node) < 1200 for node in range(4)))
+
+        ring.add(4)
+        after = {key: ring.node_of(key) for key in range(4000)}
+        moved = [key for key in before if before[key] != after[key]]
+        self.assertTrue(all(after[key] == 4 for key in moved))
+        self.assertLess(len(moved), 1200)
+
+        ring.remove(4)
+        self.assertEqual({key: ring.node_of(key) for key in range(4000)}, before)
+
+        with self.assertRaises(LibraryError):
+            HashRing([]).node_of(0)
+
+    def test_lookups(self):
+        """
+        Test that lookups and pages give the records of the library.
+        """
+        for book in self.books[:30]:
+            self.assertEqual(self.federation.get_book(book.id), self.library.get_book(book.id))
+            copies = sorted(self.library.get_books_by_isbn(book.isbn_no), key=lambda copy: copy.id)
+            self.assertEqual(self.federation.get_books_by_isbn(book.isbn_no), copies)
+            self.assertEqual(self.federation.count_available(book.isbn_no), self.library.count_available(book.isbn_no))
+        self.assertIsNone(self.federation.get_book(1000))
+        self.assertEqual(self.federation.count_available(), len(self.books))
+
+        self.assertEqual(self.federation.page_books(limit=7), self.library.page_books(limit=7))
+        self.assertEqual(self.federation.page_books(after=70, limit=9), self.library.page_books(after=70, limit=9))
+        self.assertEqual(self.federation.page_books(before=12), self.library.page_books(before=12))
+        self.assertEqual(self.federation.page_members(after=5, limit=6), self.library.page_members(after=5, limit=6))
+
+    def test_searches(self):
+        """
+        Test that searches scattered to the shards give the results of the library.
+        """
+        for book in self.books[:20]:
+            for query in (
+                {"title": book.title.split()[0]},
+                {"author": book.author.split()[-1]},
+                {"author": book.author[:2], "is_available": True},
+                {"isbn_no": book.isbn_no},
+                {"id": book.id},
+            ):
+                self.assertEqual(self.federation.search_book(query), self.library.search_book(query), query)
+                self.assertEqual(
+                    list(self.federation.query_books(**query)), list(self.library.query_books(**query)), query
+                )
+
+        query = dict(title="e", limit=4, offset=3)
+        first = list(self.federation.query_books(**query))
+        self.assertEqual(first, list(self.library.query_books(**query)))
+        self.assertEqual(
+            list(self.federation.query_books(**query, after=first[-1])),
+            list(self.library.query_books(**query, after=first[-1])),
+        )
+        member = self.members[3]
+        self.assertEqual(self.federation.search_member({"name": member.name}).id, member.id)
+        for book in self.books[:5]:
+            query = {"title": book.title[:-1] + "x"}
+            self.assertEqual(
+                self.federation.search_book(query, fuzzy=True), self.library.search_book(query, fuzzy=True)
+            )
+
+    def test_cross_shard_lend(self):
+        """
+        Test lending a member books from every shard and returning them.
+        """
+        member = self.members[0]
+        books = self.books[:12]
+        for book in books:
+            self.federation.lend_book(member, book)
+
+        self.assertEqual({book.id for book in self.federation.get_member(member.id).books_borrowed}, set(range(12)))
+        self.assertEqual([loan.book.id for loan in self.federation.get_loans(member.id)], [book.id for book in books])
+        self.assertFalse(self.federation.get_book(books[5].id).is_available)
+        self.assertEqual(self.federation.get_loan(books[5].id).member_id, member.id)
+        self.assertEqual([m.id for m in self.federation.page_members(limit=5)], list(range(5)))
+        self.assertEqual([m.id for m in self.federation.page_members(before=30, limit=100)], list(range(30)))
+        self.assertEqual(len(self.federation.page_members(limit=1)[0].books_borrowed), len(books))
+        with self.assertRaises(Exception):
+            self.federation.lend_book(self.members[1], books[5])
+
+        for book in books:
+            self.federation.return_book(member, book)
+        self.assertEqual(self.federation.get_member(member.id).books_borrowed, [])
+        self.assertEqual(self.federation.count_available(), len(self.books))
+        self.assertEqual(self.federation._guests, {})
+
+    def test_lend_many(self):
+        """
+        Test that a batch across shards is lent all or nothing, and returned in one go.
+        """
+        self.federation.lend_book(self.members[1], self.books[40])
+        with self.assertRaises(Exception):
+            self.federation.lend_many(self.members[0], self.books[30:41])
+        self.assertEqual(self.federation.count_available(), len(self.books) - 1)
+        self.assertEqual(self.federation.get_loans(self.members[0].id), [])
+
+        loans = self.federation.lend_many(self.members[0], self.books[30:40])
+        self.assertEqual([loan.book.id for loan in loans], list(range(30, 40)))
+        self.assertEqual(len({loan.due_at for loan in loans}), 1)
+        self.assertEqual(len(self.federation.get_member(self.members[0].id).books_borrowed), 10)
+
+        with self.assertRaises(Exception):
+            self.federation.return_many(self.books[30:41], self.members[0])
+        self.assertEqual(self.federation.count_available(), len(self.books) - 11)
+
+        self.federation.return_many(self.books[30:41])
+        self.assertEqual(self.federation.count_available(), len(self.books))
+        self.assertEqual(self.federation._guests, {})
+
+    def test_remove_member(self):
+        """
+        Test that removing a member removes their guests, and that unknown members cannot borrow.
+        """
+        member = self.members[2]
+        self.federation.lend_many(member, self.books[:6])
+        self.federation.remove_member(member)
+        self.assertIsNone(self.federation.get_member(member.id))
+        self.assertIsNone(self.federation.search_member({"name": member.name}))
+        self.assertNotIn(member.id, [m.id for m in self.federation.page_members(limit=100)])
+        self.assertEqual(self.federation.count_available(), len(self.books) - 6)
+        with self.assertRaises(Exception):
+            self.federation.lend_book(member, self.books[10])
+
+    def test_spawned_shards(self):
+        """
+        Test that shards started with spawn instead of fork give the same records.
+        """
+        federation = FederatedLibrary(shards=2, start_method="spawn")
+        try:
+            federation.add_books([Book(book.id, book.title, book.author, book.isbn_no) for book in self.books[:20]])
+            federation.add_member(Members(1, self.faker.name(), self.faker.phone_number(), []))
+            for book in self.books[:20]:
+                self.assertEqual(federation.get_book(book.id), book)
+            self.assertEqual(federation.page_books(limit=20), self.books[:20])
+            self.assertEqual(federation.search_book({"title": self.books[4].title}).id, self.books[4].id)
+        finally:
+            federation.close()
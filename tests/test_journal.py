@@ -0,0 +1,187 @@
+import os
+import tempfile
+import time
+from unittest import TestCase
+
+from faker import Faker
+
+from journal import Journal, read_journal, recover
+from library_manager import Book, Library, LibraryError, Members
+
+
+class TestJournal(TestCase):
+    """
+    Tests for the journal and crash recovery.
+    """
+
+    def setUp(self):
+        """
+        Set up a journaled library in a temporary directory.
+        """
+        self.directory = tempfile.TemporaryDirectory()
+        self.library = Library()
+        self.journal = Journal(self.directory.name, group_size=4, snapshot_every=0)
+        self.journal.attach(self.library)
+        self.faker = Faker()
+
+    def tearDown(self):
+        """
+        Remove the journal.
+        """
+        self.directory.cleanup()
+
+    def populate(self, count):
+        """
+        Add books and members and lend every other book.
+        """
+        for i in range(count):
+            book = Book(i, self.faker.sentence(), self.faker.name(), self.faker.isbn13())
+            member = Members(i, self.faker.name(), self.faker.phone_number(), [])
+            self.library.add_book(book)
+            self.library.add_member(member)
+            if i % 2:
+                self.library.lend_book(member, book)
+
+    def assertRecovered(self, library):
+        """
+        Assert that a recovered library matches the journaled one.
+        """
+        self.assertEqual(library._books_by_id, self.library._books_by_id)
+        self.assertEqual(library._members_by_id, self.library._members_by_id)
+        self.assertEqual(list(library._ledger), list(self.library._ledger))
+
+    def test_recover_from_journal(self):
+        """
+        Test replaying the whole journal.
+        """
+        self.populate(10)
+        self.library.return_book(self.library.get_member(1), self.library.get_book(1))
+        self.library.remove_member(self.library.get_member(0))
+        self.journal.close()
+
+        library, journal = recover(self.directory.name)
+        journal.close()
+
+        self.assertRecovered(library)
+        self.assertEqual(journal.seq, 27)
+
+    def test_recover_from_snapshot(self):
+        """
+        Test that only the journal after the latest snapshot is replayed.
+        """
+        self.populate(10)
+        self.journal.snapshot(self.library)
+        self.library.remove_book(self.library.get_book(0))
+        self.journal.close()
+
+        self.assertEqual([operation for _, operation, _ in read_journal(self.directory.name)], ["remove_book"])
+
+        library, journal = recover(self.directory.name)
+        journal.close()
+
+        self.assertRecovered(library)
+
+    def test_recover_loans_of_removed_members(self):
+        """
+        Test that the loans a removed member still has are recovered from a snapshot.
+        """
+        self.populate(4)
+        self.library.remove_member(self.library.get_member(3))
+        self.journal.snapshot(self.library)
+        self.journal.close()
+
+        library, journal = recover(self.directory.name)
+        journal.close()
+
+        self.assertRecovered(library)
+        self.assertEqual(library.get_loan(3).member_id, 3)
+        self.assertFalse(library.get_book(3).is_available)
+
+    def test_replay_returns_of_removed_members(self):
+        """
+        Test that the journal replays the return of a book lent to a member removed since.
+        """
+        self.populate(4)
+        self.library.remove_member(self.library.get_member(3))
+        self.library.return_many([self.library.get_book(3)])
+        self.journal.close()
+
+        library, journal = recover(self.directory.name)
+        journal.close()
+
+        self.assertRecovered(library)
+        self.assertIsNone(library.get_loan(3))
+        self.assertTrue(library.get_book(3).is_available)
+
+    def test_replay_keeps_loan_dates(self):
+        """
+        Test that the books a member is added with keep their loan dates through replaying the journal,
+        and that returning a book lent to someone else is refused.
+        """
+        books = [Book(i, self.faker.sentence(), self.faker.name(), self.faker.isbn13()) for i in range(2)]
+        self.library.add_books(books)
+        self.library.add_member(Members(1, self.faker.name(), self.faker.phone_number(), books))
+        self.library.add_member(Members(2, self.faker.name(), self.faker.phone_number(), []))
+        self.journal.close()
+        with self.assertRaises(LibraryError):
+            self.library.apply("return_book", {"member_id": 2, "book_id": 0})
+
+        library, journal = recover(self.directory.name)
+        journal.close()
+
+        self.assertRecovered(library)
+        self.assertEqual(library.get_loan(1).borrowed_at, self.library.get_loan(1).borrowed_at)
+
+    def test_periodic_snapshots(self):
+        """
+        Test that snapshots, taken in the background once due, replace the journal they cover.
+        """
+        self.journal.close()
+        self.journal = Journal(self.directory.name, group_size=4, snapshot_every=8)
+        self.journal.attach(self.library)
+        self.populate(5)
+        self.journal.close()
+
+        snapshots = [name for name in os.listdir(self.directory.name) if name.startswith("snapshot-")]
+        self.assertEqual(len(snapshots), 1)
+        self.assertGreaterEqual(int(snapshots[0][9:21]), 8)
+        segments = [name for name in os.listdir(self.directory.name) if name.startswith("journal-")]
+        self.assertTrue(all(name[8:20] > snapshots[0][9:21] for name in segments))
+
+        library, journal = recover(self.directory.name)
+        journal.close()
+
+        self.assertRecovered(library)
+
+    def test_idle_group_is_committed(self):
+        """
+        Test that a group is committed once its delay passes, without another entry arriving.
+        """
+        self.journal.close()
+        self.journal = Journal(self.directory.name, group_size=100, group_delay=0.2, snapshot_every=0)
+        self.journal.attach(self.library)
+        self.populate(1)
+        self.assertEqual(list(read_journal(self.directory.name)), [])
+
+        deadline = time.monotonic() + 5
+        while not list(read_journal(self.directory.name)) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        operations = [operation for _, operation, _ in read_journal(self.directory.name)]
+        self.assertEqual(operations, ["add_book", "add_member"])
+        self.journal.close()
+        self.assertFalse(self.journal._worker.is_alive())
+
+    def test_recover_ignores_truncated_entry(self):
+        """
+        Test that a partially written entry left by a crash is ignored.
+        """
+        self.populate(2)
+        self.journal.close()
+        with open(self.journal._segment_path(1), "a", encoding="utf-8") as file:
+            file.write('{"seq": 6, "op": "remove_bo')
+
+        library, journal = recover(self.directory.name)
+        journal.close()
+
+        self.assertRecovered(library)
+        self.assertEqual(journal.seq, 5)
@@ -2,7 +2,7 @@ from unittest import TestCase
 
 from faker import Faker
 
-from ..library_manager import Book, Library, Members
+from library_manager import Book, Library, LibraryError, Members
 
 
 class TestLibrary(TestCase):
@@ -26,7 +26,7 @@ class TestLibrary(TestCase):
         self.fake_member = dict(
             id=self.faker.random_int(),
             name=self.faker.name(),
-            member_id=self.faker.random_int(),
+            phone=self.faker.phone_number(),
             books_borrowed=[],
         )
 
@@ -43,7 +43,7 @@ class TestLibrary(TestCase):
         book = Book(**self.fake_book)
         self.library.add_book(book)
 
-        self.assertIn(book, self.library._books)
+        self.assertIn(book, self.library._books_by_id.values())
 
     def test_remove_book(self):
         """
@@ -53,7 +53,7 @@ class TestLibrary(TestCase):
         self.library.add_book(book)
         self.library.remove_book(book)
 
-        self.assertNotIn(book, self.library._books)
+        self.assertNotIn(book, self.library._books_by_id.values())
 
     def test_add_member(self):
         """
@@ -62,7 +62,7 @@ class TestLibrary(TestCase):
         member = Members(**self.fake_member)
         self.library.add_member(member)
 
-        self.assertIn(member, self.library._members)
+        self.assertIn(member, self.library._members_by_id.values())
 
     def test_remove_member(self):
         """
@@ -72,7 +72,7 @@ class TestLibrary(TestCase):
         self.library.add_member(member)
         self.library.remove_member(member)
 
-        self.assertNotIn(member, self.library._members)
+        self.assertNotIn(member, self.library._members_by_id.values())
 
     def test_lend_book(self):
         """
@@ -126,3 +126,452 @@ class TestLibrary(TestCase):
 
         with self.assertRaises(Exception):
             self.library.return_book(member, book)
+
+    def _make_member(self, **kwargs):
+        """
+        Make a member with the fields the library manager expects.
+        """
+        member_info = dict(
+            id=self.faker.unique.random_int(),
+            name=self.faker.name(),
+            phone=self.faker.phone_number(),
+            books_borrowed=[],
+        )
+        member_info.update(kwargs)
+        return Members(**member_info)
+
+    def test_get_book(self):
+        """
+        Test looking up a book by id and ISBN number.
+        """
+        book = Book(**self.fake_book)
+        self.library.add_book(book)
+
+        self.assertIs(self.library.get_book(book.id), book)
+        self.assertIs(self.library.get_book_by_isbn(book.isbn_no), book)
+
+        self.library.remove_book(book)
+        self.assertIsNone(self.library.get_book(book.id))
+        self.assertIsNone(self.library.get_book_by_isbn(book.isbn_no))
+
+    def test_get_book_by_isbn_prefers_available_copy(self):
+        """
+        Test that an ISBN lookup returns an available copy when there is one.
+        """
+        member = self._make_member()
+        first = Book(**self.fake_book)
+        second = Book(**dict(self.fake_book, id=first.id + 1))
+        self.library.add_member(member)
+        self.library.add_book(first)
+        self.library.add_book(second)
+        self.library.lend_book(member, first)
+
+        self.assertIs(self.library.get_book_by_isbn(first.isbn_no), second)
+        self.assertEqual(self.library.get_books_by_isbn(first.isbn_no), [first, second])
+
+    def test_get_member(self):
+        """
+        Test looking up a member by id.
+        """
+        member = self._make_member()
+        self.library.add_member(member)
+
+        self.assertIs(self.library.get_member(member.id), member)
+        self.assertTrue(self.library._is_valid_member(member.id))
+
+        self.library.remove_member(member)
+        self.assertIsNone(self.library.get_member(member.id))
+        self.assertFalse(self.library._is_valid_member(member.id))
+
+    def test_add_book_fail_duplicate_id(self):
+        """
+        Test adding a book whose id is already in the library.
+        """
+        book = Book(**self.fake_book)
+        self.library.add_book(book)
+
+        with self.assertRaises(LibraryError):
+            self.library.add_book(Book(**self.fake_book))
+        self.assertEqual(len(self.library._books_by_id), 1)
+        with self.assertRaises(ValueError):
+            self.library.remove_book(Book(-1, "", "", ""))
+
+    def test_search_book_by_title_and_author(self):
+        """
+        Test searching a book by part of its title or author.
+        """
+        book = Book(**dict(self.fake_book, title="The Old Man and the Sea", author="Ernest Hemingway"))
+        other = Book(**dict(self.fake_book, id=book.id + 1, title="Moby-Dick", author="Herman Melville"))
+        self.library.add_book(book)
+        self.library.add_book(other)
+
+        self.assertIs(self.library.search_book({"title": "man and"}), book)
+        self.assertIs(self.library.search_book({"author": "MELVILLE"}), other)
+        self.assertIs(self.library.search_book({"author": "he"}), book)
+
+        self.library.remove_book(book)
+        self.assertIsNone(self.library.search_book({"title": "old man"}))
+
+    def test_search_book_lowest_id(self):
+        """
+        Test that a search finds the match with the lowest id, whether the index narrows it down or not,
+        and that a scan stops at the first match.
+        """
+        books = [Book(**dict(self.fake_book, id=i, title=f"Title-{i % 3}", author="A. B.")) for i in range(30, 0, -1)]
+        self.library.add_books(books)
+        self.library.remove_book(self.library.get_book(1))
+
+        self.assertEqual(self.library.search_book({"title": "-1"}).id, 4)
+        snapshot = self.library.metrics_snapshot()
+        self.assertEqual(snapshot["counters"]["index.scans"], 1)
+        self.assertLessEqual(snapshot["values"]["records_scanned.search_book"]["max"], 4)
+        self.assertEqual(self.library.search_book({"title": "title-1"}).id, 4)
+
+    def test_search_member_by_name(self):
+        """
+        Test searching a member by part of their name.
+        """
+        member = self._make_member(name="Zoë Kravitz")
+        self.library.add_member(member)
+
+        self.assertIs(self.library.search_member({"name": "zoe"}), member)
+
+        self.library.remove_member(member)
+        self.assertIsNone(self.library.search_member({"name": "zoe"}))
+
+    def test_search_fuzzy(self):
+        """
+        Test searching books and members with misspelled authors, titles and names.
+        """
+        book = Book(**dict(self.fake_book, title="The Old Man and the Sea", author="Ernest Hemingway"))
+        other = Book(**dict(self.fake_book, id=book.id + 1, title="Moby-Dick", author="Herman Melville"))
+        self.library.add_book(book)
+        self.library.add_book(other)
+        member = self._make_member(name="Jonathan Smith")
+        self.library.add_member(member)
+
+        self.assertIsNone(self.library.search_book({"author": "hemmingway"}))
+        self.assertIs(self.library.search_book({"author": "hemmingway"}, fuzzy=True), book)
+        self.assertIs(self.library.search_book({"title": "mobby dcik"}, fuzzy=True), other)
+        self.assertIs(self.library.search_member({"name": "jonathon smtih"}, fuzzy=True), member)
+        self.assertIsNone(self.library.search_member({"name": "jane doe"}, fuzzy=True))
+
+        self.library.remove_book(book)
+        self.assertIsNone(self.library.search_book({"author": "hemmingway"}, fuzzy=True))
+
+    def test_normalized_fields(self):
+        """
+        Test that records are normalized once when they are added.
+        """
+        book = Book(**dict(self.fake_book, title="Les Misérables", author="Victor Hugo"))
+        member = self._make_member(name="José Saramago")
+        self.library.add_book(book)
+        self.library.add_member(member)
+
+        self.assertEqual(book.normalized_title, "les miserables")
+        self.assertEqual(book.normalized_author, "victor hugo")
+        self.assertEqual(member.normalized_name, "jose saramago")
+        self.assertEqual(book, Book(**dict(self.fake_book, title="Les Misérables", author="Victor Hugo")))
+
+    def test_query_cache(self):
+        """
+        Test that repeated search queries are cleaned only once.
+        """
+        book = Book(**dict(self.fake_book, title="Les Misérables"))
+        self.library.add_book(book)
+        query = self.faker.uuid4() + " misérables"
+        before = self.library.query_cache_info()
+
+        self.library.search_book({"title": query})
+        self.library.search_book({"title": query})
+        after = self.library.query_cache_info()
+
+        self.assertEqual(after.misses - before.misses, 1)
+        self.assertEqual(after.hits - before.hits, 1)
+
+    def test_query_books_ranking(self):
+        """
+        Test that query results are ordered by score, then by id.
+        """
+        titles = ["Dune", "Dune Messiah", "Children of Dune", "Dunes of the Sahara", "Emma"]
+        books = [Book(**dict(self.fake_book, id=i, title=title)) for i, title in enumerate(titles)]
+        for book in books:
+            self.library.add_book(book)
+
+        results = list(self.library.query_books(title="dune"))
+
+        self.assertEqual([result.book for result in results], books[:4])
+        self.assertEqual(results, sorted(results, key=lambda result: result.rank))
+        self.assertGreater(results[0].score, results[3].score)
+
+    def test_query_books_filters(self):
+        """
+        Test combining filters.
+        """
+        member = self._make_member()
+        self.library.add_member(member)
+        first = Book(**dict(self.fake_book, id=1, title="Dune", author="Frank Herbert"))
+        second = Book(**dict(self.fake_book, id=2, title="Dune Messiah", author="Frank Herbert"))
+        third = Book(**dict(self.fake_book, id=3, title="Dune", author="Brian Herbert", isbn_no="0"))
+        for book in (first, second, third):
+            self.library.add_book(book)
+        self.library.lend_book(member, first)
+
+        def ids(**filters):
+            return [result.book.id for result in self.library.query_books(**filters)]
+
+        self.assertEqual(ids(title="dune", author="frank"), [1, 2])
+        self.assertEqual(ids(title="dune", author="frank", is_available=True), [2])
+        self.assertEqual(ids(isbn_no="0"), [3])
+        self.assertEqual(ids(id=2, title="emma"), [])
+        self.assertEqual(ids(is_available=False), [1])
+
+    def test_query_books_paging(self):
+        """
+        Test paging through results with an offset or a cursor.
+        """
+        for i in range(25):
+            self.library.add_book(Book(**dict(self.fake_book, id=i)))
+
+        first_page = list(self.library.query_books(limit=10))
+        second_page = list(self.library.query_books(limit=10, offset=10))
+        after_first_page = list(self.library.query_books(limit=10, after=first_page[-1]))
+        last_page = list(self.library.query_books(limit=10, offset=20))
+
+        self.assertEqual([result.book.id for result in first_page], list(range(10)))
+        self.assertEqual(second_page, after_first_page)
+        self.assertEqual(len(last_page), 5)
+
+    def test_count_available(self):
+        """
+        Test that availability counts follow lending, returning and removing books.
+        """
+        member = self._make_member()
+        self.library.add_member(member)
+        books = [Book(**dict(self.fake_book, id=i)) for i in range(3)]
+        other = Book(**dict(self.fake_book, id=3, isbn_no="0"))
+        for book in books + [other]:
+            self.library.add_book(book)
+        self.library.lend_book(member, books[0])
+
+        self.assertEqual(self.library.count_available(), 3)
+        self.assertEqual(self.library.count_available(self.fake_book["isbn_no"]), 2)
+        self.assertFalse(self.library._is_book_available(books[0]))
+
+        self.library.return_book(member, books[0])
+        self.library.remove_book(books[1])
+
+        self.assertEqual(self.library.count_available(), 3)
+        self.assertEqual(self.library.count_available(self.fake_book["isbn_no"]), 2)
+        self.assertEqual(self.library.count_available("0"), 1)
+        self.assertEqual(self.library.count_available("missing"), 0)
+
+    def test_query_available_books_by_author(self):
+        """
+        Test intersecting an author search with the availability bitmap.
+        """
+        member = self._make_member()
+        self.library.add_member(member)
+        for i in range(6):
+            author = "Ursula K. Le Guin" if i % 2 else self.faker.name()
+            self.library.add_book(Book(**dict(self.fake_book, id=i, author=author)))
+        self.library.lend_book(member, self.library.get_book(3))
+        self.library.remove_book(self.library.get_book(4))
+        self.library.add_book(Book(**dict(self.fake_book, id=7, author="Ursula K. Le Guin", is_available=False)))
+
+        available = self.library.query_books(author="le guin", is_available=True)
+        every_available = self.library.query_books(is_available=True)
+
+        self.assertEqual([result.book.id for result in available], [1, 5])
+        self.assertEqual([result.book.id for result in every_available], [0, 1, 2, 5])
+
+    def test_loan_ledger(self):
+        """
+        Test that loans are found by book and by member.
+        """
+        member = self._make_member()
+        other = self._make_member()
+        books = [Book(**dict(self.fake_book, id=i)) for i in range(3)]
+        self.library.add_member(member)
+        self.library.add_member(other)
+        for book in books:
+            self.library.add_book(book)
+        self.library.lend_book(member, books[0])
+        self.library.lend_book(member, books[2])
+
+        self.assertIs(self.library.get_borrower(books[2].id), member)
+        self.assertIsNone(self.library.get_borrower(books[1].id))
+        self.assertEqual([loan.book for loan in self.library.get_loans(member.id)], [books[0], books[2]])
+        self.assertGreater(self.library.get_loan(books[0].id).due_at, self.library.get_loan(books[0].id).borrowed_at)
+        self.assertEqual(member.books_borrowed, [books[0], books[2]])
+        self.assertEqual(len(member.books_borrowed), 2)
+
+        with self.assertRaises(Exception):
+            self.library.return_book(other, books[0])
+        self.assertFalse(books[0].is_available)
+
+        self.library.return_book(member, books[0])
+        self.assertEqual(member.books_borrowed, [books[2]])
+        self.assertEqual(self.library.get_loans(member.id)[0].book, books[2])
+
+    def test_add_member_with_borrowed_books(self):
+        """
+        Test that books a new member already has are moved to the ledger.
+        """
+        book = Book(**dict(self.fake_book, is_available=False))
+        self.library.add_book(book)
+        member = self._make_member(books_borrowed=[book])
+        self.library.add_member(member)
+
+        self.assertIs(self.library.get_borrower(book.id), member)
+
+        self.library.remove_member(member)
+        self.assertEqual(member.books_borrowed, [book])
+        self.assertIsInstance(member.books_borrowed, list)
+
+    def test_add_member_lends_stored_books(self):
+        """
+        Test that a new member's borrowed books are resolved by id, and that unknown or lent books are refused.
+        """
+        book = Book(**self.fake_book)
+        self.library.add_book(book)
+        member = self._make_member(books_borrowed=[Book(**self.fake_book)])
+        self.library.add_member(member)
+
+        self.assertIs(self.library.get_loan(book.id).book, book)
+        self.assertFalse(book.is_available)
+        self.assertEqual(self.library.count_available(), 0)
+
+        with self.assertRaises(LibraryError):
+            self.library.add_member(self._make_member(books_borrowed=[book]))
+        with self.assertRaises(LibraryError):
+            self.library.add_member(self._make_member(books_borrowed=[Book(**dict(self.fake_book, id=-1))]))
+        other = self._make_member(books_borrowed=[Book(**dict(self.fake_book, id=-2))] * 2)
+        self.library.add_book(other.books_borrowed[0])
+        with self.assertRaises(LibraryError):
+            self.library.add_member(other)
+        self.assertIsNone(self.library.get_member(other.id))
+        self.assertIsNone(self.library.get_loan(-2))
+
+    def test_due_dates(self):
+        """
+        Test lending with a due date and listing the loans coming due.
+        """
+        member = self._make_member()
+        self.library.add_member(member)
+        for i in range(5):
+            self.library.add_book(Book(**dict(self.fake_book, id=i)))
+        for i, due_at in enumerate([50, 10, 40, 30, 20]):
+            self.library.lend_book(member, self.library.get_book(i), due_at=due_at, borrowed_at=0)
+        self.library.return_book(member, self.library.get_book(4))
+        self.library.reschedule_loan(self.library.get_book(0), 5)
+
+        self.assertEqual(self.library.get_loan(2).due_at, 40)
+        self.assertEqual([loan.book.id for loan in self.library.due_soon(3)], [0, 1, 3])
+        self.assertEqual([loan.book.id for loan in self.library.due_soon(10)], [0, 1, 3, 2])
+
+    def test_overdue_sweep(self):
+        """
+        Test that overdue loans are listed until returned and swept only once.
+        """
+        member = self._make_member()
+        self.library.add_member(member)
+        for i in range(4):
+            self.library.add_book(Book(**dict(self.fake_book, id=i)))
+            self.library.lend_book(member, self.library.get_book(i), due_at=10 * (i + 1))
+
+        events = self.library.sweep_overdue(now=25)
+        self.assertEqual(
+            [(event.book_id, event.member_id, event.overdue_by) for event in events],
+            [(0, member.id, 15), (1, member.id, 5)],
+        )
+        self.assertEqual(self.library.sweep_overdue(now=25), [])
+
+        self.library.return_book(member, self.library.get_book(0))
+        self.assertEqual([loan.book.id for loan in self.library.overdue(now=35)], [1, 2])
+        self.assertEqual([event.book_id for event in self.library.sweep_overdue(now=35)], [2])
+        self.assertEqual([loan.book.id for loan in self.library.due_soon(5)], [3])
+
+    def test_lend_many(self):
+        """
+        Test lending a cart of books all or nothing.
+        """
+        member = self._make_member()
+        other = self._make_member()
+        self.library.add_member(member)
+        self.library.add_member(other)
+        books = [Book(**dict(self.fake_book, id=i)) for i in range(4)]
+        self.library.add_books(books)
+        self.library.lend_book(other, books[3])
+
+        with self.assertRaises(Exception):
+            self.library.lend_many(member, books)
+        with self.assertRaises(Exception):
+            self.library.lend_many(member, [books[0], books[0]])
+        self.assertEqual(member.books_borrowed, [])
+        self.assertEqual(self.library.count_available(), 3)
+
+        loans = self.library.lend_many(member, books[:3], due_at=100)
+
+        self.assertEqual([loan.due_at for loan in loans], [100, 100, 100])
+        self.assertEqual(member.books_borrowed, books[:3])
+        self.assertEqual(self.library.count_available(), 0)
+        self.assertFalse(any(book.is_available for book in books))
+
+    def test_return_many(self):
+        """
+        Test returning books of several members all or nothing.
+        """
+        member = self._make_member()
+        other = self._make_member()
+        self.library.add_member(member)
+        self.library.add_member(other)
+        books = [Book(**dict(self.fake_book, id=i)) for i in range(4)]
+        self.library.add_books(books)
+        self.library.lend_many(member, books[:2])
+        self.library.lend_book(other, books[2])
+
+        with self.assertRaises(Exception):
+            self.library.return_many(books)
+        with self.assertRaises(Exception):
+            self.library.return_many(books[1:3], member=member)
+        self.assertEqual(len(self.library.get_loans(member.id)), 2)
+
+        self.library.return_many(books[1:3])
+
+        self.assertEqual(member.books_borrowed, [books[0]])
+        self.assertEqual(other.books_borrowed, [])
+        self.assertEqual(self.library.count_available(), 3)
+        self.assertTrue(books[1].is_available and books[2].is_available)
+
+    def test_page_books(self):
+        """
+        Test paging through the catalog by id in both directions.
+        """
+        books = [Book(**dict(self.fake_book, id=i)) for i in (5, 1, 9, 3, 7)]
+        self.library.add_books(books[:3])
+        for book in books[3:]:
+            self.library.add_book(book)
+
+        self.assertEqual([book.id for book in self.library.page_books(limit=2)], [1, 3])
+        self.assertEqual([book.id for book in self.library.page_books(after=3, limit=2)], [5, 7])
+        self.assertEqual([book.id for book in self.library.page_books(before=7, limit=2)], [3, 5])
+        self.assertEqual(self.library.page_books(after=9), [])
+
+        self.library.remove_book(books[0])
+        self.assertEqual([book.id for book in self.library.page_books(after=3, limit=2)], [7, 9])
+        with self.assertRaises(Exception):
+            self.library.page_books(after=1, before=9)
+
+    def test_page_members(self):
+        """
+        Test paging through the members by id.
+        """
+        members = [self._make_member() for _ in range(5)]
+        for member in members:
+            self.library.add_member(member)
+        self.library.remove_member(members[2])
+        ids = sorted(member.id for member in members if member is not members[2])
+
+        self.assertEqual([member.id for member in self.library.page_members(limit=3)], ids[:3])
+        self.assertEqual([member.id for member in self.library.page_members(after=ids[2])], ids[3:])
@@ -0,0 +1,150 @@
+import json
+from unittest import IsolatedAsyncioTestCase
+
+from faker import Faker
+from rich.console import Console
+from textual.app import App
+from textual.widgets import DataTable, Input, Label, TextLog
+
+import library_textual
+from library_manager import Book, Members
+from library_textual import AddBookManagerBaseClass, BookTable, CompletionSuggester, LendBook, Screen
+
+
+class WidgetApp(App):
+    """
+    An app showing a single widget.
+    """
+
+    def __init__(self, widget):
+        super().__init__()
+        self.widget = widget
+
+    def compose(self):
+        yield self.widget
+
+
+class TestLibraryTextual(IsolatedAsyncioTestCase):
+    """
+    Tests for the widgets of the app, against a fresh library.
+    """
+
+    def setUp(self):
+        """
+        Set up the app's library with books and a member.
+        """
+        for function in (library_textual.library, library_textual.dashboard, library_textual.completions):
+            function.cache_clear()
+        self.faker = Faker()
+        self.library = library_textual.library()
+        self.books = [Book(i, self.faker.sentence(), self.faker.name(), self.faker.isbn13()) for i in range(12)]
+        self.library.add_books(self.books)
+        self.library.add_member(Members(1, self.faker.name(), self.faker.phone_number(), []))
+
+    def tearDown(self):
+        """
+        Forget the app's library.
+        """
+        for function in (library_textual.library, library_textual.dashboard, library_textual.completions):
+            function.cache_clear()
+
+    def rows(self, table):
+        """
+        Get the ids of the rows of a table.
+        """
+        return [int(table.get_row_at(row)[0]) for row in range(table.row_count)]
+
+    async def test_paged_table(self):
+        """
+        Test that the catalog table holds one page and turns pages at either end.
+        """
+        table = BookTable(page_size=5)
+        async with WidgetApp(table).run_test() as pilot:
+            self.assertEqual(self.rows(table), [0, 1, 2, 3, 4])
+            await pilot.press("pagedown")
+            self.assertEqual(self.rows(table), [5, 6, 7, 8, 9])
+            await pilot.press("pagedown", "pagedown")
+            self.assertEqual(self.rows(table), [10, 11])
+            await pilot.press("up")
+            self.assertEqual(self.rows(table), [5, 6, 7, 8, 9])
+            self.assertEqual(table.cursor_row, 4)
+            await pilot.press("down")
+            self.assertEqual(self.rows(table), [10, 11])
+            self.assertEqual(table.cursor_row, 0)
+
+            self.library.remove_book(self.books[0])
+            await pilot.press("r")
+            self.assertEqual(self.rows(table), [1, 2, 3, 4, 5])
+
+    async def test_search_as_you_type(self):
+        """
+        Test that a search runs once typing stops and that results of an overtaken query are dropped.
+        """
+        screen = Screen()
+        book = self.books[3]
+        async with WidgetApp(screen).run_test() as pilot:
+            screen.query_one("#book_title", Input).value = book.title
+            await pilot.pause(library_textual.SEARCH_DEBOUNCE_SECONDS * 2)
+            await pilot.app.workers.wait_for_complete()
+            await pilot.pause()
+            results = screen.query_one("#results", DataTable)
+            self.assertEqual(int(results.get_row_at(0)[0]), book.id)
+            self.assertIn("results", str(screen.query_one("#search_status", Label).renderable))
+
+            screen.query_one("#book_title", Input).value = ""
+            screen.show_results(screen._generation - 1, [], "stale")
+            self.assertNotEqual(str(screen.query_one("#search_status", Label).renderable), "stale")
+            await pilot.pause(library_textual.SEARCH_DEBOUNCE_SECONDS * 2)
+            self.assertEqual(results.row_count, 0)
+
+    async def test_forms(self):
+        """
+        Test that the forms change the library and report what they did, including errors.
+        """
+        form = AddBookManagerBaseClass()
+        async with WidgetApp(form).run_test() as pilot:
+            form.query_one(Input).value = json.dumps(dict(id=100, title="A title", author="An author", isbn_no="1"))
+            await pilot.press("enter")
+            self.assertEqual(self.library.get_book(100).title, "A title")
+            form.query_one(Input).value = json.dumps(dict(id=100, title="A title", author="An author", isbn_no="1"))
+            await pilot.press("enter")
+            lines = [str(line) for line in form.query_one(TextLog).lines]
+            self.assertIn("Book added successfully", "".join(lines))
+            self.assertIn("already exists", "".join(lines))
+
+        form = LendBook()
+        async with WidgetApp(form).run_test() as pilot:
+            form.query_one(Input).value = '{"id": 1}, {"id": 5}'
+            await pilot.press("enter")
+            self.assertEqual(self.library.get_borrower(5).id, 1)
+            form.query_one(Input).value = '{"id": 2}, {"id": 5}'
+            await pilot.press("enter")
+            self.assertIn("Member or book not found", "".join(str(line) for line in form.query_one(TextLog).lines))
+
+    async def test_suggestions(self):
+        """
+        Test that search boxes complete their value and forms the JSON string they end with.
+        """
+        self.library.add_book(Book(100, "Zymurgy for beginners", "An author", "1"))
+        self.assertEqual(await CompletionSuggester("title").get_suggestion("Zymu"), "Zymurgy for beginners")
+        suggester = CompletionSuggester(fields=("title",))
+        self.assertEqual(
+            await suggester.get_suggestion('{"id": 1, "title": "Zymu'), '{"id": 1, "title": "Zymurgy for beginners"'
+        )
+        self.assertIsNone(await suggester.get_suggestion('{"author": "Zymu'))
+        self.assertIsNone(await suggester.get_suggestion('{"title": "'))
+
+    def test_render(self):
+        """
+        Test that the dashboard and the metrics render their figures.
+        """
+        self.library.lend_book(self.library.get_member(1), self.books[0])
+        self.library.search_book({"title": self.books[1].title})
+        console = Console(width=120, record=True)
+        console.print(library_textual.render_dashboard(library_textual.dashboard().snapshot(5)))
+        console.print(library_textual.render_metrics(self.library.metrics_snapshot()))
+        text = console.export_text()
+        self.assertIn("1 (8.3%)", text)
+        self.assertIn(self.books[0].author, text)
+        self.assertIn("lend_book", text)
+        self.assertIn("Query cache hit rate", text)
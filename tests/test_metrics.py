@@ -0,0 +1,79 @@
+from unittest import TestCase
+
+from faker import Faker
+
+from library_manager import Book, Library, Members
+from metrics import Histogram, Metrics
+
+
+class TestMetrics(TestCase):
+    """
+    Test the instrumentation of the library's operations.
+    """
+
+    def setUp(self):
+        """
+        Set up a library with fake books and a member.
+        """
+        self.faker = Faker()
+        self.library = Library()
+        self.books = [Book(i, self.faker.sentence(), self.faker.name(), self.faker.isbn13()) for i in range(50)]
+        self.member = Members(1, self.faker.name(), self.faker.phone_number(), [])
+        self.library.add_books(self.books)
+        self.library.add_member(self.member)
+
+    def test_histogram(self):
+        """
+        Test that percentiles fall within a factor of two of the exact value.
+        """
+        histogram = Histogram()
+        for value in range(1, 1001):
+            histogram.record(value)
+        self.assertEqual(histogram.count, 1000)
+        self.assertEqual(histogram.max, 1000)
+        self.assertTrue(500 <= histogram.percentile(50) < 1000)
+        self.assertEqual(histogram.percentile(100), 1000)
+        self.assertEqual(Histogram().percentile(50), 0)
+
+    def test_operations(self):
+        """
+        Test that calls, errors and latencies are recorded per operation.
+        """
+        self.library.lend_book(self.member, self.books[0])
+        with self.assertRaises(Exception):
+            self.library.lend_book(self.member, self.books[0])
+        self.library.return_book(self.member, self.books[0])
+
+        operations = self.library.metrics_snapshot()["operations"]
+        self.assertEqual(operations["lend_book"]["calls"], 2)
+        self.assertEqual(operations["lend_book"]["errors"], 1)
+        self.assertEqual(operations["return_book"]["errors"], 0)
+        self.assertEqual(operations["add_books"]["calls"], 1)
+        self.assertLessEqual(operations["lend_book"]["p50_ms"], operations["lend_book"]["max_ms"])
+
+    def test_searches(self):
+        """
+        Test that misses, index hits and scanned records are recorded for searches.
+        """
+        book = self.books[7]
+        self.assertEqual(self.library.search_book({"title": book.title}), book)
+        self.assertIsNone(self.library.search_book({"title": "zzzzzzzz"}))
+        self.assertEqual(len(list(self.library.query_books(author=book.author))), 1)
+
+        snapshot = self.library.metrics_snapshot()
+        self.assertEqual(snapshot["counters"]["search_book.misses"], 1)
+        self.assertGreater(snapshot["index"]["hits"], 0)
+        self.assertEqual(snapshot["values"]["records_scanned.query_books"]["count"], 1)
+        self.assertLess(snapshot["values"]["records_scanned.search_book"]["max"], len(self.books))
+        self.assertEqual(snapshot["operations"]["query_books"]["calls"], 1)
+
+    def test_disabled(self):
+        """
+        Test that nothing is recorded when the metrics are disabled.
+        """
+        library = Library(metrics=Metrics(enabled=False))
+        library.add_books(self.books[:3])
+        library.search_book({"title": "zzzzzzzz"})
+        snapshot = library.metrics_snapshot()
+        self.assertEqual(snapshot["operations"], {})
+        self.assertEqual(snapshot["counters"], {})
@@ -0,0 +1,107 @@
+import random
+from unittest import TestCase
+
+from faker import Faker
+
+from library_manager import Book, Library, Members
+from parallel_scan import ParallelScanner
+
+
+class TestParallelScan(TestCase):
+    """
+    Tests for searching a library with parallel scans, against a library searching on its own.
+    """
+
+    def setUp(self):
+        """
+        Set up two libraries with the same books, one of them with a scanner used for every search.
+        """
+        self.faker = Faker()
+        self.library = Library()
+        self.serial = Library()
+        authors = [self.faker.name() for _ in range(20)]
+        isbn_nos = [self.faker.isbn13() for _ in range(100)]
+        books = [Book(i, self.faker.sentence(), random.choice(authors), random.choice(isbn_nos)) for i in range(300)]
+        for library in (self.library, self.serial):
+            library.add_books([Book(book.id, book.title, book.author, book.isbn_no) for book in books])
+            library.add_member(Members(1, self.faker.name(), self.faker.phone_number(), []))
+        self.scanner = ParallelScanner(workers=3, min_records=0)
+        self.scanner.attach(self.library)
+
+    def tearDown(self):
+        """
+        Stop the workers.
+        """
+        self.scanner.close()
+
+    def assertSameSearches(self):
+        """
+        Assert that searches give the same results with and without the scanner.
+        """
+        for book in list(self.serial._books_by_id.values())[:15]:
+            for query in (
+                {"title": book.title[3:5]},
+                {"title": book.title.split()[0], "is_available": True},
+                {"author": book.author[-2:], "is_available": False},
+                {"author": book.author.split()[0], "isbn_no": book.isbn_no},
+                {"is_available": True, "limit": 50},
+            ):
+                self.assertEqual(list(self.library.query_books(**query)), list(self.serial.query_books(**query)))
+            for query in ({"title": book.title[1:3]}, {"author": book.author[2:]}, {"title": "zz"}):
+                self.assertEqual(self.library.search_book(query), self.serial.search_book(query))
+
+    def test_searches(self):
+        """
+        Test that parallel scans rank and page like the library.
+        """
+        self.assertSameSearches()
+        query = dict(title="e", limit=7, offset=2)
+        first = list(self.library.query_books(**query))
+        self.assertEqual(first, list(self.serial.query_books(**query)))
+        self.assertEqual(
+            list(self.library.query_books(**query, after=first[-1])),
+            list(self.serial.query_books(**query, after=first[-1])),
+        )
+        self.assertGreater(self.library.metrics_snapshot()["index"]["parallel_scans"], 0)
+
+    def test_mutations(self):
+        """
+        Test that the workers follow lends, returns, additions and removals.
+        """
+        for library in (self.library, self.serial):
+            member = library.get_member(1)
+            library.lend_many(member, [library.get_book(i) for i in range(0, 60, 3)])
+            library.return_book(member, library.get_book(3))
+            library.remove_book(library.get_book(10))
+            library.add_book(Book(1000, "An added title", "An added author", "123"))
+        self.assertSameSearches()
+        self.assertEqual(self.library.search_book({"title": "added t"}).id, 1000)
+
+    def test_automatic_choice(self):
+        """
+        Test that searches checking fewer books than the threshold do not use the scanner.
+        """
+        self.scanner.min_records = 1000
+        list(self.library.query_books(title="e"))
+        self.library.search_book({"title": "e"})
+        self.assertEqual(self.library.metrics_snapshot()["index"]["parallel_scans"], 0)
+
+        self.scanner.min_records = 300
+        list(self.library.query_books(limit=5))
+        self.assertEqual(self.library.metrics_snapshot()["index"]["parallel_scans"], 1)
+
+        self.scanner.close()
+        list(self.library.query_books(limit=5))
+        self.assertEqual(self.library.metrics_snapshot()["index"]["parallel_scans"], 1)
+
+    def test_spawned_workers(self):
+        """
+        Test that workers started with spawn instead of fork receive their partition and follow mutations.
+        """
+        self.scanner.close()
+        self.scanner = ParallelScanner(workers=2, min_records=0, start_method="spawn")
+        self.scanner.attach(self.library)
+        self.assertSameSearches()
+        for library in (self.library, self.serial):
+            library.add_book(Book(1000, "An added title", "An added author", "123"))
+        self.assertEqual(self.library.search_book({"title": "added t"}).id, 1000)
@@ -0,0 +1,140 @@
+import random
+from unittest import TestCase
+
+from search_index import SortedIds, TokenIndex, deletes, edit_distance
+
+
+class TestTokenIndex(TestCase):
+    """
+    Tests for the token index.
+    """
+
+    def setUp(self):
+        """
+        Set up an index with a few normalized titles.
+        """
+        self.index = TokenIndex()
+        self.index.add(1, "the old man and the sea")
+        self.index.add(2, "a man for all seasons")
+        self.index.add(3, "moby-dick")
+
+    def test_lookup(self):
+        """
+        Test looking up a whole token.
+        """
+        self.assertEqual(self.index.lookup("man"), {1, 2})
+        self.assertEqual(self.index.lookup("whale"), set())
+
+    def test_candidates(self):
+        """
+        Test narrowing a substring query down with trigrams.
+        """
+        self.assertEqual(self.index.candidates("sea"), {1, 2})
+        self.assertEqual(self.index.candidates("by-di"), {3})
+        self.assertEqual(self.index.candidates("xyz"), set())
+
+    def test_candidates_short_query(self):
+        """
+        Test that short queries fall back to the token vocabulary or to a scan.
+        """
+        self.assertEqual(self.index.candidates("mo"), {3})
+        self.assertIsNone(self.index.candidates("a "))
+        self.assertIsNone(self.index.candidates(""))
+
+    def test_remove(self):
+        """
+        Test removing a record drops it from every posting.
+        """
+        self.index.remove(1, "the old man and the sea")
+
+        self.assertEqual(self.index.lookup("man"), {2})
+        self.assertEqual(self.index.candidates("old"), set())
+        self.assertNotIn("old", self.index._tokens)
+
+    def test_edit_distance(self):
+        """
+        Test counting insertions, deletions, substitutions and swaps as one edit each.
+        """
+        self.assertEqual(edit_distance("melville", "melville", 2), 0)
+        self.assertEqual(edit_distance("melville", "melvile", 2), 1)
+        self.assertEqual(edit_distance("melville", "mlevile", 2), 2)
+        self.assertEqual(edit_distance("smith", "smtih", 2), 1)
+        self.assertEqual(edit_distance("kitten", "sitting", 2), 3)
+        self.assertEqual(deletes("abc", 1), {"abc", "bc", "ac", "ab"})
+
+    def test_similar(self):
+        """
+        Test finding the tokens a few edits away from a misspelled one.
+        """
+        self.assertEqual(self.index.similar("mna", 1), {"man": 1})
+        self.assertEqual(self.index.similar("seasnos"), {"seasons": 1})
+        self.assertEqual(self.index.closest("teh old mna"), (2, {1}))
+        self.assertEqual(self.index.closest("mna"), (1, {1, 2}))
+        self.assertIsNone(self.index.closest("ab"))
+
+    def test_closest_long_query(self):
+        """
+        Test that a long misspelled query finds the closest record, and that a token nothing is close to
+        rules every record out.
+        """
+        self.index.add(4, "the sea and the old man and the man of the sea and the old seasons")
+        query = "teh sae adn the old mna and the man of the sea adn the odl seasnos"
+        self.assertEqual(self.index.closest(query), (6, {4}))
+        self.assertIsNone(self.index.closest(query + " xylophone"))
+
+    def test_similar_follows_updates(self):
+        """
+        Test that the deletes built for misspelled lookups follow added and removed records.
+        """
+        self.assertTrue(self.index.similar("moby"))
+        self.index.add(4, "the whale")
+        self.index.add_many([(5, "white whales")])
+        self.assertEqual(self.index.closest("whael"), (1, {4}))
+        self.assertEqual(self.index.closest("whitte whael"), (3, {5}))
+
+        self.index.remove(4, "the whale")
+        self.index.remove(5, "white whales")
+        self.assertEqual(self.index.similar("whael"), {})
+        self.assertFalse(any("whale" in tokens for tokens in self.index._deletes.values()))
+
+
+class TestSortedIds(TestCase):
+    """
+    Tests for the sorted ids used to page through records.
+    """
+
+    def test_page(self):
+        """
+        Test paging forwards and backwards through ids added out of order and removed, some of them re-added.
+        """
+        ids = SortedIds()
+        expected = set()
+        rng = random.Random(0)
+        for _ in range(2000):
+            id = rng.randrange(300)
+            if id in expected:
+                ids.remove(id)
+                expected.discard(id)
+            else:
+                ids.add(id)
+                expected.add(id)
+            if rng.random() < 0.05:
+                after = rng.randrange(300)
+                ordered = sorted(expected)
+                self.assertEqual(ids.page(after, None, 7), [i for i in ordered if i > after][:7])
+                self.assertEqual(ids.page(None, after, 7), [i for i in ordered if i < after][-7:])
+
+        self.assertEqual(len(ids), len(expected))
+        self.assertEqual(ids.page(None, None, len(expected) + 1), sorted(expected))
+
+    def test_appended_ids(self):
+        """
+        Test that ids added in increasing order are appended.
+        """
+        ids = SortedIds()
+        ids.add_many(range(5))
+        self.assertEqual(ids.page(None, None, 10), [0, 1, 2, 3, 4])
+        ids.add_many([7, 6])
+        ids.remove(0)
+        self.assertEqual(ids.page(None, None, 10), [1, 2, 3, 4, 6, 7])
+        self.assertEqual(ids.page(None, 3, 10), [1, 2])
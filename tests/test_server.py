@@ -0,0 +1,222 @@
+import asyncio
+import json
+import threading
+from urllib.parse import quote
+from unittest import IsolatedAsyncioTestCase, mock
+
+from faker import Faker
+
+from library_manager import Book, Library, Members
+from server import LibraryServer
+
+
+class TestLibraryServer(IsolatedAsyncioTestCase):
+    """
+    Tests for the HTTP/JSON API of a library.
+    """
+
+    async def asyncSetUp(self):
+        """
+        Start a server on a free port with a few books and a member.
+        """
+        self.faker = Faker()
+        self.library = Library()
+        self.library.add_books([Book(i, self.faker.sentence(), self.faker.name(), self.faker.isbn13()) for i in range(5)])
+        self.library.add_member(Members(1, self.faker.name(), self.faker.phone_number(), []))
+        self.server = LibraryServer(self.library, port=0)
+        await self.server.start()
+        self.reader, self.writer = await asyncio.open_connection(self.server.host, self.server.port)
+
+    async def asyncTearDown(self):
+        """
+        Close the connection and stop the server.
+        """
+        self.writer.close()
+        await self.server.close()
+
+    def send(self, method, path, body=None, close=False):
+        """
+        Write a request without waiting for its response; a body that is not bytes is sent as JSON.
+        """
+        content = body if isinstance(body, bytes) else json.dumps(body).encode() if body is not None else b""
+        self.writer.write(
+            f"{method} {path} HTTP/1.1\r\nHost: library\r\nContent-Length: {len(content)}\r\n".encode()
+            + (b"Connection: close\r\n" if close else b"")
+            + b"\r\n"
+            + content
+        )
+
+    async def receive(self):
+        """
+        Read a response and get its status and decoded body.
+        """
+        head = (await self.reader.readuntil(b"\r\n\r\n")).decode()
+        headers = dict(line.split(": ", 1) for line in head.split("\r\n")[1:] if line)
+        body = await self.reader.readexactly(int(headers["Content-Length"]))
+        return int(head.split(" ")[1]), json.loads(body)
+
+    async def request(self, method, path, body=None):
+        """
+        Send a request and wait for its response.
+        """
+        self.send(method, path, body)
+        return await self.receive()
+
+    async def test_keep_alive(self):
+        """
+        Test several requests on one connection.
+        """
+        status, book = await self.request("GET", "/books/3")
+        self.assertEqual((status, book["id"]), (200, 3))
+
+        status, loan = await self.request("POST", "/loans", {"member_id": 1, "book_id": 3, "due_at": 100})
+        self.assertEqual((status, loan["due_at"]), (201, 100))
+        self.assertIs(self.library.get_borrower(3), self.library.get_member(1))
+
+        status, overdue = await self.request("GET", "/loans/overdue?now=200")
+        self.assertEqual([loan["book_id"] for loan in overdue], [3])
+
+        status, _ = await self.request("DELETE", "/loans/3")
+        self.assertEqual(status, 200)
+        self.assertTrue(self.library.get_book(3).is_available)
+
+    async def test_pipelining(self):
+        """
+        Test that pipelined requests are answered in order, searches included.
+        """
+        title = self.library.get_book(2).title
+        self.send("POST", "/books", {"id": 9, "title": "Pipelined", "author": "Someone", "isbn_no": "9780000000002"})
+        self.send("GET", f"/books?title={quote(title[:8])}&limit=1")
+        self.send("GET", "/books/9")
+        self.send("DELETE", "/books/9", close=True)
+
+        responses = [await self.receive() for _ in range(4)]
+
+        self.assertEqual([status for status, _ in responses], [201, 200, 200, 200])
+        self.assertEqual(responses[1][1][0]["title"], title)
+        self.assertEqual(responses[2][1]["title"], "Pipelined")
+        self.assertIsNone(self.library.get_book(9))
+        self.assertEqual(await self.reader.read(), b"")
+
+    async def test_errors(self):
+        """
+        Test that errors are answered with a status and the connection stays usable.
+        """
+        self.assertEqual((await self.request("GET", "/books/42"))[0], 404)
+        self.assertEqual((await self.request("GET", "/shelves"))[0], 404)
+        self.assertEqual((await self.request("PUT", "/books/1"))[0], 405)
+        self.assertEqual((await self.request("POST", "/books", {"id": 1}))[0], 400)
+        self.assertEqual((await self.request("DELETE", "/loans/1"))[0], 409)
+        await self.request("POST", "/loans", {"member_id": 1, "book_id": 1})
+        status, error = await self.request("POST", "/loans", {"member_id": 1, "book_id": 1})
+        self.assertEqual((status, error["error"]), (409, "Book not available."))
+        self.assertEqual((await self.request("GET", "/members/1"))[1]["books_borrowed"], [1])
+
+    async def test_invalid_requests(self):
+        """
+        Test that missing or invalid fields and bodies are answered with 400 and say what is wrong.
+        """
+        book = {"id": 9, "title": "Invalid", "author": "Someone", "isbn_no": "9780000000002"}
+
+        self.assertEqual(await self.request("POST", "/books", b"{"), (400, {"error": "Body is not valid JSON."}))
+        self.assertEqual(await self.request("POST", "/books", [book]), (400, {"error": "Body is not a JSON object."}))
+        self.assertEqual(await self.request("POST", "/books", dict(book, title=None)),
+                         (400, {"error": "Missing title."}))
+        self.assertEqual(await self.request("POST", "/books", dict(book, id="nine")), (400, {"error": "Invalid id."}))
+        self.assertEqual(await self.request("POST", "/members", {"id": [2], "name": "A", "phone": "1"}),
+                         (400, {"error": "Invalid id."}))
+        self.assertEqual(await self.request("POST", "/loans", {"member_id": 1}), (400, {"error": "Missing book_id."}))
+        self.assertEqual(await self.request("POST", "/loans", {"member_id": 1, "book_id": 1, "due_at": "soon"}),
+                         (400, {"error": "Invalid due_at."}))
+        self.assertEqual(await self.request("GET", "/books?limit=many"), (400, {"error": "Invalid limit."}))
+        self.assertEqual(await self.request("GET", "/loans/overdue?now=later"), (400, {"error": "Invalid now."}))
+        self.assertIsNone(self.library.get_book(9))
+        self.assertIsNone(self.library.get_loan(1))
+
+    async def test_library_errors(self):
+        """
+        Test that unknown records are answered with 404 and refused operations with 409.
+        """
+        member = {"id": 1, "name": self.faker.name(), "phone": self.faker.phone_number()}
+
+        self.assertEqual((await self.request("POST", "/loans", {"member_id": 7, "book_id": 1}))[0], 404)
+        self.assertEqual((await self.request("POST", "/loans", {"member_id": 1, "book_id": 7}))[0], 404)
+        self.assertEqual((await self.request("DELETE", "/members/7"))[0], 404)
+        self.assertEqual(await self.request("POST", "/members", member), (409, {"error": "Member already exists."}))
+        status, _ = await self.request("POST", "/books", {"id": 1, "title": "T", "author": "A", "isbn_no": "1"})
+        self.assertEqual(status, 409)
+
+    async def test_internal_errors(self):
+        """
+        Test that unexpected errors are logged and answered with 500, and the connection stays usable.
+        """
+        with mock.patch.object(self.library, "get_book", side_effect=RuntimeError("disk on fire")):
+            with self.assertLogs("server", "ERROR") as logs:
+                status, error = await self.request("GET", "/books/1")
+
+        self.assertEqual((status, error), (500, {"error": "Internal server error."}))
+        self.assertIn("disk on fire", logs.output[0])
+        self.assertEqual((await self.request("GET", "/books/1"))[0], 200)
+
+    async def test_writes_run_in_executor(self):
+        """
+        Test that changes to the library run off the event loop, in the order they were pipelined.
+        """
+        threads = []
+        add_book = self.library.add_book
+
+        def record(book):
+            threads.append(threading.current_thread())
+            add_book(book)
+
+        with mock.patch.object(self.library, "add_book", side_effect=record):
+            self.send("POST", "/books", {"id": 9, "title": "First", "author": "Someone", "isbn_no": "9780000000002"})
+            self.send("DELETE", "/books/9")
+            self.send("POST", "/books", {"id": 9, "title": "Second", "author": "Someone", "isbn_no": "9780000000002"})
+            self.send("GET", "/books/9")
+            responses = [await self.receive() for _ in range(4)]
+
+        self.assertEqual([status for status, _ in responses], [201, 200, 201, 200])
+        self.assertEqual(responses[3][1]["title"], "Second")
+        self.assertNotIn(threading.main_thread(), threads)
+
+    async def test_members(self):
+        """
+        Test adding, finding and removing members.
+        """
+        name = self.faker.name()
+        status, member = await self.request("POST", "/members", {"id": 2, "name": name, "phone": "555"})
+        self.assertEqual((status, member["name"], member["books_borrowed"]), (201, name, []))
+
+        status, found = await self.request("GET", f"/members?name={quote(name)}")
+        self.assertEqual([member["id"] for member in found], [2])
+        self.assertEqual(await self.request("GET", "/members?name=nobody+at+all"), (200, []))
+        self.assertEqual(await self.request("GET", "/members"), (200, []))
+
+        self.assertEqual(await self.request("DELETE", "/members/2"), (200, {"id": 2}))
+        self.assertEqual((await self.request("GET", "/members/2"))[0], 404)
+
+    async def test_concurrent_connections(self):
+        """
+        Test that clients on separate connections racing for the same book get it lent once.
+        """
+        connections = [await asyncio.open_connection(self.server.host, self.server.port) for _ in range(8)]
+        for i in range(8):
+            self.library.add_member(Members(10 + i, self.faker.name(), self.faker.phone_number(), []))
+
+        async def borrow(i):
+            reader, writer = connections[i]
+            content = json.dumps({"member_id": 10 + i, "book_id": 0}).encode()
+            writer.write(
+                f"POST /loans HTTP/1.1\r\nHost: library\r\nContent-Length: {len(content)}\r\n"
+                f"Connection: close\r\n\r\n".encode() + content
+            )
+            head = (await reader.readuntil(b"\r\n\r\n")).decode()
+            await reader.read()
+            writer.close()
+            return int(head.split(" ")[1])
+
+        statuses = await asyncio.gather(*(borrow(i) for i in range(8)))
+
+        self.assertEqual(sorted(statuses), [201] + [409] * 7)
+        self.assertEqual(self.library.get_borrower(0).id, 10 + statuses.index(201))
@@ -0,0 +1,285 @@
+import os
+import sqlite3
+import tempfile
+from unittest import TestCase
+
+from faker import Faker
+
+from library_manager import Book, Library, LibraryError, Members
+from storage import SQLiteStorage
+
+
+class TestSQLiteStorage(TestCase):
+    """
+    Tests for a library persisted in SQLite.
+    """
+
+    def setUp(self):
+        """
+        Set up a library on a temporary database.
+        """
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "library.db")
+        self.library = Library(SQLiteStorage(self.path, batch_size=2))
+        self.faker = Faker()
+        self.fake_book = dict(
+            id=self.faker.random_int(),
+            title=self.faker.sentence(),
+            author=self.faker.name(),
+            isbn_no=self.faker.isbn13(),
+        )
+        self.fake_member = dict(
+            id=self.faker.random_int(),
+            name=self.faker.name(),
+            phone=self.faker.phone_number(),
+            books_borrowed=[],
+        )
+
+    def tearDown(self):
+        """
+        Close the library and remove the database.
+        """
+        self.library.close()
+        self.directory.cleanup()
+
+    def reopen(self):
+        """
+        Close the library and open a new one on the same database.
+        """
+        self.library.close()
+        self.library = Library(SQLiteStorage(self.path))
+
+    def test_books_persist(self):
+        """
+        Test that books survive reopening the library and are loaded on demand.
+        """
+        book = Book(**self.fake_book)
+        self.library.add_book(book)
+        self.reopen()
+
+        self.assertEqual(self.library._books_by_id, {})
+        self.assertEqual(self.library.get_book(book.id), book)
+        self.assertEqual(self.library.get_book_by_isbn(book.isbn_no), book)
+        self.assertEqual(len(self.library._books_by_id), 1)
+
+    def test_remove_book_persists(self):
+        """
+        Test that removed books stay removed after reopening the library.
+        """
+        book = Book(**self.fake_book)
+        self.library.add_book(book)
+        self.library.remove_book(book)
+        self.reopen()
+
+        self.assertIsNone(self.library.get_book(book.id))
+
+    def test_loans_persist(self):
+        """
+        Test that members and their loans survive reopening the library.
+        """
+        member = Members(**self.fake_member)
+        book = Book(**self.fake_book)
+        self.library.add_member(member)
+        self.library.add_book(book)
+        self.library.lend_book(member, book)
+        self.reopen()
+
+        self.assertEqual(self.library.get_borrower(book.id), member)
+        member = self.library.get_member(member.id)
+        self.assertEqual([borrowed.id for borrowed in member.books_borrowed], [book.id])
+        self.assertFalse(member.books_borrowed[0].is_available)
+
+        self.library.return_book(member, member.books_borrowed[0])
+        self.reopen()
+
+        self.assertEqual(self.library.get_member(member.id).books_borrowed, [])
+        self.assertTrue(self.library.get_book(book.id).is_available)
+
+    def test_borrowed_books_persist(self):
+        """
+        Test that the books a member is added with stay lent to them after reopening the library.
+        """
+        books = [Book(**dict(self.fake_book, id=i)) for i in range(3)]
+        self.library.add_books(books)
+        member = Members(**dict(self.fake_member, books_borrowed=books[:2]))
+        self.library.add_member(member)
+        self.assertEqual(self.library.count_available(), 1)
+        self.reopen()
+
+        self.assertEqual([book.id for book in self.library.get_member(member.id).books_borrowed], [0, 1])
+        self.assertEqual(self.library.get_borrower(1), member)
+        self.assertEqual(self.library.count_available(), 1)
+        self.assertFalse(self.library.get_book(0).is_available)
+
+    def test_add_member_lends_stored_books(self):
+        """
+        Test that a new member's borrowed books are looked up in storage, and that lent ones are refused.
+        """
+        self.library.add_books([Book(**dict(self.fake_book, id=i)) for i in range(2)])
+        self.reopen()
+        member = Members(**dict(self.fake_member, books_borrowed=[Book(**dict(self.fake_book, id=0))]))
+        self.library.add_member(member)
+        self.reopen()
+
+        self.assertFalse(self.library.get_book(0).is_available)
+        self.assertEqual(self.library.get_borrower(0), member)
+        for book_id in (0, 2):
+            book = Book(**dict(self.fake_book, id=book_id))
+            other = Members(**dict(self.fake_member, id=member.id + 1, books_borrowed=[book]))
+            with self.assertRaises(LibraryError):
+                self.library.add_member(other)
+        self.assertIsNone(self.library.get_member(member.id + 1))
+
+    def test_loans_of_removed_members_persist(self):
+        """
+        Test that a removed member's loans stay until the books are returned, after reopening the library.
+        """
+        member = Members(**self.fake_member)
+        books = [Book(**dict(self.fake_book, id=i)) for i in range(2)]
+        self.library.add_books(books)
+        self.library.add_member(member)
+        self.library.lend_book(member, books[0], due_at=10)
+        self.library.remove_member(member)
+        self.reopen()
+
+        self.assertEqual(self.library.get_loan(0).member_id, member.id)
+        self.assertEqual([loan.book.id for loan in self.library.overdue(now=20)], [0])
+        self.assertEqual(self.library.count_available(), 1)
+        other = Members(**dict(self.fake_member, id=member.id + 1))
+        self.library.add_member(other)
+        with self.assertRaises(LibraryError):
+            self.library.lend_book(other, self.library.get_book(0))
+
+        self.library.return_many([self.library.get_book(0)])
+        self.reopen()
+
+        self.assertIsNone(self.library.get_loan(0))
+        self.assertEqual(self.library.count_available(), 2)
+        self.library.lend_book(self.library.get_member(other.id), self.library.get_book(0))
+
+    def test_failed_write_changes_nothing(self):
+        """
+        Test that a mutation the database rejects is neither applied in memory nor sent to listeners.
+        """
+        changes = []
+        self.library.add_listener(lambda operation, payload: changes.append(operation))
+        connection = self.library._storage._connection
+        for table in ("books", "loans"):
+            connection.execute(
+                f"CREATE TRIGGER fail_{table} BEFORE INSERT ON {table} BEGIN SELECT RAISE(ABORT, 'full'); END"
+            )
+        book = Book(**self.fake_book)
+        with self.assertRaises(sqlite3.IntegrityError):
+            self.library.add_book(book)
+        self.assertIsNone(self.library.get_book(book.id))
+
+        connection.execute("DROP TRIGGER fail_books")
+        member = Members(**self.fake_member)
+        self.library.add_member(member)
+        self.library.add_book(book)
+        with self.assertRaises(sqlite3.IntegrityError):
+            self.library.lend_book(member, book)
+        self.assertIsNone(self.library._ledger.loan_of(book.id))
+        self.assertEqual(self.library.count_available(), 1)
+        self.assertEqual(changes, ["add_member", "add_book"])
+
+    def test_overdue_loans_persist(self):
+        """
+        Test that due dates survive reopening the library and overdue loans are loaded on demand.
+        """
+        member = Members(**self.fake_member)
+        self.library.add_member(member)
+        for i in range(3):
+            book = Book(**dict(self.fake_book, id=i))
+            self.library.add_book(book)
+            self.library.lend_book(member, book, due_at=10 * (i + 1))
+        self.library.reschedule_loan(self.library.get_book(2), 15)
+        self.reopen()
+
+        self.assertEqual([loan.book.id for loan in self.library.overdue(now=16)], [0, 2])
+        self.assertEqual(self.library.get_loan(2).due_at, 15)
+        self.assertEqual([loan.book.id for loan in self.library.due_soon(5)], [0, 2, 1])
+
+    def test_batches_persist(self):
+        """
+        Test that batches are written all or nothing.
+        """
+        member = Members(**self.fake_member)
+        books = [Book(**dict(self.fake_book, id=i)) for i in range(5)]
+        self.library.add_member(member)
+        self.library.add_books(books[:3])
+        rows = list(self.library._storage.find_books())
+        with self.assertRaises(Exception):
+            self.library._storage.save_books([dict(rows[0], id=10), rows[1]])
+        self.library.lend_many(member, books[:2])
+        self.library.return_many([books[0]])
+        self.reopen()
+
+        self.assertEqual(self.library._storage.count_books(), 3)
+        self.assertEqual([loan.book.id for loan in self.library.get_loans(member.id)], [1])
+        self.assertEqual(self.library.count_available(), 2)
+
+    def test_search_loads_matches(self):
+        """
+        Test that searches are answered by the database.
+        """
+        book = Book(**dict(self.fake_book, title="The Name of the Rose", author="Umberto Eco"))
+        member = Members(**dict(self.fake_member, name="Adso of Melk"))
+        self.library.add_book(book)
+        self.library.add_member(member)
+        self.reopen()
+
+        self.assertEqual(self.library.search_book({"author": "eco"}), book)
+        self.assertEqual(self.library.search_member({"name": "melk"}), member)
+        self.assertEqual([result.book for result in self.library.query_books(title="rose")], [book])
+        self.assertEqual(list(self.library.query_books(title="rose", is_available=False)), [])
+
+    def test_search_loads_results(self):
+        """
+        Test that searches rank and page in the database like a library in memory, loading only their results.
+        """
+        authors = [self.faker.name() for _ in range(10)]
+        books = [Book(i, self.faker.sentence(), authors[i % 10], self.faker.isbn13()) for i in range(200)]
+        self.library.add_books(books)
+        memory = Library()
+        memory.add_books([Book(book.id, book.title, book.author, book.isbn_no) for book in books])
+        self.reopen()
+
+        self.assertEqual(self.library.search_book({"title": books[150].title}), books[150])
+        self.assertEqual(len(self.library._books_by_id), 1)
+        for query in (dict(author=authors[3], limit=5), dict(is_available=True, limit=1), dict(title="e", limit=7)):
+            self.library._books_by_id.clear()
+            results = list(self.library.query_books(**query))
+            self.assertEqual(results, list(memory.query_books(**query)), query)
+            self.assertEqual(len(self.library._books_by_id), len(results))
+            self.assertEqual(
+                list(self.library.query_books(**query, offset=2, after=results[-1])),
+                list(memory.query_books(**query, offset=2, after=results[-1])),
+            )
+
+    def test_search_rebuilds_text(self):
+        """
+        Test that the text tables are rebuilt when a database without them is opened.
+        """
+        book = Book(**dict(self.fake_book, title="The Name of the Rose"))
+        self.library.add_book(book)
+        self.library.close()
+        self.library = Library()
+        with sqlite3.connect(self.path) as connection:
+            connection.execute("DROP TABLE books_text")
+        self.reopen()
+
+        self.assertEqual(self.library.search_book({"title": "name of"}), book)
+
+    def test_page_books(self):
+        """
+        Test that pages are read from the database and loaded on demand.
+        """
+        self.library.add_books([Book(**dict(self.fake_book, id=i)) for i in range(10)])
+        self.library.add_member(Members(**self.fake_member))
+        self.reopen()
+
+        self.assertEqual([book.id for book in self.library.page_books(after=2, limit=3)], [3, 4, 5])
+        self.assertEqual([book.id for book in self.library.page_books(before=2)], [0, 1])
+        self.assertEqual(len(self.library._books_by_id), 5)
+        self.assertEqual([member.id for member in self.library.page_members()], [self.fake_member["id"]])
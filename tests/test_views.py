@@ -0,0 +1,194 @@
+import os
+import random
+import tempfile
+from collections import Counter
+from unittest import TestCase
+
+from faker import Faker
+
+from library_manager import Book, Library, Members
+from storage import SQLiteStorage
+from views import ChangeFeed, Dashboard, RankedCounter
+
+
+class TestViews(TestCase):
+    """
+    Tests for the change feed and the views maintained from it.
+    """
+
+    def setUp(self, storage=None):
+        """
+        Set up a library with books by a few authors and some members.
+        """
+        self.faker = Faker()
+        self.rng = random.Random(1234)
+        self.library = Library(storage)
+        self.authors = [self.faker.name() for _ in range(8)]
+        self.isbn_nos = [self.faker.isbn13() for _ in range(30)]
+        self.books = [self.make_book(i) for i in range(100)]
+        self.next_id = len(self.books)
+        self.members = [Members(i, self.faker.name(), self.faker.phone_number(), []) for i in range(10)]
+        self.library.add_books(self.books)
+        for member in self.members:
+            self.library.add_member(member)
+
+    def make_book(self, book_id):
+        return Book(book_id, self.faker.sentence(), self.rng.choice(self.authors), self.rng.choice(self.isbn_nos))
+
+    def churn(self, steps):
+        """
+        Lend, return, add and remove books at random, singly and in batches.
+        """
+        for _ in range(steps):
+            choice = self.rng.random()
+            available = [book for book in self.library._books_by_id.values() if book.is_available]
+            lent = [book for book in self.library._books_by_id.values() if not book.is_available]
+            if choice < 0.4 and available:
+                self.library.lend_book(self.rng.choice(self.members), self.rng.choice(available))
+            elif choice < 0.5 and len(available) > 3:
+                self.library.lend_many(self.rng.choice(self.members), self.rng.sample(available, 3))
+            elif choice < 0.75 and lent:
+                book = self.rng.choice(lent)
+                self.library.return_book(self.library.get_borrower(book.id), book)
+            elif choice < 0.8 and len(lent) > 2:
+                self.library.return_many(self.rng.sample(lent, 2))
+            elif choice < 0.9:
+                self.library.add_book(self.make_book(self.next_id))
+                self.next_id += 1
+            elif available:
+                self.library.remove_book(self.rng.choice(available))
+
+    def assertMatchesLibrary(self, dashboard):
+        """
+        Assert that the views agree with the figures recomputed from the library.
+        """
+        authors = Counter(book.author for book in self.library._books_by_id.values())
+        loans = Counter(loan.member_id for loan in self.library._ledger)
+        lent = sum(not book.is_available for book in self.library._books_by_id.values())
+
+        self.assertEqual(dashboard.utilization.books, len(self.library._books_by_id))
+        self.assertEqual(dashboard.utilization.lent, lent)
+        self.assertEqual(dashboard.loans.total, len(list(self.library._ledger)))
+        self.assertEqual(len(dashboard.authors), len(authors))
+        for author in self.authors:
+            self.assertEqual(dashboard.authors.count(author), authors[author])
+        for member in self.members:
+            self.assertEqual(dashboard.loans.loans_of(member.id), loans[member.id])
+        self.assertEqual(
+            [count for _, count in dashboard.authors.top(3)], [count for _, count in authors.most_common(3)]
+        )
+
+    def test_views_follow_mutations(self):
+        """
+        Test that the views stay equal to a recomputation as the library changes.
+        """
+        dashboard = Dashboard(self.library)
+        self.assertMatchesLibrary(dashboard)
+        for _ in range(5):
+            self.churn(100)
+            self.assertMatchesLibrary(dashboard)
+
+    def test_bootstrap(self):
+        """
+        Test that views built on a library in use start from its current state.
+        """
+        self.churn(200)
+        dashboard = Dashboard(self.library)
+        self.assertMatchesLibrary(dashboard)
+        self.churn(100)
+        self.assertMatchesLibrary(dashboard)
+
+    def test_bootstrap_from_storage(self):
+        """
+        Test that views built on a library with a storage backend are seeded from it without loading the
+        library's records.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "library.db")
+            self.setUp(SQLiteStorage(path))
+            self.churn(200)
+            self.library.remove_member(self.members[0])
+            self.library.close()
+            library, self.library = self.library, Library(SQLiteStorage(path))
+
+            dashboard = Dashboard(self.library)
+            self.assertEqual(self.library._books_by_id, {})
+            self.assertEqual(self.library._members_by_id, {})
+            self.library, reopened = library, self.library
+            self.assertMatchesLibrary(dashboard)
+
+            borrowed = Counter(loan.book.isbn_no for loan in library._ledger)
+            self.assertEqual(sorted(count for _, count in dashboard.borrowed.top(100)), sorted(borrowed.values()))
+
+            book = next(book for book in library._books_by_id.values() if book.is_available)
+            reopened.lend_book(reopened.get_member(1), reopened.get_book(book.id))
+            borrowed[book.isbn_no] += 1
+            self.assertEqual(sorted(count for _, count in dashboard.borrowed.top(100)), sorted(borrowed.values()))
+            self.assertEqual(dashboard.loans.total, len(list(library._ledger)) + 1)
+            dashboard.close()
+            reopened.close()
+
+    def test_top_borrowed(self):
+        """
+        Test that the most borrowed titles count every copy of an ISBN number together.
+        """
+        dashboard = Dashboard(self.library)
+        copies = self.library.get_books_by_isbn(self.books[0].isbn_no)
+        for _ in range(3):
+            for copy in copies:
+                self.library.lend_book(self.members[0], copy)
+                self.library.return_book(self.members[0], copy)
+
+        title, count = dashboard.borrowed.top(1)[0]
+        self.assertEqual(title, copies[0].title)
+        self.assertEqual(count, 3 * len(copies))
+        self.assertEqual(dashboard.snapshot()["top_borrowed"][0], (title, count))
+
+    def test_change_feed(self):
+        """
+        Test reading the feed from a sequence number, with a bounded history.
+        """
+        feed = ChangeFeed(history=5)
+        feed.attach(self.library)
+        for book in self.books[:8]:
+            self.library.lend_book(self.members[0], book)
+
+        self.assertEqual(feed.seq, 8)
+        self.assertEqual([change.seq for change in feed.changes()], [4, 5, 6, 7, 8])
+        self.assertEqual([change.seq for change in feed.changes(after=6)], [7, 8])
+        self.assertEqual(feed.changes(after=8), [])
+        self.assertEqual(feed.changes(after=7)[0].operation, "lend_book")
+        self.assertEqual(feed.changes(after=7)[0].payload["book_id"], self.books[7].id)
+
+        feed.detach()
+        self.library.return_book(self.members[0], self.books[0])
+        self.assertEqual(feed.seq, 8)
+
+    def test_ranked_counter(self):
+        """
+        Test the ranked counter against a plain counter.
+        """
+        counter = RankedCounter()
+        expected = Counter()
+        for _ in range(2000):
+            key = self.rng.randrange(20)
+            if expected[key] and self.rng.random() < 0.4:
+                counter.decrement(key)
+                expected[key] -= 1
+            else:
+                counter.increment(key)
+                expected[key] += 1
+            expected += Counter()
+
+        self.assertEqual(len(counter), len(expected))
+        for key in range(20):
+            self.assertEqual(counter.count(key), expected[key])
+        top = counter.top(5)
+        self.assertEqual([count for _, count in top], [count for _, count in expected.most_common(5)])
+        self.assertTrue(all(expected[key] == count for key, count in top))
+
+        seeded = RankedCounter.from_counts(expected.items())
+        self.assertEqual(len(seeded), len(expected))
+        self.assertEqual([count for _, count in seeded.top(5)], [count for _, count in top])
+        seeded.decrement(top[0][0])
+        self.assertEqual(seeded.count(top[0][0]), top[0][1] - 1)
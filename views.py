@@ -0,0 +1,544 @@
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Callable, Deque, Dict, Hashable, Iterable, Iterator, List, Optional, Set, Tuple
+
+from library_manager import Library, _book_event, _member_payload
+
+if TYPE_CHECKING:
+    from storage import Storage
+
+DEFAULT_HISTORY = 1000
+BOOTSTRAP_PAGE = 10000
+
+
+@dataclass(frozen=True)
+class Change:
+    """
+    A mutation of a library as it appears in a ``ChangeFeed``.
+
+    :cvar seq: The position of the change in the feed, starting at 1.
+    :cvar operation: The name of the mutation, e.g. ``"lend_book"``.
+    :cvar payload: The arguments of the mutation, as listeners receive them.
+    """
+
+    seq: int
+    operation: str
+    payload: dict
+
+
+class ChangeFeed:
+    """
+    A numbered stream of the mutations of a ``Library`` that keeps views up to date.
+
+    The feed is a library listener, so changes arrive under the library's index lock, in the order they
+    were applied, one per item for batch mutations. Every change is pushed to the subscribed views and
+    the latest ``history`` changes are kept for readers that poll with ``changes``.
+
+    :cvar seq: The sequence number of the last change.
+    :cvar history: The latest changes.
+    :cvar views: The views notified of every change.
+    :cvar routes: The views that handle every operation.
+    :cvar library: The library the feed is attached to, if any.
+    """
+
+    def __init__(self, history: int = DEFAULT_HISTORY) -> None:
+        self._seq = 0
+        self._history: Deque[Change] = deque(maxlen=history)
+        self._views: List["View"] = []
+        self._routes: Dict[str, List["View"]] = {}
+        self._library: Optional[Library] = None
+        self._lock = threading.Lock()
+
+    @property
+    def seq(self) -> int:
+        return self._seq
+
+    def attach(self, library: Library) -> None:
+        """
+        Start following a library's mutations, after bringing the subscribed views up to its current state.
+        """
+        with library._index_lock:
+            for view in self._views:
+                _bootstrap(library, view)
+            library.add_listener(self.record)
+            self._library = library
+
+    def detach(self) -> None:
+        """
+        Stop following the library.
+        """
+        if self._library is not None:
+            self._library.remove_listener(self.record)
+            self._library = None
+
+    def subscribe(self, view: "View") -> None:
+        """
+        Notify a view of every change, bringing it up to the state of the library first if attached.
+        """
+        if self._library is not None:
+            with self._library._index_lock:
+                _bootstrap(self._library, view)
+                self._route(self._views + [view])
+        else:
+            self._route(self._views + [view])
+
+    def unsubscribe(self, view: "View") -> None:
+        """
+        Stop notifying a view.
+        """
+        self._route([other for other in self._views if other is not view])
+
+    def _route(self, views: List["View"]) -> None:
+        """
+        Replace the subscribed views, so that each change only goes to the views handling it.
+        """
+        routes: Dict[str, List[View]] = {}
+        for view in views:
+            for operation in view.handlers:
+                routes.setdefault(operation, []).append(view)
+        self._views, self._routes = views, routes
+
+    def record(self, operation: str, payload: dict) -> None:
+        """
+        Number a change, keep it in the history and apply it to the views.
+        """
+        with self._lock:
+            self._seq += 1
+            self._history.append(Change(self._seq, operation, payload))
+        for view in self._routes.get(operation, ()):
+            with view._lock:
+                view.handlers[operation](payload)
+
+    def changes(self, after: int = 0) -> List[Change]:
+        """
+        Get the changes after a sequence number that are still in the history.
+
+        If the first change returned is not ``after + 1``, older changes were dropped and a reader
+        that needs all of them has to start over from the library itself.
+        """
+        with self._lock:
+            if not self._history or self._history[-1].seq <= after:
+                return []
+            start = max(0, after - self._history[0].seq + 1)
+            return [self._history[i] for i in range(start, len(self._history))]
+
+
+class View:
+    """
+    A view of a library maintained from its changes.
+
+    Subclasses handle an operation in a method named ``on_<operation>``, which gets the payload of the
+    change; operations without a handler are ignored. Changes are applied under the view's lock, which
+    readers walking its structures also take. Views that can be built from aggregates of a storage
+    backend override ``seed``, the others are brought up to date by replaying the records.
+
+    :cvar handlers: The handler of every operation the view handles.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.handlers: Dict[str, Callable[[dict], None]] = {
+            name[3:]: getattr(self, name) for name in dir(type(self)) if name.startswith("on_")
+        }
+
+    def apply(self, operation: str, payload: dict) -> None:
+        """
+        Apply a change to the view.
+        """
+        handler = self.handlers.get(operation)
+        if handler is not None:
+            with self._lock:
+                handler(payload)
+
+    def seed(self, storage: "Storage") -> bool:
+        """
+        Build the view from queries on the storage backend of a library, rather than a replay of its records.
+
+        :return: Whether the view was seeded; the default view cannot be, and is replayed instead.
+        """
+        return False
+
+
+class RankedCounter:
+    """
+    Counts of keys that can be incremented, decremented and ranked in constant time per key.
+
+    Keys with the same count share a bucket, and the buckets form a circular doubly linked list in
+    order of count around a sentinel bucket 0. A count only ever moves to the next bucket up or down,
+    so updates never search, and the top keys are read by walking down from the highest bucket.
+
+    :cvar counts: The count of every key.
+    :cvar buckets: The keys of every count, in the order they reached it.
+    :cvar above: The next higher count of every bucket, or 0 for the highest.
+    :cvar below: The next lower count of every bucket, or 0 for the lowest.
+    """
+
+    def __init__(self) -> None:
+        self._counts: Dict[Hashable, int] = {}
+        self._buckets: Dict[int, Dict[Hashable, None]] = {0: {}}
+        self._above: Dict[int, int] = {0: 0}
+        self._below: Dict[int, int] = {0: 0}
+
+    @classmethod
+    def from_counts(cls, counts: Iterable[Tuple[Hashable, int]]) -> "RankedCounter":
+        """
+        Build a counter from the counts of its keys, e.g. aggregated by a query, linking each bucket once.
+        """
+        counter = cls()
+        below = 0
+        for key, count in sorted(counts, key=lambda item: item[1]):
+            if count <= 0:
+                continue
+            if count != below:
+                counter._link(count, below)
+                below = count
+            counter._buckets[count][key] = None
+            counter._counts[key] = count
+        return counter
+
+    def increment(self, key: Hashable) -> int:
+        """
+        Add one to the count of a key and get the new count.
+        """
+        count = self._counts.get(key, 0)
+        if self._above[count] != count + 1:
+            self._link(count + 1, count)
+        self._move(key, count, count + 1)
+        return count + 1
+
+    def decrement(self, key: Hashable) -> int:
+        """
+        Take one from the count of a key, forgetting it at 0, and get the new count.
+        """
+        count = self._counts[key]
+        if count > 1 and self._below[count] != count - 1:
+            self._link(count - 1, self._below[count])
+        self._move(key, count, count - 1)
+        return count - 1
+
+    def count(self, key: Hashable) -> int:
+        return self._counts.get(key, 0)
+
+    def top(self, n: int) -> List[Tuple[Hashable, int]]:
+        """
+        Get up to ``n`` keys with the highest counts, highest first.
+        """
+        result: List[Tuple[Hashable, int]] = []
+        count = self._below[0]
+        while count and len(result) < n:
+            for key in self._buckets[count]:
+                result.append((key, count))
+                if len(result) == n:
+                    break
+            count = self._below[count]
+        return result
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+    def _link(self, count: int, below: int) -> None:
+        """
+        Add an empty bucket right above another one.
+        """
+        above = self._above[below]
+        self._buckets[count] = {}
+        self._above[below], self._below[count] = count, below
+        self._above[count], self._below[above] = above, count
+
+    def _move(self, key: Hashable, old: int, new: int) -> None:
+        """
+        Move a key between adjacent buckets, dropping the old one if it becomes empty.
+        """
+        if new:
+            self._buckets[new][key] = None
+            self._counts[key] = new
+        else:
+            del self._counts[key]
+        if old:
+            bucket = self._buckets[old]
+            del bucket[key]
+            if not bucket:
+                above, below = self._above.pop(old), self._below.pop(old)
+                self._above[below], self._below[above] = above, below
+                del self._buckets[old]
+
+
+class AuthorCounts(View):
+    """
+    The number of books of every author, copies included.
+
+    :cvar counter: The books per author.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._counter = RankedCounter()
+
+    def seed(self, storage: "Storage") -> bool:
+        with self._lock:
+            self._counter = RankedCounter.from_counts(storage.count_books_by_author())
+        return True
+
+    def on_add_book(self, payload: dict) -> None:
+        self._counter.increment(payload["author"])
+
+    def on_remove_book(self, payload: dict) -> None:
+        self._counter.decrement(payload["author"])
+
+    def count(self, author: str) -> int:
+        """
+        Get the number of books of an author.
+        """
+        return self._counter.count(author)
+
+    def top(self, n: int) -> List[Tuple[str, int]]:
+        """
+        Get the authors with the most books, most first.
+        """
+        with self._lock:
+            return self._counter.top(n)
+
+    def __len__(self) -> int:
+        return len(self._counter)
+
+
+class LoanCounts(View):
+    """
+    The current loans of every member, including books lent to members who were removed since.
+
+    :cvar counter: The loans per member id.
+    :cvar total: The number of books lent.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._counter = RankedCounter()
+        self._total = 0
+
+    def seed(self, storage: "Storage") -> bool:
+        counts = storage.count_loans_by_member()
+        with self._lock:
+            self._counter = RankedCounter.from_counts(counts)
+            self._total = sum(count for _, count in counts)
+        return True
+
+    def on_add_member(self, payload: dict) -> None:
+        for _ in payload["books_borrowed"]:
+            self._lend(payload["id"])
+
+    def on_lend_book(self, payload: dict) -> None:
+        self._lend(payload["member_id"])
+
+    def on_return_book(self, payload: dict) -> None:
+        self._counter.decrement(payload["member_id"])
+        self._total -= 1
+
+    def _lend(self, member_id: int) -> None:
+        self._counter.increment(member_id)
+        self._total += 1
+
+    def loans_of(self, member_id: int) -> int:
+        """
+        Get the number of books a member has.
+        """
+        return self._counter.count(member_id)
+
+    def top(self, n: int) -> List[Tuple[int, int]]:
+        """
+        Get the ids of the members with the most loans, most first.
+        """
+        with self._lock:
+            return self._counter.top(n)
+
+    @property
+    def total(self) -> int:
+        """
+        The number of books lent.
+        """
+        return self._total
+
+
+class Utilization(View):
+    """
+    The share of the catalog that is lent.
+
+    :cvar books: The number of books in the catalog.
+    :cvar lent: The ids of the books in the catalog that are lent.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.books = 0
+        self._lent: Set[int] = set()
+
+    def seed(self, storage: "Storage") -> bool:
+        books, lent = storage.count_books(), {loan["book_id"] for loan in storage.load_due_loans()}
+        with self._lock:
+            self.books, self._lent = books, lent
+        return True
+
+    def on_add_book(self, payload: dict) -> None:
+        self.books += 1
+
+    def on_remove_book(self, payload: dict) -> None:
+        self.books -= 1
+        self._lent.discard(payload["id"])
+
+    def on_add_member(self, payload: dict) -> None:
+        self._lent.update(payload["books_borrowed"])
+
+    def on_lend_book(self, payload: dict) -> None:
+        self._lent.add(payload["book_id"])
+
+    def on_return_book(self, payload: dict) -> None:
+        self._lent.discard(payload["book_id"])
+
+    @property
+    def lent(self) -> int:
+        return len(self._lent)
+
+    @property
+    def rate(self) -> float:
+        """
+        The share of the books that are lent, or 0 for an empty catalog.
+        """
+        return len(self._lent) / self.books if self.books else 0.0
+
+
+class TopBorrowed(View):
+    """
+    The titles lent most often since the view started, counting every copy of an ISBN number as one title.
+
+    :cvar counter: The loans per ISBN number.
+    :cvar isbn_nos: The ISBN number of every book.
+    :cvar titles: The title of every ISBN number.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._counter = RankedCounter()
+        self._isbn_nos: Dict[int, str] = {}
+        self._titles: Dict[str, str] = {}
+
+    def on_add_book(self, payload: dict) -> None:
+        self._isbn_nos[payload["id"]] = payload["isbn_no"]
+        self._titles.setdefault(payload["isbn_no"], payload["title"])
+
+    def on_remove_book(self, payload: dict) -> None:
+        self._isbn_nos.pop(payload["id"], None)
+
+    def on_add_member(self, payload: dict) -> None:
+        for book_id in payload["books_borrowed"]:
+            self._borrowed(book_id)
+
+    def on_lend_book(self, payload: dict) -> None:
+        self._borrowed(payload["book_id"])
+
+    def _borrowed(self, book_id: int) -> None:
+        isbn_no = self._isbn_nos.get(book_id)
+        if isbn_no is not None:
+            self._counter.increment(isbn_no)
+
+    def top(self, n: int) -> List[Tuple[str, int]]:
+        """
+        Get the titles lent most often, with their number of loans, most first.
+        """
+        with self._lock:
+            return [(self._titles[isbn_no], count) for isbn_no, count in self._counter.top(n)]
+
+
+class Dashboard:
+    """
+    The views of a library behind one feed, for dashboards that read them without scanning the library.
+
+    :cvar feed: The feed of the library's changes.
+    :cvar authors: The books per author.
+    :cvar loans: The loans per member.
+    :cvar utilization: The share of the catalog that is lent.
+    :cvar borrowed: The most borrowed titles.
+    """
+
+    def __init__(self, library: Library, history: int = DEFAULT_HISTORY) -> None:
+        """
+        Build the views from the current state of a library and follow its changes.
+        """
+        self.feed = ChangeFeed(history)
+        self.authors = AuthorCounts()
+        self.loans = LoanCounts()
+        self.utilization = Utilization()
+        self.borrowed = TopBorrowed()
+        for view in (self.authors, self.loans, self.utilization, self.borrowed):
+            self.feed.subscribe(view)
+        self.feed.attach(library)
+
+    def snapshot(self, n: int = 10) -> dict:
+        """
+        Get the figures of every view as plain values, with the top ``n`` of the rankings.
+        """
+        return {
+            "seq": self.feed.seq,
+            "books": self.utilization.books,
+            "lent": self.utilization.lent,
+            "utilization": self.utilization.rate,
+            "authors": len(self.authors),
+            "top_authors": self.authors.top(n),
+            "top_borrowers": self.loans.top(n),
+            "top_borrowed": self.borrowed.top(n),
+        }
+
+    def close(self) -> None:
+        """
+        Stop following the library.
+        """
+        self.feed.detach()
+
+
+def _bootstrap(library: Library, view: View) -> None:
+    """
+    Bring a view up to the current state of a library; callers hold the index lock.
+
+    With a storage backend the view is seeded from queries if it can be, and otherwise replayed from the
+    rows of the backend, so the library does not load every record into memory. Without one, the records
+    in memory are replayed as changes. Only the operations the view handles are replayed.
+    """
+    storage = library._storage
+    if storage is not None and view.seed(storage):
+        return
+
+    if "add_book" in view.handlers:
+        if storage is not None:
+            books: Iterable[dict] = _pages(storage.page_books, lambda row: row["id"])
+        else:
+            books = map(_book_event, _pages(library.page_books, lambda book: book.id))
+        for payload in books:
+            view.apply("add_book", payload)
+
+    if "add_member" in view.handlers:
+        if storage is not None:
+            members: Iterable[dict] = _pages(storage.page_members, lambda row: row["id"])
+        else:
+            members = map(_member_payload, _pages(library.page_members, lambda member: member.id))
+        for payload in members:
+            view.apply("add_member", dict(payload, books_borrowed=[], loans=[]))
+
+    if "lend_book" in view.handlers:
+        if storage is not None:
+            loans = [(loan["book_id"], loan["member_id"]) for loan in storage.load_due_loans()]
+        else:
+            loans = [(loan.book.id, loan.member_id) for loan in library._ledger]
+        for book_id, member_id in loans:
+            view.apply("lend_book", {"member_id": member_id, "book_id": book_id})
+
+
+def _pages(page: Callable, key: Callable) -> Iterator:
+    """
+    Read every record of a paged listing, ``BOOTSTRAP_PAGE`` at a time.
+    """
+    after = None
+    while True:
+        records = page(after=after, limit=BOOTSTRAP_PAGE)
+        if not records:
+            return
+        yield from records
+        after = key(records[-1])